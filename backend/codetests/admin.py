@@ -1,26 +1,97 @@
+from django.conf import settings
 from django.contrib import admin
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from .admin_scaling import ScaledAdminMixin
 from .models import Test, TestCase, Submission, CodeProgress
+from .results import RESULT_FIELDS
+from .search import filter_matching
+from .similarity import similarity_report
 
 @admin.register(Test)
 class TestAdmin(admin.ModelAdmin):
-    list_display = ('name', 'difficulty', 'time_limit', 'created_at')
-    list_filter = ('difficulty', 'created_at')
+    list_display = ('name', 'difficulty', 'time_limit', 'created_at', 'closed_at')
+    list_filter = ('difficulty', 'created_at', 'closed_at')
     search_fields = ('name', 'description')
+    change_form_template = 'admin/codetests/test_change_form.html'
+
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the full-text index instead of icontains scans over search_fields
+        return filter_matching(queryset, search_term), False
+
+    def get_urls(self):
+        urls = [
+            path(
+                '<int:test_id>/similarity/',
+                self.admin_site.admin_view(self.similarity_view),
+                name='codetests_test_similarity',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def similarity_view(self, request, test_id):
+        if not self.has_view_permission(request):
+            return redirect('admin:index')
+
+        test = get_object_or_404(Test, pk=test_id)
+        try:
+            threshold = float(request.GET.get('threshold', settings.SIMILARITY['THRESHOLD']))
+        except ValueError:
+            threshold = settings.SIMILARITY['THRESHOLD']
+        threshold = min(max(threshold, 0.0), 1.0)
+
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            original=test,
+            threshold=threshold,
+            pairs=similarity_report(test.id, threshold),
+            title=f'Similar submissions: {test.name}',
+        )
+        return TemplateResponse(request, 'admin/codetests/test_similarity.html', context)
 
 @admin.register(TestCase)
 class TestCaseAdmin(admin.ModelAdmin):
     list_display = ('test', 'is_sample')
     list_filter = ('test', 'is_sample')
 
+def search_user_or_test(queryset, term):
+    """Rows of a user (exact username) or of tests matching ``term``; ``#<id>`` finds one row."""
+    term = term.strip()
+    if not term:
+        return queryset
+    if term.startswith('#') and term[1:].isdigit():
+        return queryset.filter(pk=int(term[1:]))
+    tests = filter_matching(Test.objects.all(), term).values('pk')
+    return queryset.filter(user__username=term) | queryset.filter(test__in=tests)
+
 @admin.register(Submission)
-class SubmissionAdmin(admin.ModelAdmin):
+class SubmissionAdmin(ScaledAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'test', 'status', 'score', 'submitted_at')
     list_filter = ('status', 'submitted_at')
+    list_select_related = ('user', 'test')
+    list_defer = RESULT_FIELDS
+    raw_id_fields = ('user', 'test')
     search_fields = ('user__username', 'test__name')
+    search_help_text = 'Exact username, words from the test name or description, or #id'
+    exclude = ('code_blob',)
+    readonly_fields = ('code',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Indexed lookups instead of icontains joins over user__username and test__name
+        return search_user_or_test(queryset, search_term), False
 
 @admin.register(CodeProgress)
-class CodeProgressAdmin(admin.ModelAdmin):
+class CodeProgressAdmin(ScaledAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'test', 'language', 'updated_at')
     list_filter = ('language', 'updated_at')
+    list_select_related = ('user', 'test')
+    raw_id_fields = ('user', 'test')
     search_fields = ('user__username', 'test__name')
+    search_help_text = 'Exact username, words from the test name or description, or #id'
+    exclude = ('code_blob',)
+    readonly_fields = ('code',)
 
+    def get_search_results(self, request, queryset, search_term):
+        return search_user_or_test(queryset, search_term), False
@@ -0,0 +1,100 @@
+"""
+Per-test-case analytics over the packed results of all submissions of a test.
+
+Submissions graded against the same case list are stacked into matrices
+(submissions x cases) straight from their packed arrays, so every statistic
+is a NumPy reduction over a column:
+
+- ``failure_rate``: share of submissions failing the case
+- ``runtime_ms``/``memory_kb``: p50, p90 and p99 (memory only where measured)
+- ``discrimination``: pass rate among the top 27% of submissions by score
+  minus the pass rate among the bottom 27% (the classic upper-lower index);
+  near 0 means the case does not separate strong from weak solutions, a
+  negative value usually points at a broken case.
+
+Submissions graded before results were stored (no ``case_ids``) are skipped.
+"""
+
+import math
+from collections import defaultdict
+
+import numpy as np
+
+from .models import Submission, TestCase
+
+GROUP_FRACTION = 0.27
+PERCENTILES = (50, 90, 99)
+
+
+def _percentiles(values):
+    if not values.size:
+        return None
+    return {f'p{p}': round(float(v), 3) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def _matrix(blobs, dtype, count):
+    return np.frombuffer(b''.join(bytes(blob) for blob in blobs), dtype=dtype).reshape(len(blobs), count)
+
+
+def case_statistics(test_id):
+    """Statistics for every case graded in submissions of ``test_id``."""
+    rows = list(
+        Submission.objects.filter(test_id=test_id).exclude(case_ids=b'')
+        .values_list('score', 'case_ids', 'case_passed', 'case_runtimes', 'case_memory')
+    )
+    total = len(rows)
+    if not total:
+        return {'test': test_id, 'submissions': 0, 'cases': []}
+
+    scores = np.fromiter((row[0] for row in rows), dtype=np.int64, count=total)
+    order = np.argsort(scores, kind='stable')
+    group_size = math.ceil(total * GROUP_FRACTION)
+    upper = np.zeros(total, dtype=bool)
+    lower = np.zeros(total, dtype=bool)
+    upper[order[-group_size:]] = True
+    lower[order[:group_size]] = True
+
+    # Submissions graded against the same cases, in the same order
+    groups = defaultdict(list)
+    for index, row in enumerate(rows):
+        groups[bytes(row[1])].append(index)
+
+    columns = defaultdict(lambda: {'index': [], 'passed': [], 'runtime': [], 'memory': []})
+    for case_ids, indexes in groups.items():
+        ids = np.frombuffer(case_ids, dtype='<u4')
+        count = len(ids)
+        members = [rows[index] for index in indexes]
+        bitmaps = _matrix([row[2] for row in members], np.uint8, (count + 7) // 8)
+        passed = np.unpackbits(bitmaps, axis=1, count=count, bitorder='little').astype(bool)
+        runtimes = _matrix([row[3] for row in members], '<u4', count)
+        memory = _matrix([row[4] for row in members], '<u4', count)
+        index_array = np.asarray(indexes)
+        for column, case_id in enumerate(ids.tolist()):
+            case = columns[case_id]
+            case['index'].append(index_array)
+            case['passed'].append(passed[:, column])
+            case['runtime'].append(runtimes[:, column])
+            case['memory'].append(memory[:, column])
+
+    known = dict(TestCase.objects.filter(id__in=list(columns)).values_list('id', 'is_sample'))
+    cases = []
+    for case_id, case in sorted(columns.items()):
+        index = np.concatenate(case['index'])
+        passed = np.concatenate(case['passed'])
+        memory = np.concatenate(case['memory'])
+        in_upper = passed[upper[index]]
+        in_lower = passed[lower[index]]
+        discrimination = (
+            round(float(in_upper.mean() - in_lower.mean()), 4) if in_upper.size and in_lower.size else None
+        )
+        cases.append({
+            'test_case': case_id,
+            'exists': case_id in known,
+            'is_sample': known.get(case_id),
+            'submissions': int(passed.size),
+            'failure_rate': round(float(1 - passed.mean()), 4),
+            'runtime_ms': _percentiles(np.concatenate(case['runtime']) / 1000),
+            'memory_kb': _percentiles(memory[memory > 0]),
+            'discrimination': discrimination,
+        })
+    return {'test': test_id, 'submissions': total, 'cases': cases}
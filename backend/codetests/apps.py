@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CodetestsConfig(AppConfig):
     name = "codetests"
+
+    def ready(self):
+        from . import signals  # noqa: F401
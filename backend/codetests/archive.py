@@ -0,0 +1,327 @@
+"""
+Problem set archives for the import_tests/export_tests commands.
+
+Format
+------
+An archive is either a JSONL file or a tar archive.
+
+* ``*.jsonl`` (optionally ``.gz``, ``.bz2`` or ``.xz``): one test per line::
+
+    {"name": "Two Sum", "description": "...", "time_limit": 30,
+     "difficulty": "Easy", "content_hash": "<sha256>",
+     "cases": [{"input_data": "...", "expected_output": "...", "is_sample": true}]}
+
+* ``*.tar`` (optionally ``.tar.gz``, ``.tgz``, ``.tar.bz2``, ``.tar.xz``): a
+  ``tests.jsonl`` member in the format above, where any case field larger than
+  the inline limit is replaced by ``{"$ref": "cases/<sha256>"}`` pointing to a
+  member holding the raw UTF-8 text. Identical payloads share one member.
+  ``tests.jsonl`` is written first and case members follow in the order it
+  refers to them, so the archive is read in one pass (archives with the index
+  last are still read, spooling the case members to a temporary file).
+
+``content_hash`` is optional on import; it is the SHA-256 of the test's
+content (see ``test_content_hash``) and is used to skip tests that already
+exist.
+"""
+
+import bz2
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import shutil
+import tarfile
+import tempfile
+from itertools import groupby, islice
+
+from django.db import transaction
+
+from .models import Test, TestCase
+
+TESTS_MEMBER = 'tests.jsonl'
+CASE_FIELDS = ('input_data', 'expected_output')
+DEFAULT_INLINE_LIMIT = 64 * 1024
+
+_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+_TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def is_tar(path):
+    return path.lower().endswith(_TAR_SUFFIXES)
+
+
+def _open_text(path, mode):
+    opener = _OPENERS.get(os.path.splitext(path)[1].lower(), open)
+    return opener(path, mode + 't', encoding='utf-8')
+
+
+def test_content_hash(name, description, time_limit, difficulty, cases):
+    """Hash of a test's content; ``cases`` is an iterable of (input, output, is_sample)."""
+    payload = {
+        'name': name,
+        'description': description,
+        'time_limit': time_limit,
+        'difficulty': difficulty,
+        'cases': [list(case) for case in cases],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def record_content_hash(record):
+    return test_content_hash(
+        record['name'],
+        record['description'],
+        record['time_limit'],
+        record.get('difficulty', 'Medium'),
+        ((case['input_data'], case['expected_output'], bool(case.get('is_sample'))) for case in record['cases']),
+    )
+
+
+def refresh_content_hashes(batch_size=500):
+    """Compute content_hash for tests whose hash is missing or stale (empty)."""
+    while True:
+        ids = list(Test.objects.filter(content_hash='').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        tests = list(Test.objects.filter(id__in=ids).order_by('id'))
+        cases = TestCase.objects.filter(test_id__in=ids).order_by('test_id', 'id').values_list(
+            'test_id', 'input_data', 'expected_output', 'is_sample'
+        )
+        by_test = {test_id: [row[1:] for row in rows] for test_id, rows in groupby(cases, key=lambda row: row[0])}
+        for test in tests:
+            test.content_hash = test_content_hash(
+                test.name, test.description, test.time_limit, test.difficulty, by_test.get(test.id, [])
+            )
+        Test.objects.bulk_update(tests, ['content_hash'])
+
+
+# Reading
+
+class _TarCases:
+    """
+    Case members of a tar archive opened as a stream: members are read once,
+    in archive order, and copied to a spool file when first reached.
+    """
+
+    def __init__(self, tar, spool):
+        self._tar = tar
+        self._members = iter(tar)
+        self._spool = spool
+        self._offsets = {}
+
+    def _store(self, member):
+        offset = self._spool.seek(0, io.SEEK_END)
+        shutil.copyfileobj(self._tar.extractfile(member), self._spool)
+        self._offsets[member.name] = (offset, member.size)
+
+    def copy_index(self, target):
+        """Copy the index member to ``target``, keeping any case members before it."""
+        for member in self._members:
+            if not member.isfile():
+                continue
+            if member.name == TESTS_MEMBER:
+                shutil.copyfileobj(self._tar.extractfile(member), target)
+                return True
+            self._store(member)
+        return False
+
+    def read(self, ref):
+        while ref not in self._offsets:
+            member = next(self._members, None)
+            if member is None:
+                raise ArchiveError(f'Missing archive member: {ref}')
+            if member.isfile():
+                self._store(member)
+        offset, size = self._offsets[ref]
+        self._spool.seek(offset)
+        return self._spool.read(size).decode('utf-8')
+
+
+def _resolve(value, cases):
+    if isinstance(value, dict):
+        ref = value.get('$ref')
+        if cases is None or not ref:
+            raise ArchiveError(f'Unresolvable case reference: {value!r}')
+        return cases.read(ref)
+    return value
+
+
+def _parse_lines(lines, cases=None):
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            for case in record.get('cases', []):
+                for name in CASE_FIELDS:
+                    case[name] = _resolve(case[name], cases)
+            for name in ('name', 'description', 'time_limit'):
+                if name not in record:
+                    raise ArchiveError(f'missing {name}')
+            record['time_limit'] = int(record['time_limit'])
+            record.setdefault('cases', [])
+        except (ArchiveError, KeyError, TypeError, ValueError) as e:
+            raise ArchiveError(f'{TESTS_MEMBER if cases else "line"} {line_number}: {e}')
+        yield record
+
+
+def read_archive(path):
+    """Yield test records from an archive one at a time."""
+    if is_tar(path):
+        # Read as a stream: seeking back in a compressed archive decompresses it again from the start
+        with tarfile.open(path, 'r|*') as tar, tempfile.TemporaryFile() as index, \
+                tempfile.TemporaryFile() as spool:
+            cases = _TarCases(tar, spool)
+            if not cases.copy_index(index):
+                raise ArchiveError(f'{path} has no {TESTS_MEMBER} member')
+            index.seek(0)
+            yield from _parse_lines((line.decode('utf-8') for line in index), cases)
+    else:
+        with _open_text(path, 'r') as f:
+            yield from _parse_lines(f)
+
+
+# Importing
+
+def import_records(records, batch_size=500):
+    """
+    Create tests and cases from ``records`` in one transaction.
+
+    Returns ``(created, skipped)``; tests whose content hash already exists
+    (in the database or earlier in the archive) are skipped.
+    """
+    created = skipped = 0
+    seen = set()
+    records = iter(records)
+    with transaction.atomic():
+        refresh_content_hashes()
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            for record in batch:
+                record['content_hash'] = record_content_hash(record)
+            existing = set(
+                Test.objects.filter(content_hash__in=[record['content_hash'] for record in batch])
+                .values_list('content_hash', flat=True)
+            )
+            new = []
+            for record in batch:
+                if record['content_hash'] in existing or record['content_hash'] in seen:
+                    skipped += 1
+                    continue
+                seen.add(record['content_hash'])
+                new.append(record)
+            if not new:
+                continue
+
+            tests = Test.objects.bulk_create([
+                Test(
+                    name=record['name'],
+                    description=record['description'],
+                    time_limit=record['time_limit'],
+                    difficulty=record.get('difficulty', 'Medium'),
+                    content_hash=record['content_hash'],
+                )
+                for record in new
+            ])
+            TestCase.objects.bulk_create(
+                (
+                    TestCase(
+                        test_id=test.pk,
+                        input_data=case['input_data'],
+                        expected_output=case['expected_output'],
+                        is_sample=bool(case.get('is_sample')),
+                    )
+                    for test, record in zip(tests, new)
+                    for case in record['cases']
+                ),
+                batch_size=batch_size,
+            )
+            created += len(tests)
+    return created, skipped
+
+
+# Exporting
+
+def iter_records(queryset=None, chunk_size=500):
+    """Stream test records without materialising querysets (merge join on test id)."""
+    queryset = Test.objects.all() if queryset is None else queryset
+    tests = queryset.order_by('id').values_list(
+        'id', 'name', 'description', 'time_limit', 'difficulty', 'content_hash'
+    ).iterator(chunk_size=chunk_size)
+    cases = TestCase.objects.filter(test__in=queryset).order_by('test_id', 'id').values_list(
+        'test_id', 'input_data', 'expected_output', 'is_sample'
+    ).iterator(chunk_size=chunk_size)
+
+    pending = next(cases, None)
+    for test_id, name, description, time_limit, difficulty, content_hash in tests:
+        test_cases = []
+        while pending is not None and pending[0] <= test_id:
+            if pending[0] == test_id:
+                test_cases.append(pending[1:])
+            pending = next(cases, None)
+        yield {
+            'name': name,
+            'description': description,
+            'time_limit': time_limit,
+            'difficulty': difficulty,
+            'content_hash': content_hash or test_content_hash(name, description, time_limit, difficulty, test_cases),
+            'cases': [
+                {'input_data': input_data, 'expected_output': expected_output, 'is_sample': is_sample}
+                for input_data, expected_output, is_sample in test_cases
+            ],
+        }
+
+
+def _dump(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def write_archive(path, records, inline_limit=DEFAULT_INLINE_LIMIT):
+    """Write ``records`` to ``path``; returns the number of tests written."""
+    count = 0
+    if not is_tar(path):
+        with _open_text(path, 'w') as f:
+            for record in records:
+                f.write(_dump(record))
+                count += 1
+        return count
+
+    compression = {'.gz': 'gz', '.tgz': 'gz', '.bz2': 'bz2', '.xz': 'xz'}.get(os.path.splitext(path)[1].lower(), '')
+    members = {}  # ref -> payload size, in order of first use
+    with tarfile.open(path, f'w:{compression}') as tar, tempfile.TemporaryFile() as index, \
+            tempfile.TemporaryFile() as payloads:
+        for record in records:
+            for case in record['cases']:
+                for name in CASE_FIELDS:
+                    data = case[name].encode('utf-8')
+                    if len(data) <= inline_limit:
+                        continue
+                    ref = f'cases/{hashlib.sha256(data).hexdigest()}'
+                    if ref not in members:
+                        payloads.write(data)
+                        members[ref] = len(data)
+                    case[name] = {'$ref': ref}
+            index.write(_dump(record).encode('utf-8'))
+            count += 1
+
+        # The index goes first and case members follow in the order the index
+        # refers to them, so a reader can stream the archive front to back
+        info = tarfile.TarInfo(TESTS_MEMBER)
+        info.size = index.tell()
+        index.seek(0)
+        tar.addfile(info, index)
+        payloads.seek(0)
+        for ref, size in members.items():
+            info = tarfile.TarInfo(ref)
+            info.size = size
+            tar.addfile(info, payloads)
+    return count
@@ -0,0 +1,186 @@
+"""
+Async versions of the execution endpoints for the ASGI deployment.
+
+Runs are started with ``asyncio.create_subprocess_exec`` (``arun_code``), so
+a waiting execution holds no thread, and a submission runs its test cases
+concurrently under the ``CODE_EXECUTION_CONCURRENCY`` limit. ``urls.py`` routes
+``tests/execute/`` and ``tests/<pk>/submit/`` here when ``ASYNC_EXECUTION``
+is set (the default under ``asgi.py``). Responses match the DRF views.
+
+``tests/execute/stream/`` exists only in this mode: it streams a run's output
+as server-sent events (see codetests/streaming.py).
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import exceptions, status
+
+from coding_platform.db_routing import apin_to_primary
+from coding_platform.idempotency import arun_once
+from coding_platform.tracing import span
+from users.authentication import CachedJWTAuthentication
+from .bundles import get_test_bundle
+from .models import Submission, Test
+from .results import store_results
+from .runner import arun_code
+from .similarity import index_submission
+from .streaming import LiveRun, cancel_key, get_active, run_key, shared_cache
+from .views import (
+    VERBOSITIES, case_result, execution_output, execution_payload, present_results, score_results, submit_verbosity
+)
+
+
+async def authenticate(request):
+    """Authenticate like the DRF views; returns (user, None) or (None, error response)."""
+    try:
+        result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    except exceptions.AuthenticationFailed as e:
+        return None, JsonResponse({'detail': e.detail}, status=status.HTTP_401_UNAUTHORIZED)
+    if result is None:
+        return None, JsonResponse(
+            {'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED
+        )
+    return result[0], None
+
+
+def request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+def method_not_allowed(request):
+    return JsonResponse(
+        {'detail': f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED
+    )
+
+
+async def execute_code(request):
+    """Execute code and return output"""
+    if request.method != 'POST':
+        return method_not_allowed(request)
+    user, error = await authenticate(request)
+    if error:
+        return error
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({'detail': 'Malformed request.'}, status=status.HTTP_400_BAD_REQUEST)
+    return await arun_once(request, user.id, data, lambda: _execute(data), JsonResponse)
+
+
+async def _execute(data):
+    code = data.get('code')
+    if not code:
+        return JsonResponse({'error': 'No code provided'}, status=status.HTTP_400_BAD_REQUEST)
+    payload, status_code = execution_payload(await arun_code(code, language=data.get('language', 'python')))
+    return JsonResponse(payload, status=status_code)
+
+
+async def submit(request, pk):
+    """Submit code for a test, running its test cases concurrently"""
+    if request.method != 'POST':
+        return method_not_allowed(request)
+    user, error = await authenticate(request)
+    if error:
+        return error
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({'detail': 'Malformed request.'}, status=status.HTTP_400_BAD_REQUEST)
+    return await arun_once(request, user.id, data, lambda: _submit(request, user, data, pk), JsonResponse)
+
+
+async def _submit(request, user, data, pk):
+    verbosity = submit_verbosity(request.GET, data)
+    if verbosity is None:
+        return JsonResponse(
+            {'error': f'verbosity must be one of {", ".join(VERBOSITIES)}'}, status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        with span('get_bundle'):
+            bundle = await sync_to_async(get_test_bundle)(pk)
+    except Test.DoesNotExist:
+        return JsonResponse({'detail': 'No Test matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+
+    code = data.get('code')
+    language = data.get('language', 'python')
+    executions = await asyncio.gather(*(
+        arun_code(code, case.input_data, language, timeout=bundle.timeout) for case in bundle.cases
+    ))
+    results = [case_result(case, execution_output(execution)) for case, execution in zip(bundle.cases, executions)]
+
+    score = score_results(results)
+    submission = Submission(
+        user_id=user.id, test_id=bundle.test_id, code=code, language=language,
+        score=score, status='passed' if score >= 70 else 'failed',
+    )
+    store_results(submission, bundle.cases, executions, results)
+    with span('submission.save'):
+        await submission.asave()
+    with span('similarity.index'):
+        await sync_to_async(index_submission)(submission, code or '')
+    await apin_to_primary(user.id)
+
+    return JsonResponse({
+        'submission_id': submission.id,
+        'score': submission.score,
+        'status': submission.status,
+        'results': present_results(bundle.cases, results, verbosity)
+    })
+
+
+def sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def execute_stream(request):
+    """Run code and stream stdout/stderr as server-sent events"""
+    if request.method != 'POST':
+        return method_not_allowed(request)
+    user, error = await authenticate(request)
+    if error:
+        return error
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({'detail': 'Malformed request.'}, status=status.HTTP_400_BAD_REQUEST)
+    code = data.get('code')
+    if not code:
+        return JsonResponse({'error': 'No code provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+    run = LiveRun(user.id, code, language=data.get('language', 'python'))
+
+    async def stream():
+        async for event, payload in run.events():
+            yield sse(event, payload)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    response['X-Run-Id'] = run.id
+    return response
+
+
+async def cancel_stream(request, run_id):
+    """Cancel a streaming run started by the current user"""
+    if request.method != 'POST':
+        return method_not_allowed(request)
+    user, error = await authenticate(request)
+    if error:
+        return error
+    run = get_active(run_id)
+    if run is not None and run.user_id == user.id:
+        run.cancel()
+        return JsonResponse({'cancelled': True})
+    shared = shared_cache()
+    if await shared.aget(run_key(run_id)) != user.id:
+        return JsonResponse({'error': 'No such run in progress'}, status=status.HTTP_404_NOT_FOUND)
+    # Running in another worker, which checks this flag between chunks
+    await shared.aset(cancel_key(run_id, user.id), True, timeout=settings.CODE_EXECUTION_TIMEOUT + 60)
+    return JsonResponse({'cancelled': True}, status=status.HTTP_202_ACCEPTED)
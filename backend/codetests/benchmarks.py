@@ -0,0 +1,249 @@
+"""
+API performance benchmarks with query-count and latency budgets.
+
+Every endpoint in ``codetests/urls.py`` and ``users/urls.py`` is declared
+below with the maximum number of DB queries a single request may run and a
+p95 latency budget. ``run_benchmarks`` seeds datasets of several sizes with
+``generate_scale_data``, drives each endpoint through the full middleware and
+authentication stack, and reports latency percentiles and query counts.
+Transaction control statements (BEGIN, COMMIT, SAVEPOINT, ...) are not
+counted, so a request measures the same inside a test case's transaction as
+against a real database.
+Use ``manage.py benchmark_api`` to run it against a throwaway test database.
+"""
+
+import io
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from rest_framework.test import APIClient
+
+from users.tokens import ClaimsRefreshToken
+from .models import Submission, Test
+
+User = get_user_model()
+
+# Datasets passed to generate_scale_data
+DATASETS = {
+    'small': {'users': 20, 'tests': 10, 'cases': 5, 'submissions': 500, 'progress': 50},
+    'medium': {'users': 200, 'tests': 100, 'cases': 5, 'submissions': 10000, 'progress': 1000},
+    'large': {'users': 2000, 'tests': 1000, 'cases': 5, 'submissions': 200000, 'progress': 20000},
+}
+
+BENCH_PASSWORD = 'benchpass123'
+
+# Statements that only delimit transactions and are not counted as queries
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    url_name: str
+    method: str
+    max_queries: int
+    p95_ms: float
+    # (context, iteration) -> URL kwargs; runs outside the measured request
+    prepare: Optional[Callable] = None
+    # (context, iteration) -> request body
+    data: Optional[Callable] = None
+    # (context, iteration) -> query string parameters
+    query: Optional[Callable] = None
+    auth: bool = True
+
+    @property
+    def label(self):
+        return f'{self.method} {self.url_name}'
+
+
+def _test_kwargs(ctx, i):
+    return {'pk': ctx['test_id']}
+
+
+def _throwaway_test(ctx, i):
+    return {'pk': Test.objects.create(name=f'bench throwaway {i}', description='d', time_limit=10).pk}
+
+
+def _own_submission(ctx, i):
+    return {'pk': Submission.objects.filter(user__username=ctx['username']).latest('pk').pk}
+
+
+def _test_body(ctx, i):
+    return {'name': f'bench test {i}', 'description': 'Benchmark problem', 'time_limit': 30, 'difficulty': 'Easy'}
+
+
+ENDPOINTS = [
+    # users/urls.py
+    Endpoint('register', 'post', 3, 2000, auth=False,
+             data=lambda ctx, i: {'username': f'bench_new_{ctx["run"]}_{i}', 'email': 'b@example.com',
+                                  'password': BENCH_PASSWORD}),
+    Endpoint('login', 'post', 2, 2000, auth=False,
+             data=lambda ctx, i: {'username': ctx['username'], 'password': BENCH_PASSWORD}),
+    Endpoint('current_user', 'get', 0, 20),
+    # codetests/urls.py
+    Endpoint('api-root', 'get', 0, 20),
+    Endpoint('execute_code', 'post', 0, 1000, data=lambda ctx, i: {'code': f'print({i})', 'language': 'python'}),
+    Endpoint('test-list', 'get', 2, 500),
+    Endpoint('test-list', 'post', 2, 50, data=_test_body),
+    Endpoint('test-search', 'get', 3, 50, query=lambda ctx, i: {'q': 'problem', 'difficulty': 'Easy,Hard'}),
+    Endpoint('test-detail', 'get', 2, 30, prepare=_test_kwargs),
+    Endpoint('test-detail', 'put', 5, 50, prepare=_test_kwargs, data=_test_body),
+    Endpoint('test-detail', 'patch', 5, 50, prepare=_test_kwargs, data=lambda ctx, i: {'time_limit': 30 + i}),
+    Endpoint('test-detail', 'delete', 8, 100, prepare=_throwaway_test),
+    Endpoint('test-testcases', 'get', 2, 30, prepare=_test_kwargs),
+    Endpoint('test-save', 'post', 5, 50, prepare=_test_kwargs,
+             data=lambda ctx, i: {'code': f'print({i})\n' * 20, 'language': 'python'}),
+    Endpoint('test-saved', 'get', 3, 30, prepare=_test_kwargs),
+    Endpoint('test-workspace', 'get', 2, 30, prepare=_test_kwargs),
+    Endpoint('test-history', 'get', 4, 50, prepare=_test_kwargs),
+    Endpoint('test-analytics', 'get', 4, 500, prepare=_test_kwargs),
+    Endpoint('test-submit', 'post', 4, 3000, prepare=_test_kwargs,
+             data=lambda ctx, i: {'code': 'print(int(input()) ** 2)', 'language': 'python'}),
+    # Run after test-submit, which gives the runner submissions
+    Endpoint('submission-list', 'get', 2, 100),
+    Endpoint('submission-detail', 'get', 1, 30, prepare=_own_submission),
+    Endpoint('test-similarity', 'get', 5, 500, prepare=_test_kwargs),
+]
+
+# Every named route in these URLconfs must have an Endpoint above
+COVERED_URLCONFS = ('users.urls', 'codetests.urls')
+
+
+@dataclass
+class Result:
+    dataset: str
+    endpoint: str
+    iterations: int
+    latencies_ms: list = field(repr=False)
+    queries: list = field(repr=False)
+    max_queries: int = 0
+    p95_budget_ms: float = 0
+    statuses: list = field(default_factory=list, repr=False)
+
+    def percentile(self, p):
+        ordered = sorted(self.latencies_ms)
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+        return ordered[index]
+
+    @property
+    def query_failure(self):
+        return max(self.queries) > self.max_queries
+
+    @property
+    def latency_failure(self):
+        return self.percentile(95) > self.p95_budget_ms
+
+    @property
+    def error_statuses(self):
+        return sorted({status for status in self.statuses if status >= 400})
+
+    def as_dict(self):
+        return {
+            'dataset': self.dataset,
+            'endpoint': self.endpoint,
+            'iterations': self.iterations,
+            'p50_ms': round(self.percentile(50), 2),
+            'p95_ms': round(self.percentile(95), 2),
+            'p99_ms': round(self.percentile(99), 2),
+            'mean_ms': round(statistics.fmean(self.latencies_ms), 2),
+            'queries_max': max(self.queries),
+            'queries_budget': self.max_queries,
+            'p95_budget_ms': self.p95_budget_ms,
+            'error_statuses': self.error_statuses,
+        }
+
+
+def uncovered_url_names():
+    """URL names from the covered URLconfs that have no Endpoint declared."""
+    declared = {endpoint.url_name for endpoint in ENDPOINTS}
+    names = set()
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                names.add(pattern.name)
+
+    for urlconf in COVERED_URLCONFS:
+        walk(get_resolver(urlconf).url_patterns)
+    return sorted(names - declared)
+
+
+def seed(dataset, seed=42):
+    """Fill the current database with ``dataset`` and return the benchmark context."""
+    options = DATASETS[dataset]
+    call_command(
+        'generate_scale_data',
+        *[f'--{name}={value}' for name, value in options.items()],
+        f'--seed={seed}',
+        f'--prefix=bench_{dataset}',
+        stdout=io.StringIO(),
+    )
+    # Staff, so admin-only endpoints are measured too
+    user = User.objects.create_user(username=f'bench_{dataset}_runner', password=BENCH_PASSWORD, is_staff=True)
+    return {
+        'run': dataset,
+        'username': user.username,
+        'token': str(ClaimsRefreshToken.for_user(user).access_token),
+        'test_id': Test.objects.filter(name__startswith=f'bench_{dataset} problem').order_by('id').first().pk,
+    }
+
+
+def count_queries(captured):
+    return sum(
+        1 for query in captured.captured_queries if not query['sql'].lstrip().upper().startswith(TRANSACTION_CONTROL)
+    )
+
+
+def run_endpoint(endpoint, ctx, dataset, iterations):
+    client = APIClient()
+    if endpoint.auth:
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {ctx["token"]}')
+
+    result = Result(
+        dataset=dataset,
+        endpoint=endpoint.label,
+        iterations=iterations,
+        latencies_ms=[],
+        queries=[],
+        max_queries=endpoint.max_queries,
+        p95_budget_ms=endpoint.p95_ms,
+    )
+    for i in range(iterations):
+        kwargs = endpoint.prepare(ctx, i) if endpoint.prepare else None
+        url = reverse(endpoint.url_name, kwargs=kwargs)
+        if endpoint.query:
+            url = f'{url}?{urlencode(endpoint.query(ctx, i))}'
+        body = endpoint.data(ctx, i) if endpoint.data else None
+        request = getattr(client, endpoint.method)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request(url, body, format='json') if body is not None else request(url)
+            elapsed = time.perf_counter() - started
+        result.latencies_ms.append(elapsed * 1000)
+        result.queries.append(count_queries(captured))
+        result.statuses.append(response.status_code)
+    return result
+
+
+def run_benchmarks(datasets, iterations=20, on_result=None):
+    """Seed and benchmark each dataset in turn; the database is flushed between them."""
+    results = []
+    for dataset in datasets:
+        call_command('flush', interactive=False, verbosity=0)
+        ctx = seed(dataset)
+        for endpoint in ENDPOINTS:
+            result = run_endpoint(endpoint, ctx, dataset, iterations)
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+    return results
+
@@ -0,0 +1,169 @@
+"""
+Compiled test bundles used for grading.
+
+A bundle is an immutable snapshot of a Test, its test cases (with normalized
+expected outputs) and the execution limits. Bundles are cached per worker in a
+bounded LRU and, when ``TEST_BUNDLE_CACHE['SHARED_ALIAS']`` names a cache from
+``CACHES``, in that shared cache as well. ``codetests.signals`` invalidates
+them whenever a Test or TestCase is saved or deleted, so in steady state
+grading does not read test data from the database.
+
+Signals only reach the worker that made the change, so per-worker copies are
+always dropped after ``LOCAL_TIMEOUT`` seconds: other workers pick up an edit
+within that time, from the shared tier or from the database.
+"""
+
+import hashlib
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from coding_platform.lru import LRUCache
+from coding_platform.tracing import span
+from .models import Test, TestCase
+
+
+@dataclass(frozen=True)
+class CaseSpec:
+    id: int
+    input_data: str
+    expected_output: str
+    expected: str  # normalized expected output used for comparison
+    is_sample: bool
+
+
+@dataclass(frozen=True)
+class TestBundle:
+    test_id: int
+    name: str
+    description: str
+    time_limit: int
+    difficulty: str
+    timeout: int  # per-case execution limit in seconds
+    version: str
+    cases: tuple
+
+    @property
+    def sample_cases(self):
+        return tuple(case for case in self.cases if case.is_sample)
+
+
+def normalize_output(output):
+    """Normalize program output before comparing it with the expected output."""
+    return output.strip()
+
+
+def _config(name):
+    return settings.TEST_BUNDLE_CACHE.get(name)
+
+
+_local = LRUCache(maxsize=_config('MAX_ENTRIES') or 256)
+
+
+def _shared_cache():
+    alias = _config('SHARED_ALIAS')
+    return caches[alias] if alias else None
+
+
+def _generation_key(test_id):
+    return f'test-bundle:{test_id}:generation'
+
+
+def _bundle_key(test_id, generation):
+    return f'test-bundle:{test_id}:{generation}'
+
+
+def build_test_bundle(test_id):
+    """Load a bundle from the database (two queries)."""
+    with span('bundle.load', test_id=test_id):
+        test = Test.objects.values(
+            'id', 'name', 'description', 'time_limit', 'difficulty'
+        ).get(pk=test_id)
+        rows = TestCase.objects.filter(test_id=test_id).order_by('id').values_list(
+            'id', 'input_data', 'expected_output', 'is_sample'
+        )
+        cases = tuple(
+            CaseSpec(
+                id=case_id,
+                input_data=input_data,
+                expected_output=expected_output,
+                expected=normalize_output(expected_output),
+                is_sample=is_sample,
+            )
+            for case_id, input_data, expected_output, is_sample in rows
+        )
+    timeout = settings.CODE_EXECUTION_TIMEOUT
+
+    digest = hashlib.sha256()
+    for part in (test['name'], test['description'], test['time_limit'], test['difficulty'], timeout):
+        digest.update(str(part).encode())
+        digest.update(b'\0')
+    for case in cases:
+        digest.update(f'{case.id}\0{case.input_data}\0{case.expected_output}\0{case.is_sample}\0'.encode())
+
+    return TestBundle(
+        test_id=test['id'],
+        name=test['name'],
+        description=test['description'],
+        time_limit=test['time_limit'],
+        difficulty=test['difficulty'],
+        timeout=timeout,
+        version=digest.hexdigest()[:16],
+        cases=cases,
+    )
+
+
+def get_test_bundle(test_id):
+    """
+    Return the bundle for ``test_id``, raising ``Test.DoesNotExist`` if the
+    test is gone.
+    """
+    test_id = int(test_id)
+    bundle = _local.get(test_id)
+    if bundle is not None:
+        return bundle
+
+    # Local copies are only trusted for LOCAL_TIMEOUT seconds, because
+    # invalidations in other workers do not reach this one (with a shared tier
+    # they only bump its generation counter).
+    shared = _shared_cache()
+    if shared is None:
+        bundle = build_test_bundle(test_id)
+        _local.set(test_id, bundle, timeout=_config('LOCAL_TIMEOUT'))
+        return bundle
+
+    generation = shared.get(_generation_key(test_id), 0)
+    bundle = shared.get(_bundle_key(test_id, generation))
+    if bundle is None:
+        bundle = build_test_bundle(test_id)
+        shared.set(_bundle_key(test_id, generation), bundle, timeout=_config('TIMEOUT'))
+    _local.set(test_id, bundle, timeout=_config('LOCAL_TIMEOUT'))
+    return bundle
+
+
+def _invalidate(test_id):
+    _local.pop(test_id)
+    shared = _shared_cache()
+    if shared is not None:
+        key = _generation_key(test_id)
+        try:
+            shared.incr(key)
+        except ValueError:
+            shared.set(key, 1, timeout=None)
+
+
+def invalidate_test_bundle(test_id):
+    """
+    Drop any cached bundle for ``test_id``.
+
+    Runs immediately and again once the surrounding transaction commits, so a
+    concurrent reader cannot re-cache the pre-commit state.
+    """
+    _invalidate(test_id)
+    transaction.on_commit(lambda: _invalidate(test_id))
+
+
+def clear_local_bundles():
+    _local.clear()
@@ -0,0 +1,74 @@
+"""
+Text deltas used by autosave and the CodeProgress revision history.
+
+A delta is a list of ``[start, end, text]`` edits against a base string:
+the characters ``base[start:end]`` are replaced with ``text``. Edits are
+applied in order, must not overlap and are expressed in base offsets.
+"""
+
+import difflib
+import hashlib
+import json
+import zlib
+
+
+class InvalidDelta(ValueError):
+    pass
+
+
+def content_hash(text):
+    """SHA-256 hex digest of the UTF-8 encoded text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def compute_delta(old, new):
+    """Compute a line-based delta turning ``old`` into ``new``."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+
+    # Character offset at which each old line starts
+    offsets = [0]
+    for line in old_lines:
+        offsets.append(offsets[-1] + len(line))
+
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            ops.append([offsets[i1], offsets[i2], ''.join(new_lines[j1:j2])])
+    return ops
+
+
+def apply_delta(base, ops):
+    """Apply ``ops`` to ``base``, raising InvalidDelta on malformed edits."""
+    if not isinstance(ops, list):
+        raise InvalidDelta('Delta must be a list of [start, end, text] edits')
+
+    parts = []
+    position = 0
+    for op in ops:
+        try:
+            start, end, text = op
+        except (TypeError, ValueError):
+            raise InvalidDelta('Each edit must be [start, end, text]')
+        if (
+            not isinstance(start, int) or not isinstance(end, int) or not isinstance(text, str)
+            or isinstance(start, bool) or isinstance(end, bool)
+        ):
+            raise InvalidDelta('Each edit must be [start, end, text]')
+        if start < position or end < start or end > len(base):
+            raise InvalidDelta('Edits must be ordered, non-overlapping and within the base text')
+        parts.append(base[position:start])
+        parts.append(text)
+        position = end
+    parts.append(base[position:])
+    return ''.join(parts)
+
+
+def pack(payload):
+    """Serialize and compress a delta (or any JSON value) for storage."""
+    return zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
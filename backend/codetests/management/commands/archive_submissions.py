@@ -0,0 +1,31 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from codetests.retention import archive_progress, archive_submissions
+
+
+class Command(BaseCommand):
+    help = 'Move old submissions, and code progress of closed tests, to the archive (see codetests/retention.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SUBMISSION_RETENTION['DAYS'],
+                            help='Archive submissions older than this many days')
+        parser.add_argument('--batch-size', type=int, default=settings.SUBMISSION_RETENTION['BATCH_SIZE'])
+        parser.add_argument('--skip-progress', action='store_true', help='Leave code progress of closed tests alone')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be moved')
+
+    def handle(self, *args, **options):
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        started = time.monotonic()
+        before = timezone.now() - timedelta(days=options['days'])
+        count = archive_submissions(before, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        self.stdout.write(f'{verb} {count} submissions made before {before:%Y-%m-%d}')
+
+        if not options['skip_progress']:
+            count = archive_progress(batch_size=options['batch_size'], dry_run=options['dry_run'])
+            self.stdout.write(f'{verb} {count} code progress rows of closed tests')
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.1f}s'))
@@ -0,0 +1,99 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from codetests.benchmarks import DATASETS, run_benchmarks, uncovered_url_names
+
+
+def _revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every API endpoint against seeded datasets, enforcing query and latency budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--datasets', default='small,medium',
+                            help=f'Comma-separated dataset sizes ({", ".join(DATASETS)})')
+        parser.add_argument('--iterations', type=int, default=20, help='Requests per endpoint and dataset')
+        parser.add_argument('--output', help='Write results as JSON to this path')
+        parser.add_argument('--compare', help='Previous JSON results to compare p95 latencies against')
+        parser.add_argument('--no-latency-budgets', action='store_true',
+                            help='Only enforce query budgets (for noisy machines)')
+
+    def handle(self, *args, **options):
+        datasets = [name.strip() for name in options['datasets'].split(',') if name.strip()]
+        unknown = [name for name in datasets if name not in DATASETS]
+        if unknown:
+            raise CommandError(f'Unknown dataset(s): {", ".join(unknown)}')
+        uncovered = uncovered_url_names()
+        if uncovered:
+            raise CommandError(f'Endpoints without a benchmark budget: {", ".join(uncovered)}')
+
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = {(row['dataset'], row['endpoint']): row for row in json.load(f)['results']}
+
+        # Everything runs in a throwaway test database
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = run_benchmarks(
+                datasets, iterations=options['iterations'], on_result=lambda r: self.report(r, baseline)
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'revision': _revision(),
+                    'created_at': datetime.now(timezone.utc).isoformat(),
+                    'python': platform.python_version(),
+                    'iterations': options['iterations'],
+                    'datasets': {name: DATASETS[name] for name in datasets},
+                    'results': [result.as_dict() for result in results],
+                }, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        failures = [
+            result for result in results
+            if result.query_failure or result.error_statuses
+            or (result.latency_failure and not options['no_latency_budgets'])
+        ]
+        if failures:
+            raise CommandError(f'{len(failures)} endpoint(s) over budget or failing')
+        self.stdout.write(self.style.SUCCESS('All endpoints within budget'))
+
+    def report(self, result, baseline):
+        row = result.as_dict()
+        line = (
+            f'{row["dataset"]:<7} {row["endpoint"]:<22} '
+            f'p50 {row["p50_ms"]:8.2f}ms  p95 {row["p95_ms"]:8.2f}ms  p99 {row["p99_ms"]:8.2f}ms  '
+            f'queries {row["queries_max"]}/{row["queries_budget"]}'
+        )
+        previous = baseline.get((row['dataset'], row['endpoint']))
+        if previous and previous['p95_ms']:
+            line += f'  ({(row["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"]:+.0%} p95)'
+        problems = []
+        if result.query_failure:
+            problems.append('QUERY BUDGET')
+        if result.latency_failure:
+            problems.append(f'LATENCY BUDGET {row["p95_budget_ms"]}ms')
+        if result.error_statuses:
+            problems.append(f'HTTP {row["error_statuses"]}')
+        if problems:
+            self.stdout.write(self.style.ERROR(f'{line}  ' + ', '.join(problems)))
+        else:
+            self.stdout.write(line)
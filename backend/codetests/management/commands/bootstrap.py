@@ -0,0 +1,133 @@
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db.migrations.executor import MigrationExecutor
+
+STATIC_MANIFEST = '.bootstrap-static.sha256'  # In STATIC_ROOT: digest of the last collected sources
+STATIC_IGNORE = ['CVS', '.*', '*~']            # collectstatic's default ignore patterns
+MIGRATION_LOCK_ID = 52_017_300                 # PostgreSQL advisory lock held while migrating
+
+
+def pending_migrations(connection):
+    executor = MigrationExecutor(connection)
+    return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+@contextmanager
+def migration_lock(connection):
+    """Let one container at a time migrate a PostgreSQL database."""
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s)', [MIGRATION_LOCK_ID])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [MIGRATION_LOCK_ID])
+
+
+def static_digest():
+    """SHA-256 over the path and content of every file collectstatic would copy."""
+    files = {}
+    for finder in get_finders():
+        for path, storage in finder.list(STATIC_IGNORE):
+            prefixed = os.path.join(storage.prefix, path) if getattr(storage, 'prefix', None) else path
+            # The first finder to provide a path wins, as in collectstatic
+            files.setdefault(prefixed, (storage, path))
+    digest = hashlib.sha256(settings.STORAGES['staticfiles']['BACKEND'].encode())
+    for prefixed in sorted(files):
+        storage, path = files[prefixed]
+        digest.update(f'\0{prefixed}\0'.encode())
+        with storage.open(path) as source:
+            for chunk in iter(lambda: source.read(1 << 16), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        'Prepare the database, static files and initial users for serving, in one process; '
+        'steps with nothing to do are skipped, so it is cheap to run on every container start'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wait-for-db', type=float, default=0, metavar='SECONDS',
+                            help='Retry connecting to the database for this long before giving up')
+        parser.add_argument('--sample-data', action='store_true', help='Create the sample tests if missing')
+        parser.add_argument('--skip-static', action='store_true', help='Do not collect static files')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        connection = connections[DEFAULT_DB_ALIAS]
+        self.step('Database', self.wait_for_database, connection, options['wait_for_db'])
+        self.step('Migrations', self.migrate, connection)
+        if not options['skip_static']:
+            self.step('Static files', self.collect_static)
+        self.step('Superuser', self.create_superuser)
+        if options['sample_data']:
+            self.step('Sample data', call_command, 'populate_data', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Ready in {time.monotonic() - started:.2f}s'))
+
+    def step(self, name, function, *args, **kwargs):
+        started = time.monotonic()
+        outcome = function(*args, **kwargs)
+        self.stdout.write(f'{name}: {outcome or "done"} ({time.monotonic() - started:.2f}s)')
+
+    def wait_for_database(self, connection, seconds):
+        deadline = time.monotonic() + seconds
+        while True:
+            try:
+                connection.ensure_connection()
+                return 'connected'
+            except OperationalError as e:
+                if time.monotonic() >= deadline:
+                    raise CommandError(f'Database unavailable: {e}')
+                time.sleep(0.5)
+
+    def migrate(self, connection):
+        if not pending_migrations(connection):
+            return 'none to apply'
+        with migration_lock(connection):
+            # Another container may have applied them while we waited for the lock
+            plan = pending_migrations(connection)
+            if not plan:
+                return 'applied by another container'
+            call_command('migrate', interactive=False, verbosity=0)
+        return f'applied {len(plan)}'
+
+    def collect_static(self):
+        if not settings.STATIC_ROOT:
+            return 'STATIC_ROOT not set, skipped'
+        manifest = os.path.join(settings.STATIC_ROOT, STATIC_MANIFEST)
+        digest = static_digest()
+        try:
+            with open(manifest) as file:
+                if file.read().strip() == digest:
+                    return 'unchanged'
+        except FileNotFoundError:
+            pass
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(manifest, 'w') as file:
+            file.write(digest)
+        return 'collected'
+
+    def create_superuser(self):
+        username = os.environ.get('DJANGO_SUPERUSER_USERNAME')
+        password = os.environ.get('DJANGO_SUPERUSER_PASSWORD')
+        if not username or not password:
+            return 'DJANGO_SUPERUSER_USERNAME/PASSWORD not set, skipped'
+        User = get_user_model()
+        if User.objects.filter(username=username).exists():
+            return f'{username} exists'
+        User.objects.create_superuser(username, os.environ.get('DJANGO_SUPERUSER_EMAIL', ''), password)
+        return f'created {username}'
@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from codetests.analytics import case_statistics
+from codetests.models import Test
+
+
+class Command(BaseCommand):
+    help = 'Show per-test-case failure rates, runtimes and discrimination for a test (see codetests/analytics.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('test_id', type=int)
+        parser.add_argument('--json', action='store_true', help='Print the raw statistics as JSON')
+
+    def handle(self, *args, **options):
+        if not Test.objects.filter(pk=options['test_id']).exists():
+            raise CommandError(f'Test {options["test_id"]} does not exist')
+        stats = case_statistics(options['test_id'])
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        self.stdout.write(f'{stats["submissions"]} graded submissions of test {stats["test"]}')
+        if not stats['cases']:
+            return
+        self.stdout.write(f'{"case":>8} {"fail %":>7} {"p50 ms":>8} {"p99 ms":>8} {"p99 KiB":>8} {"disc":>6}')
+        # Most failed cases first
+        for case in sorted(stats['cases'], key=lambda case: -case['failure_rate']):
+            runtime = case['runtime_ms'] or {}
+            memory = case['memory_kb'] or {}
+            discrimination = case['discrimination']
+            label = str(case['test_case']) + ('' if case['exists'] else '*')
+            self.stdout.write(
+                f'{label:>8} {case["failure_rate"] * 100:>7.1f} {runtime.get("p50", 0):>8.1f} '
+                f'{runtime.get("p99", 0):>8.1f} {memory.get("p99", 0):>8.0f} '
+                f'{"-" if discrimination is None else f"{discrimination:.2f}":>6}'
+            )
+        if not all(case['exists'] for case in stats['cases']):
+            self.stdout.write('* case has since been deleted')
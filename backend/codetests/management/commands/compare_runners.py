@@ -0,0 +1,53 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from codetests.runner import arun_code, run_code
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare run_code() on a thread pool with arun_code() on one event loop, in this process. '
+        'Measures the runners only: no HTTP server, views or database are involved.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=200, help='Executions per runner')
+        parser.add_argument('--sleep', type=float, default=0.5, help='Seconds each program waits (simulates work)')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Threads calling run_code() (sized like gunicorn workers x threads, default 4 x 2)')
+        parser.add_argument('--concurrency', type=int, default=settings.CODE_EXECUTION_CONCURRENCY,
+                            help='arun_code() runs in flight on the event loop')
+
+    def handle(self, *args, **options):
+        code = f'import time\ntime.sleep({options["sleep"]})\nprint(int(input()) + 1)'
+        runs = options['runs']
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            sync_results = list(pool.map(lambda i: run_code(code, str(i)), range(runs)))
+        sync_elapsed = time.perf_counter() - started
+
+        async def run_all():
+            return await asyncio.gather(*(arun_code(code, str(i)) for i in range(runs)))
+
+        with override_settings(CODE_EXECUTION_CONCURRENCY=options['concurrency']):
+            started = time.perf_counter()
+            async_results = asyncio.run(run_all())
+            async_elapsed = time.perf_counter() - started
+
+        for label, results, elapsed, slots in (
+            (f'run_code   ({options["threads"]} threads)', sync_results, sync_elapsed, options['threads']),
+            (f'arun_code  ({options["concurrency"]} in flight)', async_results, async_elapsed,
+             options['concurrency']),
+        ):
+            ok = sum(1 for result in results if result.verdict == 'ok')
+            self.stdout.write(
+                f'{label:<34} {runs} runs in {elapsed:6.2f}s  {runs / elapsed:7.1f} runs/s  '
+                f'{ok}/{runs} ok  up to {slots} concurrent'
+            )
+        self.stdout.write(f'Speed-up: {sync_elapsed / async_elapsed:.1f}x')
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from codetests.archive import DEFAULT_INLINE_LIMIT, iter_records, write_archive
+from codetests.models import Test
+
+
+class Command(BaseCommand):
+    help = 'Export tests and test cases to a problem set archive (see codetests/archive.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help='Output path; .tar* stores large cases as separate members')
+        parser.add_argument('--ids', help='Comma-separated test ids to export (default: all)')
+        parser.add_argument('--inline-limit', type=int, default=DEFAULT_INLINE_LIMIT,
+                            help='Case payloads larger than this many bytes become separate tar members')
+
+    def handle(self, *args, **options):
+        queryset = Test.objects.all()
+        if options['ids']:
+            queryset = queryset.filter(id__in=[int(i) for i in options['ids'].split(',')])
+
+        started = time.monotonic()
+        count = write_archive(options['archive'], iter_records(queryset), inline_limit=options['inline_limit'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Exported {count} tests to {options["archive"]} in {elapsed:.1f}s'))
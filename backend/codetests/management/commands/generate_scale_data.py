@@ -0,0 +1,279 @@
+import csv
+import io
+import random
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from codetests.models import CodeBlob, CodeProgress, Submission, Test, TestCase
+from codetests.results import RESULT_FIELDS, pack_bitmap, pack_uint32
+
+User = get_user_model()
+
+LANGUAGES = [('python', 70), ('javascript', 15), ('java', 10), ('cpp', 5)]
+DIFFICULTIES = [('Easy', 40), ('Medium', 40), ('Hard', 20)]
+
+CODE_TEMPLATES = [
+    'def solution(data):\n    return {expr}\n\nprint(solution(input()))\n',
+    'import sys\n\nvalues = sys.stdin.read().split()\nprint({expr})\n',
+    'n = int(input())\nresult = 0\nfor i in range(n):\n    result += {expr}\nprint(result)\n',
+    'def helper(x):\n    if x < 2:\n        return x\n    return helper(x - 1) + {expr}\n\nprint(helper(int(input())))\n',
+]
+EXPRESSIONS = ['data[::-1]', 'len(values)', 'i * i', 'x - 2', 'sorted(values)', 'sum(map(int, values))', 'i % 7']
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, reproducible dataset for load testing and benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tests', type=int, default=100)
+        parser.add_argument('--cases', type=int, default=10, help='Test cases per test')
+        parser.add_argument('--submissions', type=int, default=100000)
+        parser.add_argument('--progress', type=int, default=None,
+                            help='CodeProgress rows (default: one per user for 10%% of tests, capped)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--days', type=int, default=90, help='Spread submissions over this many days')
+        parser.add_argument('--end-date', help='Last day of generated activity, YYYY-MM-DD (default: today)')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--prefix', default='scale', help='Prefix for generated usernames and test names')
+        parser.add_argument('--password', default='scalepass123', help='Password shared by all generated users')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_user_').exists():
+            raise CommandError(f'Data with prefix "{prefix}" already exists; use another --prefix')
+
+        end = (
+            datetime.strptime(options['end_date'], '%Y-%m-%d').date()
+            if options['end_date'] else datetime.now(dt_timezone.utc).date()
+        )
+        self.end = datetime.combine(end, dt_time.max, tzinfo=dt_timezone.utc)
+        self.days = options['days']
+
+        started = time.monotonic()
+        self.code_hashes = self.store_code()
+        user_ids = self.create_users(prefix, options['users'], options['password'])
+        test_ids = self.create_tests(prefix, options['tests'], options['cases'])
+        self.create_submissions(user_ids, test_ids, options['submissions'], options['cases'])
+        progress = options['progress']
+        if progress is None:
+            progress = min(len(user_ids) * max(1, len(test_ids) // 10), 1000000)
+        self.create_progress(user_ids, test_ids, progress)
+
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.1f}s'))
+
+    # Helpers
+
+    def weighted(self, choices):
+        values, weights = zip(*choices)
+        return self.rng.choices(values, weights)[0]
+
+    def store_code(self):
+        """Store every possible generated program once; returns text -> blob hash."""
+        blobs = [CodeBlob.for_text(template.format(expr=expr)) for template in CODE_TEMPLATES for expr in EXPRESSIONS]
+        CodeBlob.store(blobs)
+        return {blob.text: blob.hash for blob in blobs}
+
+    def random_code(self):
+        return self.rng.choice(CODE_TEMPLATES).format(expr=self.rng.choice(EXPRESSIONS))
+
+    def random_time(self):
+        # Most activity happens during the day, more of it in recent weeks
+        day = int(self.days * self.rng.betavariate(1, 2.5))
+        seconds = int(self.rng.gauss(15, 3.5) % 24 * 3600)
+        value = self.end - timedelta(days=day, seconds=86399 - seconds)
+        return connection.ops.adapt_datetimefield_value(value)
+
+    def report(self, label, count, started):
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed else count
+        self.stdout.write(f'  {label}: {count} rows in {elapsed:.1f}s ({rate:.0f} rows/s)')
+
+    def insert_rows(self, model, fields, rows):
+        """Insert value tuples for ``fields`` in batches (COPY on PostgreSQL)."""
+        columns = [model._meta.get_field(name).column for name in fields]
+        table = model._meta.db_table
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._write_batch(table, columns, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self._write_batch(table, columns, batch)
+            count += len(batch)
+        return count
+
+    def _write_batch(self, table, columns, batch):
+        quote = connection.ops.quote_name
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                buffer = io.StringIO()
+                # bytea columns take hex input
+                csv.writer(buffer).writerows(
+                    [('\\x' + value.hex()) if isinstance(value, bytes) else value for value in row] for row in batch
+                )
+                buffer.seek(0)
+                cursor.cursor.copy_expert(
+                    f'COPY {quote(table)} ({", ".join(map(quote, columns))}) FROM STDIN WITH (FORMAT csv)',
+                    buffer,
+                )
+            else:
+                placeholders = ', '.join(['%s'] * len(columns))
+                cursor.executemany(
+                    f'INSERT INTO {quote(table)} ({", ".join(map(quote, columns))}) VALUES ({placeholders})',
+                    batch,
+                )
+
+    # Generators
+
+    def create_users(self, prefix, count, password):
+        started = time.monotonic()
+        password_hash = make_password(password)  # hashed once, shared by every user
+        for start in range(0, count, self.batch_size):
+            User.objects.bulk_create([
+                User(
+                    username=f'{prefix}_user_{i}',
+                    email=f'{prefix}_user_{i}@example.com',
+                    password=password_hash,
+                )
+                for i in range(start, min(start + self.batch_size, count))
+            ])
+        user_ids = list(
+            User.objects.filter(username__startswith=f'{prefix}_user_').order_by('id').values_list('id', flat=True)
+        )
+        self.report('users', count, started)
+        return user_ids
+
+    def create_tests(self, prefix, count, cases_per_test):
+        started = time.monotonic()
+        tests = [
+            Test(
+                name=f'{prefix} problem {i}',
+                description=f'Generated problem {i}. ' + 'Read the input and print the answer. ' * self.rng.randint(2, 20),
+                time_limit=self.rng.choice([15, 20, 30, 45, 60, 90]),
+                difficulty=self.weighted(DIFFICULTIES),
+            )
+            for i in range(count)
+        ]
+        for start in range(0, count, self.batch_size):
+            Test.objects.bulk_create(tests[start:start + self.batch_size])
+        test_ids = list(
+            Test.objects.filter(name__startswith=f'{prefix} problem ').order_by('id').values_list('id', flat=True)
+        )
+
+        def cases():
+            for test_id in test_ids:
+                for k in range(cases_per_test):
+                    n = self.rng.randint(1, 10 ** self.rng.randint(1, 6))
+                    yield (test_id, str(n), str(n * n), k < 2)
+
+        case_count = self.insert_rows(TestCase, ['test', 'input_data', 'expected_output', 'is_sample'], cases())
+        self.report('tests', count, started)
+        self.report('test cases', case_count, started)
+        return test_ids
+
+    def create_submissions(self, user_ids, test_ids, count, cases_per_test):
+        if not user_ids or not test_ids:
+            return
+        started = time.monotonic()
+        # A few very active users and popular tests, a long tail of the rest
+        user_weights = [1 / (rank + 1) ** 0.8 for rank in range(len(user_ids))]
+        test_weights = [1 / (rank + 1) ** 1.1 for rank in range(len(test_ids))]
+        steps = max(cases_per_test, 1)
+        test_cases = self.case_profiles(test_ids)
+
+        def rows():
+            chunk = 10000
+            for start in range(0, count, chunk):
+                size = min(chunk, count - start)
+                users = self.rng.choices(user_ids, user_weights, k=size)
+                tests = self.rng.choices(test_ids, test_weights, k=size)
+                for user_id, test_id in zip(users, tests):
+                    if self.rng.random() < 0.35:
+                        passed = steps
+                    else:
+                        passed = int(round(self.rng.betavariate(2, 2.5) * steps))
+                    score = passed * 100 // steps
+                    yield (
+                        user_id,
+                        test_id,
+                        self.code_hashes[self.random_code()],
+                        self.weighted(LANGUAGES),
+                        'passed' if score >= 70 else 'failed',
+                        score,
+                        self.random_time(),
+                        *self.case_results(test_cases.get(test_id, ()), passed),
+                    )
+
+        written = self.insert_rows(
+            Submission,
+            ['user', 'test', 'code_blob', 'language', 'status', 'score', 'submitted_at'] + RESULT_FIELDS,
+            rows(),
+        )
+        self.report('submissions', written, started)
+
+    def case_profiles(self, test_ids):
+        """test id -> [(case id, difficulty, runtime factor)] in grading order."""
+        profiles = {}
+        for test_id, case_id in TestCase.objects.filter(test_id__in=test_ids).order_by('id').values_list('test', 'id'):
+            profiles.setdefault(test_id, []).append(
+                (case_id, self.rng.uniform(0.2, 5), self.rng.lognormvariate(0, 0.6))
+            )
+        return profiles
+
+    def case_results(self, cases, passed):
+        """Packed results failing the hardest-drawn ``len(cases) - passed`` cases."""
+        if not cases:
+            return b'', b'', b'', b''
+        failing = len(cases) - passed
+        if failing:
+            # Weighted sampling without replacement: harder cases fail more often
+            keys = [self.rng.random() ** (1 / difficulty) for _, difficulty, _ in cases]
+            failed = set(sorted(range(len(cases)), key=keys.__getitem__)[-failing:])
+        else:
+            failed = set()
+        runtime = self.rng.lognormvariate(10, 0.5)  # Microseconds, ~22 ms median
+        memory = int(self.rng.gauss(9500, 700))     # KiB
+        return (
+            pack_uint32([case_id for case_id, _, _ in cases]),
+            pack_bitmap([index not in failed for index in range(len(cases))]),
+            pack_uint32([runtime * factor for _, _, factor in cases]),
+            pack_uint32([memory] * len(cases)),
+        )
+
+    def create_progress(self, user_ids, test_ids, count):
+        count = min(count, len(user_ids) * len(test_ids))
+        if not count:
+            return
+        started = time.monotonic()
+        pairs = self.rng.sample(range(len(user_ids) * len(test_ids)), count)
+
+        def rows():
+            for pair in pairs:
+                user_id = user_ids[pair // len(test_ids)]
+                test_id = test_ids[pair % len(test_ids)]
+                code_hash = self.code_hashes[self.random_code()]
+                yield (
+                    user_id,
+                    test_id,
+                    code_hash,
+                    self.weighted(LANGUAGES),
+                    self.rng.randint(1, 60),
+                    code_hash,
+                    self.random_time(),
+                )
+
+        written = self.insert_rows(
+            CodeProgress, ['user', 'test', 'code_blob', 'language', 'version', 'content_hash', 'updated_at'], rows()
+        )
+        self.report('code progress', written, started)
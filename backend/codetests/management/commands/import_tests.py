@@ -0,0 +1,31 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from codetests.archive import ArchiveError, import_records, read_archive
+
+
+class Command(BaseCommand):
+    help = 'Import tests and test cases from a problem set archive (see codetests/archive.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archive', help='Path to a .jsonl[.gz|.bz2|.xz] or .tar[.gz|.bz2|.xz] archive')
+        parser.add_argument('--batch-size', type=int, default=500, help='Tests per bulk insert')
+
+    def handle(self, *args, **options):
+        path = options['archive']
+        if not os.path.exists(path):
+            raise CommandError(f'Archive not found: {path}')
+
+        self.stdout.write(f'Importing tests from {path}...')
+        started = time.monotonic()
+        try:
+            created, skipped = import_records(read_archive(path), batch_size=options['batch_size'])
+        except ArchiveError as e:
+            raise CommandError(f'Invalid archive, nothing imported: {e}')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} tests ({skipped} duplicates skipped) in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from codetests.models import CodeSignature, LSHBucket, Submission
+from codetests.similarity import index_submissions
+
+
+class Command(BaseCommand):
+    help = 'Add graded submissions to the near-duplicate index (see codetests/similarity.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, action='append', dest='tests',
+                            help='Only index submissions to this test id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Drop the existing index of the selected tests and index every submission again')
+
+    def handle(self, *args, **options):
+        submissions = Submission.objects.exclude(status='pending')
+        if options['tests']:
+            submissions = submissions.filter(test_id__in=options['tests'])
+
+        if options['rebuild']:
+            signatures = CodeSignature.objects.all()
+            buckets = LSHBucket.objects.all()
+            if options['tests']:
+                signatures = signatures.filter(test_id__in=options['tests'])
+                buckets = buckets.filter(test_id__in=options['tests'])
+            buckets.delete()
+            signatures.delete()
+        else:
+            submissions = submissions.filter(signature__isnull=True)
+
+        submissions = submissions.select_related('code_blob').order_by('pk')
+        indexed = 0
+        last_pk = 0
+        while True:
+            batch = list(submissions.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            indexed += index_submissions((submission, submission.code) for submission in batch)
+            self.stdout.write(f'{indexed} submissions indexed')
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} submissions'))
@@ -19,6 +19,11 @@ class Command(BaseCommand):
             )
             self.stdout.write(self.style.SUCCESS('Created test user: testuser/testpass123'))
 
+        # Sample tests are created once; running again leaves them alone
+        if Test.objects.filter(name='Two Sum').exists():
+            self.stdout.write('Sample tests already exist')
+            return
+
         # Create sample tests
         test1 = Test.objects.create(
             name='Two Sum',
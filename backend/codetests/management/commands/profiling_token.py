@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from coding_platform.profiling import HEADER, make_token
+
+
+class Command(BaseCommand):
+    help = 'Print a signed token that makes a request profiled (see coding_platform/profiling.py)'
+
+    def handle(self, *args, **options):
+        token = make_token()
+        self.stdout.write(token)
+        self.stderr.write(
+            f'Send it as "{HEADER}: {token}" (valid for {settings.PROFILING["TOKEN_MAX_AGE"]}s); '
+            f'profiles are written to {settings.PROFILING["DIR"]}'
+        )
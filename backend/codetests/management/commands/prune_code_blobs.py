@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import ProtectedError, Sum
+from django.utils import timezone
+
+from codetests.models import CodeBlob, CodeProgress, Submission
+
+
+class Command(BaseCommand):
+    help = 'Delete code blobs no submission or saved progress refers to any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=float, default=24,
+                            help='Keep blobs stored within this many hours (they may be about to be referenced)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['min_age'])
+        unused = (
+            CodeBlob.objects.filter(stored_at__lt=cutoff)
+            .exclude(hash__in=Submission.objects.values('code_blob'))
+            .exclude(hash__in=CodeProgress.objects.values('code_blob'))
+        )
+        if options['dry_run']:
+            totals = unused.aggregate(bytes=Sum('size'))
+            self.stdout.write(f'{unused.count()} unused blobs ({totals["bytes"] or 0} bytes of code)')
+            return
+
+        deleted = 0
+        while True:
+            batch = list(unused.values_list('hash', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            try:
+                # Re-checked by the delete itself, so a blob referenced meanwhile survives
+                count, _ = unused.filter(hash__in=batch).delete()
+            except ProtectedError:
+                continue
+            deleted += count
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} unused code blobs'))
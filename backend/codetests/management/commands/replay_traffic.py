@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from coding_platform.replay import DEFAULT_PASSWORD, Replayer, load_recording, prepare_users, summarize, test_id_map
+from codetests.models import Test
+
+
+class Command(BaseCommand):
+    help = 'Replay recorded API traffic against a server and report throughput and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('recording', help='JSONL file written by the traffic recorder')
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='Replay rate multiplier (2 = twice as fast; 0 = as fast as possible)')
+        parser.add_argument('--concurrency', type=int, default=16, help='Maximum requests in flight')
+        parser.add_argument('--limit', type=int, help='Replay only the first N requests')
+        parser.add_argument('--remap-tests', action='store_true',
+                            help='Map recorded test ids onto the tests that exist locally')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help='Password of the replay accounts')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+        parser.add_argument('--output', help='Write the summary as JSON to this path')
+
+    def handle(self, *args, **options):
+        if options['speed'] < 0:
+            raise CommandError('--speed must not be negative')
+        try:
+            records = load_recording(options['recording'], limit=options['limit'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read recording: {e}')
+
+        # Accounts and tokens are created in this database, which must be the server's
+        tokens = prepare_users(records, password=options['password'])
+        test_ids = {}
+        if options['remap_tests']:
+            test_ids = test_id_map(records, list(Test.objects.order_by('id').values_list('id', flat=True)))
+
+        replayer = Replayer(
+            options['base_url'], tokens, password=options['password'], test_ids=test_ids, timeout=options['timeout']
+        )
+        self.stdout.write(
+            f'Replaying {len(records)} requests from {len(tokens)} users at {options["speed"] or "max"}x '
+            f'with concurrency {options["concurrency"]}...'
+        )
+        outcomes, elapsed = replayer.replay(records, speed=options['speed'], concurrency=options['concurrency'])
+        summary = summarize(outcomes, elapsed)
+
+        if not outcomes:
+            self.stdout.write('Nothing to replay')
+            return
+        self.stdout.write(
+            f'{summary["requests"]} requests in {summary["elapsed_s"]}s: {summary["throughput_rps"]} req/s, '
+            f'error rate {summary["error_rate"]:.2%}, {summary["status_mismatches"]} status mismatches, '
+            f'max schedule lag {summary["max_lag_ms"]}ms'
+        )
+        self.stdout.write(
+            f'latency p50 {summary["p50_ms"]}ms  p95 {summary["p95_ms"]}ms  p99 {summary["p99_ms"]}ms'
+        )
+        for route, stats in summary['routes'].items():
+            self.stdout.write(
+                f'  {route:<32} {stats["requests"]:>6} req  {stats["errors"]:>4} err  '
+                f'p50 {stats["p50_ms"]:>8}ms  p95 {stats["p95_ms"]:>8}ms  p99 {stats["p99_ms"]:>8}ms'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(summary, f, indent=2)
+            self.stdout.write(f'Summary written to {options["output"]}')
@@ -0,0 +1,66 @@
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = 'Summarise recorded traces by span path (see coding_platform/tracing.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None, help='Trace file (default: TRACING["FILE"])')
+        parser.add_argument('--route', help='Only traces of this route (URL name, e.g. test-submit)')
+        parser.add_argument('--sort', choices=['total', 'p95', 'max', 'count'], default='total')
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        path = options['file'] or settings.TRACING['FILE']
+        traces = defaultdict(dict)
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        traces[record['trace_id']][record['span_id']] = record
+        except FileNotFoundError:
+            raise CommandError(f'No trace file at {path}')
+
+        durations = defaultdict(list)
+        for spans in traces.values():
+            root = next((s for s in spans.values() if s['parent_id'] is None), None)
+            if root is None or (options['route'] and root['attrs'].get('route') != options['route']):
+                continue
+            route = root['attrs'].get('route', '?')
+            for record in spans.values():
+                names = []
+                current = record
+                while current is not None:
+                    names.append(current['name'])
+                    current = spans.get(current['parent_id'])
+                names[-1] = f'{names[-1]} {route}'
+                durations[' > '.join(reversed(names))].append(record['duration_ms'])
+
+        rows = []
+        for span_path, values in durations.items():
+            values.sort()
+            rows.append({
+                'path': span_path,
+                'count': len(values),
+                'total': sum(values),
+                'p95': percentile(values, 95),
+                'max': values[-1],
+            })
+        rows.sort(key=lambda row: row[options['sort']], reverse=True)
+
+        self.stdout.write(f'{len(traces)} traces in {path}')
+        self.stdout.write(f'{"total ms":>12} {"count":>7} {"mean ms":>9} {"p95 ms":>9} {"max ms":>9}  span path')
+        for row in rows[:options['limit']]:
+            self.stdout.write(
+                f'{row["total"]:12.1f} {row["count"]:7d} {row["total"] / row["count"]:9.2f} '
+                f'{row["p95"]:9.2f} {row["max"]:9.2f}  {row["path"]}'
+            )
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:19
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_content_hashes(apps, schema_editor):
+    CodeProgress = apps.get_model('codetests', 'CodeProgress')
+    batch = []
+    for progress in CodeProgress.objects.only('id', 'code').iterator(chunk_size=1000):
+        progress.content_hash = hashlib.sha256(progress.code.encode('utf-8')).hexdigest()
+        batch.append(progress)
+        if len(batch) >= 1000:
+            CodeProgress.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    if batch:
+        CodeProgress.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codetests', '0002_test_created_at_test_updated_at_testcase_is_sample_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codeprogress',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='codeprogress',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='CodeProgressRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('language', models.CharField(default='python', max_length=50)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('is_snapshot', models.BooleanField(default=False)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('progress', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='codetests.codeprogress')),
+            ],
+            options={
+                'ordering': ['-version'],
+                'unique_together': {('progress', 'version')},
+            },
+        ),
+        migrations.RunPython(backfill_content_hashes, migrations.RunPython.noop),
+    ]
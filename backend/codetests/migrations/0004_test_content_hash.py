@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codetests', '0003_codeprogress_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
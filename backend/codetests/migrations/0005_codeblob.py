@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codetests', '0004_test_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeBlob',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('stored_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='code_blob',
+            field=models.ForeignKey(db_column='code_hash', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='codetests.codeblob'),
+        ),
+        migrations.AddField(
+            model_name='codeprogress',
+            name='code_blob',
+            field=models.ForeignKey(db_column='code_hash', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='codetests.codeblob'),
+        ),
+    ]
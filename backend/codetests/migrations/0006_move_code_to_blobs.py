@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:04
+
+import hashlib
+import zlib
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+
+def move_code(apps, model_name):
+    # Each batch commits on its own, so large tables are converted without one
+    # long transaction and an interrupted run resumes where it stopped
+    CodeBlob = apps.get_model('codetests', 'CodeBlob')
+    Model = apps.get_model('codetests', model_name)
+    last_pk = 0
+    while True:
+        rows = list(
+            Model.objects.filter(pk__gt=last_pk, code_blob__isnull=True)
+            .order_by('pk').values_list('pk', 'code')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        blobs = {}
+        updates = []
+        for pk, code in rows:
+            raw = code.encode('utf-8')
+            digest = hashlib.sha256(raw).hexdigest()
+            if digest not in blobs:
+                blobs[digest] = CodeBlob(hash=digest, data=zlib.compress(raw, 6), size=len(raw))
+            updates.append(Model(pk=pk, code_blob_id=digest))
+        with transaction.atomic():
+            CodeBlob.objects.bulk_create(blobs.values(), ignore_conflicts=True)
+            Model.objects.bulk_update(updates, ['code_blob'])
+        last_pk = rows[-1][0]
+
+
+def restore_code(apps, model_name):
+    Model = apps.get_model('codetests', model_name)
+    last_pk = 0
+    while True:
+        rows = list(
+            Model.objects.filter(pk__gt=last_pk)
+            .order_by('pk').values_list('pk', 'code_blob__data')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        updates = [Model(pk=pk, code=zlib.decompress(data).decode('utf-8')) for pk, data in rows]
+        with transaction.atomic():
+            Model.objects.bulk_update(updates, ['code'])
+        last_pk = rows[-1][0]
+
+
+def forwards(apps, schema_editor):
+    for model_name in ('Submission', 'CodeProgress'):
+        move_code(apps, model_name)
+
+
+def backwards(apps, schema_editor):
+    for model_name in ('Submission', 'CodeProgress'):
+        restore_code(apps, model_name)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('codetests', '0005_codeblob'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codetests', '0006_move_code_to_blobs'),
+    ]
+
+    operations = [
+        # A default lets the columns be added back (and refilled by 0006) when unapplying
+        migrations.AlterField(
+            model_name='submission',
+            name='code',
+            field=models.TextField(default=''),
+        ),
+        migrations.AlterField(
+            model_name='codeprogress',
+            name='code',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='submission',
+            name='code',
+        ),
+        migrations.RemoveField(
+            model_name='codeprogress',
+            name='code',
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='code_blob',
+            field=models.ForeignKey(db_column='code_hash', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='codetests.codeblob'),
+        ),
+        migrations.AlterField(
+            model_name='codeprogress',
+            name='code_blob',
+            field=models.ForeignKey(db_column='code_hash', on_delete=django.db.models.deletion.PROTECT, related_name='+', to='codetests.codeblob'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codetests', '0008_archive_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='case_ids',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='case_memory',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='case_passed',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='case_runtimes',
+            field=models.BinaryField(default=b''),
+        ),
+    ]
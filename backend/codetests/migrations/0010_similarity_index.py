@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codetests', '0009_submission_case_results'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeSignature',
+            fields=[
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='codetests.submission')),
+                ('minhash', models.BinaryField()),
+                ('tokens', models.PositiveIntegerField(default=0)),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='codetests.test')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('key', models.BigIntegerField()),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='codetests.submission')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='codetests.test')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['test', 'band', 'key'], name='codetests_l_test_id_e19f19_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations
+
+# A snapshot of the index in codetests/search.py as of this migration; later
+# changes to that module must not change what this migration does
+
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS codetests_test_fts USING fts5("
+    "name, description, content='codetests_test', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS codetests_test_fts_insert AFTER INSERT ON codetests_test BEGIN "
+    "INSERT INTO codetests_test_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS codetests_test_fts_delete AFTER DELETE ON codetests_test BEGIN "
+    "INSERT INTO codetests_test_fts(codetests_test_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS codetests_test_fts_update AFTER UPDATE OF name, description ON codetests_test BEGIN "
+    "INSERT INTO codetests_test_fts(codetests_test_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO codetests_test_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    # Index the tests that already exist
+    "INSERT INTO codetests_test_fts(codetests_test_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REMOVE = [
+    "DROP TRIGGER IF EXISTS codetests_test_fts_insert",
+    "DROP TRIGGER IF EXISTS codetests_test_fts_delete",
+    "DROP TRIGGER IF EXISTS codetests_test_fts_update",
+    "DROP TABLE IF EXISTS codetests_test_fts",
+]
+
+POSTGRES_INSTALL = [
+    "ALTER TABLE codetests_test ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS codetests_test_search_idx ON codetests_test USING gin (search_vector)",
+]
+
+POSTGRES_REMOVE = [
+    "DROP INDEX IF EXISTS codetests_test_search_idx",
+    "ALTER TABLE codetests_test DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for statement in statements.get(vendor, []):
+            schema_editor.execute(statement, params=None)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codetests', '0010_similarity_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_INSTALL, 'postgresql': POSTGRES_INSTALL}),
+            run({'sqlite': SQLITE_REMOVE, 'postgresql': POSTGRES_REMOVE}),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codetests', '0011_test_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='codeprogress',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='submitted_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codetests', '0012_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SharedCacheEntry',
+            fields=[
+                ('cache_key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('value', models.TextField()),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'shared_cache',
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:56
+
+import json
+import zlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def index_chunks(apps, schema_editor):
+    ArchiveChunk = apps.get_model('codetests', 'ArchiveChunk')
+    ArchivedRow = apps.get_model('codetests', 'ArchivedRow')
+    for chunk in ArchiveChunk.objects.order_by('pk').iterator(chunk_size=100):
+        rows = json.loads(zlib.decompress(bytes(chunk.data)).decode('utf-8'))
+        ArchivedRow.objects.bulk_create(
+            ArchivedRow(chunk_id=chunk.pk, kind=chunk.kind, user_id=chunk.user_id, row_id=row['id'], test_id=row['test'])
+            for row in rows
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codetests', '0013_shared_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='archivechunk',
+            options={'ordering': ['-period', '-part']},
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivechunk',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='archivechunk',
+            name='part',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivechunk',
+            unique_together={('kind', 'user', 'period', 'part')},
+        ),
+        migrations.CreateModel(
+            name='ArchivedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('submission', 'Submission'), ('progress', 'Code progress')], max_length=20)),
+                ('row_id', models.BigIntegerField()),
+                ('test_id', models.BigIntegerField()),
+                ('chunk', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='index', to='codetests.archivechunk')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'user', 'row_id'], name='codetests_a_kind_e2936c_idx'), models.Index(fields=['kind', 'user', 'test_id'], name='codetests_a_kind_d73abf_idx')],
+            },
+        ),
+        migrations.RunPython(index_chunks, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,13 @@
+import hashlib
+import zlib
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+CODE_COMPRESSION_LEVEL = 6
+
 class Test(models.Model):
     DIFFICULTY_CHOICES = [
         ('Easy', 'Easy'),
@@ -16,6 +21,11 @@ class Test(models.Model):
     difficulty = models.CharField(max_length=50, choices=DIFFICULTY_CHOICES, default='Medium')
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
+    # SHA-256 of the test and its cases, used to deduplicate imports; cleared
+    # whenever the test or its cases change and recomputed on demand
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    # Once closed, saved progress for the test is moved to the archive
+    closed_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -29,7 +39,73 @@ class TestCase(models.Model):
     def __str__(self):
         return f"Test case for {self.test.name}"
 
-class Submission(models.Model):
+class CodeBlob(models.Model):
+    """
+    Source code stored once per distinct text.
+
+    Keyed by the SHA-256 of the UTF-8 text (the same digest as
+    CodeProgress.content_hash) and zlib-compressed. ``stored_at`` is refreshed
+    every time the text is stored again, so ``prune_code_blobs`` only removes
+    blobs that are unreferenced and have not been stored recently.
+    """
+    hash = models.CharField(max_length=64, primary_key=True)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField()  # Length of the uncompressed text in bytes
+    stored_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def for_text(cls, text):
+        """An unsaved blob holding ``text``."""
+        raw = text.encode('utf-8')
+        return cls(hash=hashlib.sha256(raw).hexdigest(), data=zlib.compress(raw, CODE_COMPRESSION_LEVEL), size=len(raw))
+
+    @classmethod
+    def store(cls, blobs):
+        """Insert ``blobs`` that do not exist yet and refresh ``stored_at`` of the others."""
+        distinct = {blob.hash: blob for blob in blobs}
+        cls.objects.bulk_create(
+            distinct.values(), update_conflicts=True, unique_fields=['hash'], update_fields=['stored_at']
+        )
+
+    @property
+    def text(self):
+        return zlib.decompress(self.data).decode('utf-8')
+
+    def __str__(self):
+        return self.hash
+
+
+class StoredCode(models.Model):
+    """
+    Base for rows whose source lives in a CodeBlob.
+
+    ``code`` reads and writes the text; the blob is fetched on first access
+    (use ``select_related('code_blob')`` when listing code) and stored by
+    ``save()``. Code paths that bypass ``save()`` (bulk_create, update) must
+    call ``CodeBlob.store()`` themselves.
+    """
+    code_blob = models.ForeignKey(CodeBlob, on_delete=models.PROTECT, related_name='+', db_column='code_hash')
+
+    class Meta:
+        abstract = True
+
+    @property
+    def code(self):
+        return self.code_blob.text
+
+    @code.setter
+    def code(self, value):
+        self.code_blob = None if value is None else CodeBlob.for_text(value)
+        self._code_blob_unsaved = value is not None
+
+    def save(self, *args, **kwargs):
+        if getattr(self, '_code_blob_unsaved', False):
+            CodeBlob.store([self.code_blob])
+            self._code_blob_unsaved = False
+        super().save(*args, **kwargs)
+
+
+class Submission(StoredCode):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('passed', 'Passed'),
@@ -38,21 +114,26 @@ class Submission(models.Model):
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submissions')
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='submissions')
-    code = models.TextField()
     language = models.CharField(max_length=50)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     score = models.IntegerField(default=0)
-    submitted_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Packed per-case results, see codetests/results.py
+    case_ids = models.BinaryField(default=b'')
+    case_passed = models.BinaryField(default=b'')
+    case_runtimes = models.BinaryField(default=b'')
+    case_memory = models.BinaryField(default=b'')
     
     def __str__(self):
         return f"{self.user.username} - {self.test.name}"
 
-class CodeProgress(models.Model):
+class CodeProgress(StoredCode):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='code_progress')
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='code_progress')
-    code = models.TextField()
     language = models.CharField(max_length=50, default='python')
-    updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1)  # Bumped on every change
+    content_hash = models.CharField(max_length=64, blank=True, default='')  # SHA-256 of code
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         unique_together = ('user', 'test')
@@ -60,3 +141,117 @@ class CodeProgress(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.test.name} progress"
 
+class CodeProgressRevision(models.Model):
+    """
+    An older version of a CodeProgress.
+
+    The current code lives on CodeProgress; each revision stores a compressed
+    reverse delta from the next version back to this one, or a full snapshot
+    every few revisions so that reconstruction stays cheap.
+    """
+    progress = models.ForeignKey(CodeProgress, on_delete=models.CASCADE, related_name='revisions')
+    version = models.PositiveIntegerField()
+    language = models.CharField(max_length=50, default='python')
+    content_hash = models.CharField(max_length=64)
+    is_snapshot = models.BooleanField(default=False)
+    data = models.BinaryField()  # zlib-compressed JSON delta or snapshot text
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('progress', 'version')
+        ordering = ['-version']
+
+    def __str__(self):
+        return f"Revision {self.version} of progress {self.progress_id}"
+
+
+
+class ArchiveChunk(models.Model):
+    """
+    Archived submissions or code progress of one user for one month, split
+    into parts of bounded size.
+
+    ``data`` is the zlib-compressed JSON list of the rows as the API serializes
+    them, so archived rows can be returned without touching the hot tables
+    (see codetests/retention.py).
+    """
+    KIND_CHOICES = [
+        ('submission', 'Submission'),
+        ('progress', 'Code progress'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    period = models.DateField()  # First day of the month the rows belong to
+    part = models.PositiveIntegerField(default=0)
+    rows = models.PositiveIntegerField(default=0)
+    data = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('kind', 'user', 'period', 'part')
+        ordering = ['-period', '-part']
+
+    def __str__(self):
+        return f"{self.rows} archived {self.kind} rows of user {self.user_id} for {self.period:%Y-%m}"
+
+
+class ArchivedRow(models.Model):
+    """Which chunk holds an archived row, so reads only unpack the chunks they need."""
+    chunk = models.ForeignKey(ArchiveChunk, on_delete=models.CASCADE, related_name='index')
+    kind = models.CharField(max_length=20, choices=ArchiveChunk.KIND_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    row_id = models.BigIntegerField()  # Primary key the row had in its hot table
+    test_id = models.BigIntegerField()  # Not a foreign key: archived rows outlive their tests
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'user', 'row_id']),
+            models.Index(fields=['kind', 'user', 'test_id']),
+        ]
+
+    def __str__(self):
+        return f"Archived {self.kind} {self.row_id} in chunk {self.chunk_id}"
+
+
+class CodeSignature(models.Model):
+    """MinHash signature of a graded submission (see codetests/similarity.py)."""
+    submission = models.OneToOneField(Submission, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    minhash = models.BinaryField()  # Little-endian uint32 per permutation
+    tokens = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Signature of submission {self.submission_id}"
+
+
+class LSHBucket(models.Model):
+    """One band of a submission's signature hashed into a bucket of its test's LSH index."""
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='+')
+    band = models.PositiveSmallIntegerField()
+    key = models.BigIntegerField()
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        indexes = [models.Index(fields=['test', 'band', 'key'])]
+
+    def __str__(self):
+        return f"Band {self.band} bucket {self.key} of test {self.test_id}"
+
+
+class SharedCacheEntry(models.Model):
+    """
+    Entry of the ``shared`` cache when no Redis is configured: state every
+    worker must see, such as cancel flags and idempotency keys. Read and written
+    by Django's DatabaseCache, never through the ORM.
+    """
+    cache_key = models.CharField(max_length=255, primary_key=True)
+    value = models.TextField()
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'shared_cache'
+
+    def __str__(self):
+        return self.cache_key
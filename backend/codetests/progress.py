@@ -0,0 +1,279 @@
+"""
+Autosave for CodeProgress.
+
+A save carries either the full source or a delta against the version the
+client last saw, identified by its content hash. Saves that would not change
+anything are recognised from a small state cache and answered with at most a
+one-column read: the cached state is trusted on its own only when the cache
+is shared between workers and the client's ``base_version`` matches it;
+otherwise it is confirmed against the stored version first, since another
+worker may have saved in between. Real writes use ``CodeProgress.version``
+for optimistic concurrency. Every change keeps the previous version as a
+compressed CodeProgressRevision.
+"""
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from . import writebehind
+from .deltas import apply_delta, compute_delta, content_hash, pack, unpack
+from .models import CodeBlob, CodeProgress, CodeProgressRevision
+
+SNAPSHOT_INTERVAL = 20  # Store a full snapshot once the last one is N versions old
+HISTORY_LIMIT = 200     # Revisions kept per CodeProgress
+STATE_TIMEOUT = 60 * 60
+
+
+class ProgressConflict(Exception):
+    """The client's base version no longer matches the stored progress."""
+
+    def __init__(self, state=None):
+        super().__init__('Code progress has changed')
+        self.state = state
+
+
+def _state_key(user_id, test_id):
+    return f'code-progress:{user_id}:{test_id}'
+
+
+def progress_state(progress):
+    return {
+        'version': progress.version,
+        'content_hash': progress.content_hash or content_hash(progress.code),
+        'language': progress.language,
+    }
+
+
+def _remember(user_id, test_id, state):
+    cache.set(_state_key(user_id, test_id), state, STATE_TIMEOUT)
+    return state
+
+
+def remember_state(progress):
+    """Cache the version/hash of ``progress`` so unchanged saves skip the DB."""
+    return _remember(progress.user_id, progress.test_id, progress_state(progress))
+
+
+def forget_state(user_id, test_id):
+    cache.delete(_state_key(user_id, test_id))
+
+
+def _is_noop(state, language, code=None, delta=None, base_hash=None):
+    if state is None or state['language'] != language:
+        return False
+    if delta is not None:
+        return not delta and base_hash == state['content_hash']
+    return content_hash(code) == state['content_hash']
+
+
+def _stored_state(user_id, test_id):
+    """Version, hash and language of the latest saved code, without loading the code."""
+    pending = writebehind.buffer.get(user_id, test_id) if writebehind.is_enabled() else None
+    if pending is not None:
+        return {'version': pending.version, 'content_hash': pending.content_hash, 'language': pending.language}
+    return CodeProgress.objects.filter(user_id=user_id, test_id=test_id).values(
+        'version', 'content_hash', 'language'
+    ).first()
+
+
+def _confirm_noop(user_id, test_id, state, base_version):
+    """The current state if a save recognised as a no-op against cached ``state`` really is one."""
+    if base_version is not None and base_version != state['version']:
+        return None
+    # A per-process cache misses saves handled by other workers
+    if base_version is not None and not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+        return state
+    stored = _stored_state(user_id, test_id)
+    if stored is None or stored['content_hash'] != state['content_hash'] or stored['language'] != state['language']:
+        return None
+    if base_version is not None and base_version != stored['version']:
+        return None
+    return _remember(user_id, test_id, stored)
+
+
+def save_progress(user_id, test_id, language, code=None, delta=None, base_hash=None, base_version=None):
+    """
+    Save code progress.
+
+    Returns ``(progress, state, changed)`` where ``progress`` is None when the
+    save was answered from the state cache. Raises ProgressConflict when
+    ``base_hash``/``base_version`` do not match the stored version and
+    ``deltas.InvalidDelta`` when the delta cannot be applied.
+    """
+    state = cache.get(_state_key(user_id, test_id))
+    if _is_noop(state, language, code, delta, base_hash):
+        confirmed = _confirm_noop(user_id, test_id, state, base_version)
+        if confirmed is not None:
+            return None, confirmed, False
+
+    if writebehind.is_enabled():
+        return _buffered_save(user_id, test_id, language, code, delta, base_hash, base_version)
+
+    with transaction.atomic():
+        progress = CodeProgress.objects.select_related('code_blob').filter(user_id=user_id, test_id=test_id).first()
+
+        if progress is None:
+            if delta is not None or base_version:
+                raise ProgressConflict()
+            progress = CodeProgress(
+                user_id=user_id,
+                test_id=test_id,
+                code=code,
+                language=language,
+                content_hash=content_hash(code),
+            )
+            try:
+                with transaction.atomic():
+                    progress.save()
+            except IntegrityError:
+                raise ProgressConflict()
+            return progress, remember_state(progress), True
+
+        current = progress_state(progress)
+        if delta is not None:
+            if base_hash != current['content_hash']:
+                raise ProgressConflict(current)
+            code = apply_delta(progress.code, delta)
+
+        blob = CodeBlob.for_text(code)
+        new_hash = blob.hash
+        if new_hash == current['content_hash'] and language == progress.language:
+            return progress, remember_state(progress), False
+        if base_version is not None and base_version != progress.version:
+            raise ProgressConflict(current)
+
+        try:
+            with transaction.atomic():
+                _record_revision(progress, code)
+        except IntegrityError:
+            raise ProgressConflict(current)
+        CodeBlob.store([blob])
+        updated = CodeProgress.objects.filter(pk=progress.pk, version=progress.version).update(
+            code_blob=blob,
+            language=language,
+            content_hash=new_hash,
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            raise ProgressConflict(current)
+
+    progress.code_blob = blob
+    progress.language = language
+    progress.content_hash = new_hash
+    progress.version += 1
+    progress.updated_at = timezone.now()
+    return progress, remember_state(progress), True
+
+
+def last_snapshots(progress_ids):
+    """Version of the newest snapshot revision of each progress id that has one."""
+    return dict(
+        CodeProgressRevision.objects.filter(progress_id__in=progress_ids, is_snapshot=True)
+        .values('progress_id').annotate(last=Max('version')).values_list('progress_id', 'last')
+    )
+
+
+def build_revision(progress_id, version, language, code_hash, old_code, new_code, last_snapshot=None):
+    """
+    An unsaved revision keeping ``old_code`` before it is replaced by ``new_code``.
+
+    ``last_snapshot`` is the version of the newest snapshot revision (None if
+    there is none). Versions are counted from it rather than taken modulo the
+    interval, because coalesced write-behind saves skip version numbers.
+    """
+    is_snapshot = last_snapshot is None or version - last_snapshot >= SNAPSHOT_INTERVAL
+    payload = old_code if is_snapshot else compute_delta(new_code, old_code)
+    return CodeProgressRevision(
+        progress_id=progress_id,
+        version=version,
+        language=language,
+        content_hash=code_hash or content_hash(old_code),
+        is_snapshot=is_snapshot,
+        data=pack(payload),
+    )
+
+
+def prune_revisions(progress_id, version):
+    """Drop revisions that fell out of the history window after ``version``."""
+    if version > HISTORY_LIMIT:
+        CodeProgressRevision.objects.filter(
+            progress_id=progress_id, version__lte=version - HISTORY_LIMIT
+        ).delete()
+
+
+def _buffered_save(user_id, test_id, language, code, delta, base_hash, base_version):
+    """save_progress() for write-behind mode: validate against the latest state and buffer."""
+    pending = writebehind.buffer.get(user_id, test_id)
+    if pending is not None:
+        current = {'version': pending.version, 'content_hash': pending.content_hash, 'language': pending.language}
+        current_code = pending.code
+        persisted = pending.persisted
+    else:
+        progress = CodeProgress.objects.select_related('code_blob').filter(user_id=user_id, test_id=test_id).first()
+        if progress is None:
+            if delta is not None or base_version:
+                raise ProgressConflict()
+            current, current_code, persisted = None, None, None
+        else:
+            current = progress_state(progress)
+            current_code = progress.code
+            persisted = (progress.pk, progress.code, progress.language, current['content_hash'], progress.version)
+
+    if delta is not None:
+        if base_hash != current['content_hash']:
+            raise ProgressConflict(current)
+        code = apply_delta(current_code, delta)
+
+    new_hash = content_hash(code)
+    if current is not None:
+        if new_hash == current['content_hash'] and language == current['language']:
+            return None, _remember(user_id, test_id, current), False
+        if base_version is not None and base_version != current['version']:
+            raise ProgressConflict(current)
+
+    entry = writebehind.buffer_save(
+        user_id, test_id, code, language, new_hash,
+        version=current['version'] + 1 if current else 1,
+        persisted=persisted,
+        based_on=pending,
+    )
+    progress = entry.as_progress()
+    return progress, remember_state(progress), True
+
+
+def _record_revision(progress, new_code):
+    """Keep the stored version of ``progress`` before it is replaced by ``new_code``."""
+    revision = build_revision(
+        progress.pk, progress.version, progress.language, progress.content_hash, progress.code, new_code,
+        last_snapshot=last_snapshots([progress.pk]).get(progress.pk),
+    )
+    revision.save()
+    if revision.is_snapshot:
+        prune_revisions(progress.pk, revision.version)
+
+
+def revision_code(progress, version):
+    """Reconstruct the code of ``progress`` at ``version``."""
+    if version == progress.version:
+        return progress.code
+
+    revisions = progress.revisions.filter(version__gte=version, version__lt=progress.version)
+    snapshot = revisions.filter(is_snapshot=True).order_by('version').first()
+    if snapshot is not None:
+        if snapshot.version == version:
+            return unpack(snapshot.data)
+        code = unpack(snapshot.data)
+        revisions = revisions.filter(version__lt=snapshot.version)
+    else:
+        code = progress.code
+
+    chain = list(revisions.order_by('-version').values_list('version', 'data'))
+    if not chain or chain[-1][0] != version:
+        raise CodeProgressRevision.DoesNotExist
+    for _, data in chain:
+        code = apply_delta(code, unpack(data))
+    return code
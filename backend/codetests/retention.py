@@ -0,0 +1,143 @@
+"""
+Archival of old submissions and of code progress for closed tests.
+
+``archive_submissions()`` moves submissions older than the retention window,
+and ``archive_progress()`` the saved progress of tests whose ``closed_at`` has
+passed, into ArchiveChunk rows: compressed chunks per (kind, user, month)
+holding the rows exactly as the API serializes them. Rows are read in primary
+key order in batches; each batch is appended to the last chunk of its month
+(a new part is started once that holds ``CHUNK_ROWS`` rows, so archiving
+never rewrites more than one bounded chunk per month), indexed in ArchivedRow
+and deleted from the hot table in one transaction, so an interrupted run
+loses or duplicates nothing and simply resumes.
+
+Code blobs of archived rows are copied into the chunk; the blobs themselves
+become unreferenced and are removed by ``prune_code_blobs``. Revision history
+of archived progress is not kept.
+
+``archived_submissions()``, ``archived_submission()`` and
+``archived_progress()`` read the chunks back for the API, unpacking only the
+chunks the index lists for the requested test or row.
+"""
+
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .deltas import pack, unpack
+from .models import ArchiveChunk, ArchivedRow, CodeProgress, Submission
+from .serializers import CodeProgressSerializer, SubmissionSerializer
+
+DEFAULT_BATCH_SIZE = 1000
+CHUNK_ROWS = 500  # Rows per chunk part
+
+
+def period_of(value):
+    """First day of the month of a datetime, in UTC."""
+    return value.astimezone(dt_timezone.utc).date().replace(day=1)
+
+
+def _merge(kind, groups):
+    """Append rows to their chunks; ``groups`` maps (user_id, period) -> rows."""
+    last = {}
+    for chunk in ArchiveChunk.objects.select_for_update().defer('data').filter(
+        kind=kind,
+        user_id__in={user_id for user_id, _ in groups},
+        period__in={period for _, period in groups},
+    ).order_by('part'):
+        last[(chunk.user_id, chunk.period)] = chunk
+
+    index = []
+    for (user_id, period), rows in groups.items():
+        chunk = last.get((user_id, period))
+        if chunk is not None and chunk.rows < CHUNK_ROWS:
+            known = unpack(chunk.data)
+        else:
+            part = 0 if chunk is None else chunk.part + 1
+            chunk = ArchiveChunk(kind=kind, user_id=user_id, period=period, part=part)
+            known = []
+        while rows:
+            added, rows = rows[:CHUNK_ROWS - len(known)], rows[CHUNK_ROWS - len(known):]
+            chunk.data = pack(known + added)
+            chunk.rows = len(known) + len(added)
+            chunk.save()
+            index += [
+                ArchivedRow(chunk=chunk, kind=kind, user_id=user_id, row_id=row['id'], test_id=row['test'])
+                for row in added
+            ]
+            if rows:
+                chunk = ArchiveChunk(kind=kind, user_id=user_id, period=period, part=chunk.part + 1)
+                known = []
+    ArchivedRow.objects.bulk_create(index)
+
+
+def _archive(kind, queryset, serializer_class, date_field, batch_size, dry_run):
+    queryset = queryset.select_related('code_blob').order_by('pk')
+    total = 0
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return total
+        last_pk = batch[-1].pk
+        total += len(batch)
+        if dry_run:
+            continue
+
+        groups = defaultdict(list)
+        for obj, data in zip(batch, serializer_class(batch, many=True).data):
+            groups[(obj.user_id, period_of(getattr(obj, date_field)))].append(dict(data))
+        with transaction.atomic():
+            _merge(kind, groups)
+            queryset.model.objects.filter(pk__in=[obj.pk for obj in batch]).delete()
+
+
+def archive_submissions(before, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Move submissions made before ``before`` to the archive; returns the number moved."""
+    queryset = Submission.objects.filter(submitted_at__lt=before).select_related('user', 'test')
+    return _archive('submission', queryset, SubmissionSerializer, 'submitted_at', batch_size, dry_run)
+
+
+def archive_progress(closed_before=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Move code progress of tests closed before ``closed_before`` (default: now) to the archive."""
+    queryset = CodeProgress.objects.filter(test__closed_at__lt=closed_before or timezone.now())
+    return _archive('progress', queryset, CodeProgressSerializer, 'updated_at', batch_size, dry_run)
+
+
+def _archived(kind, user_id, test_id=None, row_id=None):
+    chunks = ArchiveChunk.objects.filter(kind=kind, user_id=user_id)
+    if test_id is not None or row_id is not None:
+        index = ArchivedRow.objects.filter(kind=kind, user_id=user_id)
+        if test_id is not None:
+            index = index.filter(test_id=test_id)
+        if row_id is not None:
+            index = index.filter(row_id=row_id)
+        chunks = chunks.filter(pk__in=index.values('chunk_id'))
+    rows = []
+    for data in chunks.values_list('data', flat=True):
+        rows.extend(
+            row for row in unpack(data)
+            if (test_id is None or row['test'] == test_id) and (row_id is None or row['id'] == row_id)
+        )
+    return rows
+
+
+def archived_submissions(user_id, test_id=None):
+    """The user's archived submissions, newest first."""
+    rows = _archived('submission', user_id, test_id)
+    rows.sort(key=lambda row: parse_datetime(row['submitted_at']), reverse=True)
+    return rows
+
+
+def archived_submission(user_id, submission_id):
+    """One archived submission of the user, or None."""
+    return next(iter(_archived('submission', user_id, row_id=submission_id)), None)
+
+
+def archived_progress(user_id, test_id):
+    """The user's archived progress for a test, or None."""
+    rows = _archived('progress', user_id, test_id)
+    return max(rows, key=lambda row: parse_datetime(row['updated_at'])) if rows else None
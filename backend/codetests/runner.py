@@ -0,0 +1,170 @@
+"""
+Running candidate code in a subprocess.
+
+Every run is timed and counted in the code execution metrics by language and
+verdict: ``ok``, ``error`` (anything on stderr), ``timeout``, ``unsupported``
+or ``failure`` (the process could not be run).
+
+``run_code`` blocks the calling thread until the process exits. ``arun_code``
+is its asyncio counterpart for the async views; at most
+``CODE_EXECUTION_CONCURRENCY`` async runs are in flight per event loop.
+
+``Execution.memory`` is the peak resident set size of the process in KiB,
+taken from the rusage of the exited child. Only ``run_code`` reaps its
+children itself; under asyncio the event loop does, so async runs report 0
+(not measured).
+"""
+
+import asyncio
+import os
+import subprocess
+import time
+import weakref
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from coding_platform.metrics import record_execution, registry
+from coding_platform.tracing import span
+
+
+@dataclass(frozen=True)
+class Execution:
+    output: str
+    error: str
+    verdict: str
+    duration: float
+    memory: int = 0  # Peak RSS in KiB, 0 when not measured
+
+
+class _MeasuredPopen(subprocess.Popen):
+    """Popen that keeps the resource usage of the child when reaping it."""
+    rusage = None
+
+    def _try_wait(self, wait_flags):
+        try:
+            pid, sts, self.rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            # Reaped elsewhere (SIGCHLD ignored); the exit status is unknown
+            pid, sts = self.pid, 0
+        return pid, sts
+
+
+def run_code(code, input_data=None, language='python', timeout=None):
+    """Run ``code`` with ``input_data`` on stdin and return an Execution."""
+    with span('execute_code', language=language) as attrs:
+        execution = _run(code, input_data, language, timeout or settings.CODE_EXECUTION_TIMEOUT)
+        if attrs is not None:
+            attrs['verdict'] = execution.verdict
+    return execution
+
+
+def _run(code, input_data, language, timeout):
+    if language != 'python':
+        record_execution(language, 'unsupported', 0.0)
+        return Execution('', 'Language not supported yet', 'unsupported', 0.0)
+
+    in_progress = (('language', language),)
+    registry.inc('code_executions_in_progress', in_progress)
+    started = time.perf_counter()
+    process = None
+    try:
+        with span('spawn'):
+            process = _MeasuredPopen(
+                ['python3', '-c', code],
+                stdin=subprocess.PIPE if input_data is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        with span('wait'):
+            output, errors = process.communicate(
+                input=input_data.encode() if input_data is not None else None,
+                timeout=timeout,
+            )
+        verdict = 'error' if errors else 'ok'
+        result = (output.decode(), errors.decode())
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        verdict = 'timeout'
+        result = ('', f'Execution timeout ({timeout} seconds)')
+    except Exception as e:
+        if process is not None:
+            process.kill()
+        verdict = 'failure'
+        result = ('', str(e))
+    finally:
+        registry.inc('code_executions_in_progress', in_progress, -1)
+
+    duration = time.perf_counter() - started
+    record_execution(language, verdict, duration)
+    memory = process.rusage.ru_maxrss if process is not None and process.rusage is not None else 0
+    return Execution(result[0], result[1], verdict, duration, memory)
+
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def execution_slots():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(settings.CODE_EXECUTION_CONCURRENCY)
+    return semaphore
+
+
+async def arun_code(code, input_data=None, language='python', timeout=None):
+    """Async version of run_code; waits for a free slot under the concurrency limit."""
+    with span('execute_code', language=language) as attrs:
+        async with execution_slots():
+            execution = await _arun(code, input_data, language, timeout or settings.CODE_EXECUTION_TIMEOUT)
+        if attrs is not None:
+            attrs['verdict'] = execution.verdict
+    return execution
+
+
+async def _arun(code, input_data, language, timeout):
+    if language != 'python':
+        record_execution(language, 'unsupported', 0.0)
+        return Execution('', 'Language not supported yet', 'unsupported', 0.0)
+
+    in_progress = (('language', language),)
+    registry.inc('code_executions_in_progress', in_progress)
+    started = time.perf_counter()
+    process = None
+    try:
+        with span('spawn'):
+            process = await asyncio.create_subprocess_exec(
+                'python3', '-c', code,
+                stdin=subprocess.PIPE if input_data is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        with span('wait'):
+            output, errors = await asyncio.wait_for(
+                process.communicate(input_data.encode() if input_data is not None else None),
+                timeout=timeout,
+            )
+        verdict = 'error' if errors else 'ok'
+        result = (output.decode(), errors.decode())
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        verdict = 'timeout'
+        result = ('', f'Execution timeout ({timeout} seconds)')
+    except asyncio.CancelledError:
+        # The client went away: do not leave the process running
+        if process is not None and process.returncode is None:
+            process.kill()
+        raise
+    except Exception as e:
+        if process is not None and process.returncode is None:
+            process.kill()
+        verdict = 'failure'
+        result = ('', str(e))
+    finally:
+        registry.inc('code_executions_in_progress', in_progress, -1)
+
+    duration = time.perf_counter() - started
+    record_execution(language, verdict, duration)
+    return Execution(result[0], result[1], verdict, duration)
@@ -0,0 +1,175 @@
+"""
+Full-text search over the problem catalogue.
+
+The index lives in the database and is kept up to date by the database on
+every insert, update and delete of a Test (including ``update()`` and
+``bulk_create()``), so no application code has to maintain it:
+
+- PostgreSQL: ``codetests_test.search_vector``, a stored generated
+  ``tsvector`` column (name weighted A, description B) with a GIN index
+- SQLite: ``codetests_test_fts``, an external-content FTS5 table fed by
+  triggers on ``codetests_test``
+
+Both are created by migration 0011. SQLite drops triggers when a migration
+rebuilds the table, so ``repair_index()`` runs after every ``migrate`` (see
+signals.py) and recreates them.
+
+Queries are split into words and every word must match, as a prefix, in the
+name or description. Results are ranked by ``ts_rank_cd`` or ``bm25`` with
+name matches counting more. Ranking has to read every match, so a query
+matching more than ``TEST_SEARCH['MAX_RANKED']`` tests ranks only the newest
+of them; the count still covers all matches, pages past the ranked ones are
+empty.
+"""
+
+import re
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+
+from .models import Test
+
+FTS_TABLE = 'codetests_test_fts'
+NAME_WEIGHT = 4.0  # bm25 weight of the name column relative to the description
+
+_SQLITE_INDEX = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"name, description, content='codetests_test', content_rowid='id', tokenize='porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON codetests_test BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON codetests_test BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+    f"VALUES ('delete', old.id, old.name, old.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name, description ON codetests_test BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+    f"VALUES ('delete', old.id, old.name, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+]
+
+def install_index(connection):
+    """Recreate the SQLite FTS5 table and triggers where missing (idempotent)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s", [f'{FTS_TABLE}_%']
+        )
+        complete = cursor.fetchone()[0] == 3
+        for statement in _SQLITE_INDEX:
+            cursor.execute(statement)
+        if not complete:
+            # Rows may have changed while the triggers were missing
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def repair_index(connection):
+    """Recreate the SQLite triggers if a migration dropped them; the index must already exist."""
+    if connection.vendor != 'sqlite':
+        return
+    if FTS_TABLE in connection.introspection.table_names():
+        install_index(connection)
+
+
+def query_terms(query):
+    """Lower-cased words of a user query; punctuation and operators are ignored."""
+    return re.findall(r'\w+', query.lower())
+
+
+def _match_sql(vendor, terms, filters=(), filter_params=()):
+    """
+    ``(id column, FROM/WHERE clause, params)`` of the tests matching ``terms``
+    and the SQL ``filters`` over ``t`` (the test table).
+    """
+    if vendor == 'postgresql':
+        where = ' AND '.join(['t.search_vector @@ query', *filters])
+        return (
+            't.id',
+            f"FROM codetests_test t, to_tsquery('english', %s) query WHERE {where}",
+            [' & '.join(f'{term}:*' for term in terms), *filter_params],
+        )
+    if vendor == 'sqlite':
+        join = f' JOIN codetests_test t ON t.id = {FTS_TABLE}.rowid' if filters else ''
+        where = ' AND '.join([f'{FTS_TABLE} MATCH %s', *filters])
+        return (
+            f'{FTS_TABLE}.rowid',
+            f"FROM {FTS_TABLE}{join} WHERE {where}",
+            [' '.join(f'"{term}"*' for term in terms), *filter_params],
+        )
+    raise NotImplementedError(f'Full-text search is not available on {vendor}')
+
+
+def _rank_sql(vendor):
+    """Rank expression (lower is better) usable with ``_match_sql``."""
+    if vendor == 'postgresql':
+        return '-ts_rank_cd(t.search_vector, query)'
+    return f'bm25({FTS_TABLE}, {NAME_WEIGHT}, 1.0)'
+
+
+def filter_matching(queryset, query):
+    """``queryset`` of tests narrowed to those matching ``query`` (unranked), e.g. for the admin."""
+    terms = query_terms(query)
+    if not terms:
+        return queryset
+    id_column, match, params = _match_sql(connections[queryset.db].vendor, terms)
+    return queryset.filter(id__in=RawSQL(f"SELECT {id_column} {match}", params))
+
+
+@dataclass
+class SearchResults:
+    count: int
+    tests: list       # Test instances, best match first
+    ranks: dict       # Test id -> rank, absent without a query
+
+
+def search_tests(query='', difficulties=(), min_time=None, max_time=None, limit=20, offset=0, using=None):
+    """
+    Tests matching every word of ``query`` and the filters, best match first.
+
+    Without query words all tests passing the filters are returned, newest first.
+    """
+    using = using or router.db_for_read(Test)
+    terms = query_terms(query)
+    if not terms:
+        tests = Test.objects.using(using).order_by('-created_at', '-id')
+        if difficulties:
+            tests = tests.filter(difficulty__in=difficulties)
+        if min_time is not None:
+            tests = tests.filter(time_limit__gte=min_time)
+        if max_time is not None:
+            tests = tests.filter(time_limit__lte=max_time)
+        return SearchResults(count=tests.count(), tests=list(tests[offset:offset + limit]), ranks={})
+
+    connection = connections[using]
+    filters, filter_params = [], []
+    if difficulties:
+        filters.append(f"t.difficulty IN ({', '.join(['%s'] * len(difficulties))})")
+        filter_params += list(difficulties)
+    if min_time is not None:
+        filters.append("t.time_limit >= %s")
+        filter_params.append(min_time)
+    if max_time is not None:
+        filters.append("t.time_limit <= %s")
+        filter_params.append(max_time)
+    id_column, match, params = _match_sql(connection.vendor, terms, filters, filter_params)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) {match}", params)
+        count = cursor.fetchone()[0]
+        if count <= offset:
+            return SearchResults(count=count, tests=[], ranks={})
+
+        # Ranking reads every match, so broad queries rank only the newest MAX_RANKED
+        max_ranked = settings.TEST_SEARCH['MAX_RANKED']
+        if count > max_ranked:
+            cursor.execute(f"SELECT {id_column} {match} ORDER BY {id_column} DESC LIMIT 1 OFFSET %s", params + [max_ranked - 1])
+            match += f" AND {id_column} >= %s"
+            params = params + [cursor.fetchone()[0]]
+
+        cursor.execute(
+            f"SELECT {id_column}, {_rank_sql(connection.vendor)} {match} ORDER BY 2, 1 LIMIT %s OFFSET %s",
+            params + [limit, offset],
+        )
+        ranks = dict(cursor.fetchall())
+
+    found = Test.objects.using(using).in_bulk(list(ranks))
+    return SearchResults(count=count, tests=[found[id] for id in ranks if id in found], ranks=ranks)
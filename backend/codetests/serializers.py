@@ -1,30 +1,54 @@
 from rest_framework import serializers
+
+from coding_platform.fieldsets import SparseFieldsetMixin
 from .models import Test, TestCase, Submission, CodeProgress
+from .results import case_outcomes
 
-class TestCaseSerializer(serializers.ModelSerializer):
+class TestCaseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = TestCase
         fields = ['id', 'input_data', 'expected_output', 'is_sample']
 
-class TestSerializer(serializers.ModelSerializer):
+class TestSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     test_cases = TestCaseSerializer(many=True, read_only=True)
     
     class Meta:
         model = Test
         fields = ['id', 'name', 'description', 'time_limit', 'difficulty', 'test_cases', 'created_at']
 
-class SubmissionSerializer(serializers.ModelSerializer):
+class TestSearchResultSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """A test in search results: no test cases, plus its rank when searched by text"""
+    rank = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Test
+        fields = ['id', 'name', 'description', 'time_limit', 'difficulty', 'created_at', 'rank']
+    
+    def get_rank(self, obj):
+        rank = self.context.get('ranks', {}).get(obj.id)
+        # Lower is better in the index; report higher-is-better
+        return None if rank is None else round(-rank, 6)
+
+class SubmissionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    code = serializers.CharField(style={'base_template': 'textarea.html'})
     test_name = serializers.CharField(source='test.name', read_only=True)
     username = serializers.CharField(source='user.username', read_only=True)
+    case_results = serializers.SerializerMethodField()
     
     class Meta:
         model = Submission
-        fields = ['id', 'user', 'username', 'test', 'test_name', 'code', 'language', 'status', 'score', 'submitted_at']
+        fields = ['id', 'user', 'username', 'test', 'test_name', 'code', 'language', 'status', 'score', 'submitted_at',
+                  'case_results']
         read_only_fields = ['user', 'status', 'score', 'submitted_at']
+    
+    def get_case_results(self, obj):
+        return case_outcomes(obj)
 
-class CodeProgressSerializer(serializers.ModelSerializer):
+class CodeProgressSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    code = serializers.CharField(style={'base_template': 'textarea.html'})
+    
     class Meta:
         model = CodeProgress
-        fields = ['id', 'user', 'test', 'code', 'language', 'updated_at']
-        read_only_fields = ['user', 'updated_at']
+        fields = ['id', 'user', 'test', 'code', 'language', 'version', 'content_hash', 'updated_at']
+        read_only_fields = ['user', 'version', 'content_hash', 'updated_at']
 
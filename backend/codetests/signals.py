@@ -0,0 +1,36 @@
+from django.db import connections, router
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .bundles import invalidate_test_bundle
+from .models import CodeProgress, Test, TestCase
+from .progress import forget_state
+from .search import repair_index
+
+
+# Keep cached test bundles in sync with the catalogue
+@receiver(post_save, sender=Test)
+@receiver(post_delete, sender=Test)
+def invalidate_bundle_for_test(sender, instance, **kwargs):
+    invalidate_test_bundle(instance.pk)
+    if kwargs.get('created') is False and instance.content_hash:
+        Test.objects.filter(pk=instance.pk).update(content_hash='')
+
+
+@receiver(post_save, sender=TestCase)
+@receiver(post_delete, sender=TestCase)
+def invalidate_bundle_for_test_case(sender, instance, **kwargs):
+    invalidate_test_bundle(instance.test_id)
+    Test.objects.filter(pk=instance.test_id).exclude(content_hash='').update(content_hash='')
+
+
+@receiver(post_delete, sender=CodeProgress)
+def forget_code_progress_state(sender, instance, **kwargs):
+    forget_state(instance.user_id, instance.test_id)
+
+
+# SQLite drops the search triggers whenever a migration rebuilds the test table
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    if sender.name == 'codetests' and router.allow_migrate(using, 'codetests'):
+        repair_index(connections[using])
@@ -0,0 +1,225 @@
+"""
+Near-duplicate detection among the submissions to a test.
+
+Code is tokenised with identifiers, numbers and strings replaced by
+placeholders and comments and whitespace dropped, so renaming variables or
+reformatting does not hide a copy. The 5-token shingles of a submission are
+reduced to a MinHash signature of ``NUM_PERM`` values, which estimates the
+Jaccard similarity of two submissions as the fraction of equal values.
+
+Signatures are split into ``BANDS`` bands of ``ROWS`` values; each band is
+hashed into an LSHBucket row for the submission's test. Two submissions
+become candidates when they share a bucket in any band, which happens with
+probability ``1 - (1 - s**ROWS)**BANDS`` for similarity ``s`` (about 0.5 at
+0.7 and over 0.99 at 0.9). Finding the candidates of a test is a group-by
+over its buckets instead of comparing every pair; candidates are then
+checked against the full signatures.
+
+Submissions are indexed when they are graded; ``manage.py index_similarity``
+backfills older ones.
+"""
+
+import hashlib
+import keyword
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import CodeSignature, LSHBucket, Submission
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+PRIME = (1 << 31) - 1
+
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, PRIME, NUM_PERM, dtype=np.uint64)
+
+# Names kept as they are: changing them changes what the program does
+KEPT_NAMES = set(keyword.kwlist) | {
+    'print', 'input', 'range', 'len', 'int', 'str', 'float', 'list', 'dict', 'set', 'tuple',
+    'sorted', 'sum', 'min', 'max', 'map', 'zip', 'enumerate', 'open', 'abs', 'sys', 'stdin',
+}
+
+# Comment syntax by language; others are tokenised as Python, where // is floor division
+C_COMMENTS = r'//[^\n]*|/\*[\s\S]*?\*/'
+COMMENTS = {
+    'python': r'\#[^\n]*',
+    **dict.fromkeys(('javascript', 'typescript', 'java', 'c', 'cpp', 'csharp', 'go', 'rust'), C_COMMENTS),
+}
+
+TOKENS = (
+    r'''|(?P<string>"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')'''
+    r'''|(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)'''
+    r'''|(?P<name>[A-Za-z_]\w*)'''
+    r'''|(?P<op>\*\*|//|==|!=|<=|>=|->|\+=|-=|\*=|/=|[^\s\w])'''
+)
+
+TOKEN_RES = {language: re.compile(f'(?P<comment>{comment}){TOKENS}') for language, comment in COMMENTS.items()}
+
+
+def _config(name):
+    return settings.SIMILARITY.get(name)
+
+
+def normalized_tokens(code, language='python'):
+    """Tokens of ``code`` with names, numbers and strings replaced by placeholders."""
+    tokens = []
+    for match in TOKEN_RES.get(language, TOKEN_RES['python']).finditer(code):
+        kind = match.lastgroup
+        if kind == 'comment':
+            continue
+        text = match.group()
+        if kind == 'name':
+            tokens.append(text if text in KEPT_NAMES else 'ID')
+        elif kind == 'number':
+            tokens.append('NUM')
+        elif kind == 'string':
+            tokens.append('STR')
+        else:
+            tokens.append(text)
+    return tokens
+
+
+def minhash(tokens):
+    """MinHash signature (uint32 array) of the shingles of ``tokens``."""
+    count = max(len(tokens) - SHINGLE_SIZE + 1, 1)
+    shingles = {
+        zlib.crc32(' '.join(tokens[i:i + SHINGLE_SIZE]).encode()) % PRIME
+        for i in range(count)
+    }
+    values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    hashed = (_A[:, None] * values[None, :] + _B[:, None]) % PRIME
+    return hashed.min(axis=1).astype('<u4')
+
+
+def band_keys(signature):
+    """One signed 64-bit bucket key per band."""
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), 'little', signed=True)
+        for band in np.asarray(signature, dtype='<u4').reshape(BANDS, ROWS)
+    ]
+
+
+def estimate(first, second):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(np.frombuffer(bytes(first), '<u4') == np.frombuffer(bytes(second), '<u4')))
+
+
+def build_index_rows(submission, code):
+    """Unsaved (CodeSignature, [LSHBucket]) for a graded submission."""
+    tokens = normalized_tokens(code, submission.language)
+    signature = minhash(tokens)
+    record = CodeSignature(
+        submission_id=submission.pk,
+        test_id=submission.test_id,
+        user_id=submission.user_id,
+        minhash=signature.tobytes(),
+        tokens=len(tokens),
+    )
+    buckets = [
+        LSHBucket(test_id=submission.test_id, band=band, key=key, submission_id=submission.pk)
+        for band, key in enumerate(band_keys(signature))
+    ]
+    return record, buckets
+
+
+def index_submissions(pairs, replace=True):
+    """Index ``(submission, code)`` pairs; ``replace`` drops earlier index rows of the submissions first."""
+    signatures, buckets = [], []
+    for submission, code in pairs:
+        record, rows = build_index_rows(submission, code)
+        signatures.append(record)
+        buckets.extend(rows)
+    with transaction.atomic():
+        if replace:
+            ids = [record.submission_id for record in signatures]
+            LSHBucket.objects.filter(submission_id__in=ids).delete()
+            CodeSignature.objects.filter(submission_id__in=ids).delete()
+        CodeSignature.objects.bulk_create(signatures)
+        LSHBucket.objects.bulk_create(buckets)
+    return len(signatures)
+
+
+def index_submission(submission, code):
+    """Index a newly graded submission when indexing is enabled."""
+    if _config('ENABLED'):
+        index_submissions([(submission, code)], replace=False)
+
+
+@dataclass(frozen=True)
+class Match:
+    first: int  # submission ids, first < second
+    second: int
+    similarity: float
+
+
+def find_matches(test_id, threshold=None):
+    """Pairs of submissions by different users estimated at least ``threshold`` similar."""
+    threshold = _config('THRESHOLD') if threshold is None else threshold
+    records = {
+        submission_id: (user_id, signature)
+        for submission_id, user_id, signature in CodeSignature.objects.filter(
+            test_id=test_id, tokens__gte=_config('MIN_TOKENS')
+        ).values_list('submission_id', 'user_id', 'minhash')
+    }
+
+    buckets = defaultdict(list)
+    for band, key, submission_id in LSHBucket.objects.filter(test_id=test_id).values_list(
+        'band', 'key', 'submission_id'
+    ):
+        if submission_id in records:
+            buckets[(band, key)].append(submission_id)
+
+    candidates = set()
+    max_bucket = _config('MAX_BUCKET')
+    for members in buckets.values():
+        # Code shared by very many submissions (the textbook solution) is no evidence of copying
+        if len(members) < 2 or len(members) > max_bucket:
+            continue
+        members.sort()
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                if records[first][0] != records[second][0]:
+                    candidates.add((first, second))
+
+    matches = []
+    for first, second in candidates:
+        similarity = estimate(records[first][1], records[second][1])
+        if similarity >= threshold:
+            matches.append(Match(first, second, round(similarity, 3)))
+    matches.sort(key=lambda match: (-match.similarity, match.first, match.second))
+    return matches
+
+
+def similarity_report(test_id, threshold=None):
+    """``find_matches`` with the user and time of both submissions, for the API and admin."""
+    matches = find_matches(test_id, threshold)
+    ids = {match.first for match in matches} | {match.second for match in matches}
+    submissions = {
+        row['id']: row
+        for row in Submission.objects.filter(id__in=ids).values('id', 'user_id', 'user__username', 'score', 'submitted_at')
+    }
+
+    def describe(submission_id):
+        row = submissions[submission_id]
+        return {
+            'submission': submission_id,
+            'user': row['user_id'],
+            'username': row['user__username'],
+            'score': row['score'],
+            'submitted_at': row['submitted_at'],
+        }
+
+    return [
+        {'similarity': match.similarity, 'first': describe(match.first), 'second': describe(match.second)}
+        for match in matches
+        if match.first in submissions and match.second in submissions
+    ]
@@ -0,0 +1,175 @@
+"""
+Live runs whose output is streamed to the client as it is produced.
+
+``LiveRun.events()`` starts the program and yields ``(event, data)`` pairs:
+``start``, ``stdout``/``stderr`` chunks, periodic ``ping`` and a final
+``exit`` (with a ``truncated`` event first when the output exceeds
+``STREAM_MAX_BYTES``). The pipes are read only as fast as the consumer takes
+events, through a small bounded queue, so a slow client slows the program
+down instead of growing a buffer.
+
+A run holds one slot of the async runner limit. It is killed immediately when
+the consumer stops iterating (the client disconnected), when ``cancel()`` is
+called by a cancel request served by the same worker, or when another worker
+flags it in the shared cache, where each run is also registered (with its
+user) while it lasts. That flag is read every ``PING_INTERVAL`` whether or not
+the program is producing output, but only while the consumer is taking events.
+"""
+
+import asyncio
+import codecs
+import subprocess
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from coding_platform.metrics import record_execution, registry
+from .runner import execution_slots
+
+CHUNK_SIZE = 4096
+QUEUE_SIZE = 8
+PING_INTERVAL = 1.0
+
+# run id -> LiveRun, for cancel requests served by this worker
+_active = {}
+
+
+def run_key(run_id):
+    return f'live-run:{run_id}'
+
+
+def cancel_key(run_id, user_id):
+    return f'live-run-cancel:{run_id}:{user_id}'
+
+
+def shared_cache():
+    return caches['shared']
+
+
+def get_active(run_id):
+    return _active.get(run_id)
+
+
+class LiveRun:
+    def __init__(self, user_id, code, language='python', timeout=None, max_bytes=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.code = code
+        self.language = language
+        self.timeout = timeout or settings.CODE_EXECUTION_TIMEOUT
+        self.max_bytes = max_bytes or settings.STREAM_MAX_BYTES
+        self.process = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        self._kill()
+
+    def _kill(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.kill()
+
+    async def _pump(self, stream, kind, queue):
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        while True:
+            data = await stream.read(CHUNK_SIZE)
+            if not data:
+                break
+            await queue.put((kind, decoder.decode(data), len(data)))
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            await queue.put((kind, tail, 0))
+        await queue.put((kind, None, 0))
+
+    async def events(self):
+        if self.language != 'python':
+            record_execution(self.language, 'unsupported', 0.0)
+            yield 'exit', {'verdict': 'unsupported', 'error': 'Language not supported yet'}
+            return
+
+        loop = asyncio.get_running_loop()
+        in_progress = (('language', self.language),)
+        readers = []
+        verdict = None
+        started = None
+        _active[self.id] = self
+        shared = shared_cache()
+        try:
+            await shared.aset(run_key(self.id), self.user_id, timeout=self.timeout + 60)
+            async with execution_slots():
+                registry.inc('code_executions_in_progress', in_progress)
+                started = time.perf_counter()
+                try:
+                    self.process = await asyncio.create_subprocess_exec(
+                        'python3', '-c', self.code,
+                        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    )
+                    yield 'start', {'run_id': self.id}
+
+                    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+                    readers = [
+                        asyncio.create_task(self._pump(self.process.stdout, 'stdout', queue)),
+                        asyncio.create_task(self._pump(self.process.stderr, 'stderr', queue)),
+                    ]
+                    deadline = loop.time() + self.timeout
+                    next_tick = loop.time() + PING_INTERVAL
+                    quiet = True
+                    open_streams = len(readers)
+                    sent = 0
+                    while open_streams:
+                        now = loop.time()
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            verdict = 'timeout'
+                            break
+                        if now >= next_tick:
+                            # On a timer, so programs that never go quiet see a cancel too
+                            next_tick = now + PING_INTERVAL
+                            if await shared.aget(cancel_key(self.id, self.user_id)):
+                                self.cancel()
+                                break
+                            if quiet:
+                                yield 'ping', {}
+                            quiet = True
+                        try:
+                            kind, text, size = await asyncio.wait_for(queue.get(), min(remaining, next_tick - now))
+                        except asyncio.TimeoutError:
+                            continue
+                        quiet = False
+                        if text is None:
+                            open_streams -= 1
+                            continue
+                        sent += size
+                        if sent > self.max_bytes:
+                            verdict = 'truncated'
+                            yield 'truncated', {'limit': self.max_bytes}
+                            break
+                        yield kind, {'data': text}
+
+                    self._kill()
+                    await self.process.wait()
+                    if self.cancelled:
+                        verdict = 'cancelled'
+                    elif verdict is None:
+                        verdict = 'ok' if self.process.returncode == 0 else 'error'
+                finally:
+                    # Also reached when the client disconnects and iteration is abandoned
+                    self._kill()
+                    for reader in readers:
+                        reader.cancel()
+                    if self.process is not None:
+                        await self.process.wait()
+                    registry.inc('code_executions_in_progress', in_progress, -1)
+        finally:
+            _active.pop(self.id, None)
+            await shared.adelete_many([run_key(self.id), cancel_key(self.id, self.user_id)])
+            if started is not None:
+                record_execution(self.language, verdict or 'cancelled', time.perf_counter() - started)
+
+        yield 'exit', {
+            'verdict': verdict,
+            'exit_code': self.process.returncode,
+            'duration': round(time.perf_counter() - started, 3),
+        }
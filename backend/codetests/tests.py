@@ -1,8 +1,48 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import pstats
+import shutil
+import tarfile
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from django.db import connections
+from django.test import AsyncRequestFactory, LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.admin import site as admin_site
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
-from rest_framework import status
-from .models import Test, TestCase as CodeTestCase, Submission, CodeProgress
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from .models import Test, TestCase as CodeTestCase, Submission, ArchiveChunk, CodeBlob, CodeProgress, CodeSignature, LSHBucket
+from coding_platform import db_routing, idempotency
+from coding_platform.metrics import registry as metrics_registry
+from coding_platform.profiling import make_token as make_profiling_token
+from coding_platform.renderers import FastJSONParser, FastJSONRenderer
+from users.tokens import ClaimsRefreshToken
+from . import async_views, benchmarks, retention
+from .archive import read_archive, record_content_hash, refresh_content_hashes
+from .bundles import clear_local_bundles, get_test_bundle
+from .deltas import apply_delta, compute_delta, content_hash
+from .progress import revision_code
+from .results import case_outcomes, pack_bitmap, pack_uint32
+from .retention import archive_progress, archive_submissions
+from .admin_scaling import EstimatedCountPaginator
+from .analytics import case_statistics
+from .search import search_tests
+from .similarity import BANDS, find_matches, normalized_tokens
+from . import streaming
+from .streaming import LiveRun, get_active
+from . import writebehind
 
 User = get_user_model()
 
@@ -211,6 +251,7 @@ class CodeProgressTestCase(TestCase):
     """Test cases for code progress saving"""
     
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = User.objects.create_user(
             username='testuser',
@@ -330,3 +371,1790 @@ class ExecuteCodeTestCase(TestCase):
         }
         response = self.client.post('/api/tests/execute/', code_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestBundleCacheTestCase(TestCase):
+    """Test cases for the cached test bundles used by submit"""
+    
+    def setUp(self):
+        clear_local_bundles()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        
+        self.test = Test.objects.create(
+            name='Echo',
+            description='Print the input',
+            time_limit=30,
+            difficulty='Easy'
+        )
+        CodeTestCase.objects.create(
+            test=self.test,
+            input_data='hello',
+            expected_output='hello\n',
+            is_sample=True
+        )
+    
+    def test_bundle_contents(self):
+        """Test that a bundle snapshots the test and normalizes outputs"""
+        bundle = get_test_bundle(self.test.id)
+        self.assertEqual(bundle.name, 'Echo')
+        self.assertEqual(len(bundle.cases), 1)
+        self.assertEqual(bundle.cases[0].expected, 'hello')
+        self.assertEqual(bundle.cases[0].expected_output, 'hello\n')
+    
+    def test_warm_bundle_needs_no_queries(self):
+        """Test that a cached bundle is served without touching the DB"""
+        get_test_bundle(self.test.id)
+        with self.assertNumQueries(0):
+            get_test_bundle(self.test.id)
+    
+    def test_submit_reads_no_test_data_when_warm(self):
+        """Test that submit only writes the submission once the bundle is cached"""
+        get_test_bundle(self.test.id)
+        # Upsert of the code blob, one INSERT of the graded submission and the
+        # similarity index rows (signature and buckets, inside a savepoint)
+        with self.assertNumQueries(6):
+            response = self.client.post(
+                f'/api/tests/{self.test.id}/submit/',
+                {'code': 'print(input())', 'language': 'python'},
+                format='json'
+            )
+        self.assertEqual(response.data['score'], 100)
+    
+    def test_bundle_invalidated_on_change(self):
+        """Test that saving a test case or test refreshes the bundle"""
+        version = get_test_bundle(self.test.id).version
+        CodeTestCase.objects.create(
+            test=self.test,
+            input_data='bye',
+            expected_output='bye',
+        )
+        bundle = get_test_bundle(self.test.id)
+        self.assertEqual(len(bundle.cases), 2)
+        self.assertNotEqual(bundle.version, version)
+        
+        self.test.name = 'Echo 2'
+        self.test.save()
+        self.assertEqual(get_test_bundle(self.test.id).name, 'Echo 2')
+    
+    def test_local_copies_expire_without_shared_tier(self):
+        """Test that a worker reloads a bundle after LOCAL_TIMEOUT even when it missed the invalidation"""
+        self.addCleanup(clear_local_bundles)
+        get_test_bundle(self.test.id)
+        # An edit made by another worker: no signal reaches this one
+        Test.objects.filter(pk=self.test.id).update(name='Edited elsewhere')
+        self.assertEqual(get_test_bundle(self.test.id).name, 'Echo')
+        local_only = dict(settings.TEST_BUNDLE_CACHE, SHARED_ALIAS='', LOCAL_TIMEOUT=0.2)
+        with override_settings(TEST_BUNDLE_CACHE=local_only):
+            clear_local_bundles()
+            get_test_bundle(self.test.id)
+            Test.objects.filter(pk=self.test.id).update(name='Edited again')
+            time.sleep(0.3)
+            self.assertEqual(get_test_bundle(self.test.id).name, 'Edited again')
+    
+    def test_submit_missing_test(self):
+        """Test that submitting to an unknown test returns 404"""
+        response = self.client.post(
+            '/api/tests/9999/submit/',
+            {'code': 'print(1)', 'language': 'python'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class DeltaAutosaveTestCase(TestCase):
+    """Test cases for diff-based autosave and revision history"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        
+        self.test = Test.objects.create(
+            name='Test Problem',
+            description='Solve this problem',
+            time_limit=30,
+            difficulty='Medium'
+        )
+        self.save_url = f'/api/tests/{self.test.id}/save/'
+    
+    def save(self, **data):
+        data.setdefault('language', 'python')
+        return self.client.post(self.save_url, data, format='json')
+    
+    def test_delta_roundtrip(self):
+        """Test that computed deltas reproduce the new text"""
+        old = 'def f():\n    return 1\n\nprint(f())\n'
+        new = 'def f():\n    return 2\n\nprint(f())\nprint("done")\n'
+        self.assertEqual(apply_delta(old, compute_delta(old, new)), new)
+    
+    def test_unchanged_save_is_confirmed_with_one_query(self):
+        """Test that saving identical code only reads the stored version with a per-worker cache"""
+        response = self.save(code='print(1)')
+        self.assertEqual(response.data['version'], 1)
+        with self.assertNumQueries(1):
+            response = self.save(code='print(1)')
+        self.assertTrue(response.data['unchanged'])
+        self.assertEqual(response.data['content_hash'], content_hash('print(1)'))
+    
+    def test_unchanged_save_skips_db_with_shared_cache(self):
+        """Test that a shared state cache answers an unchanged save at the same base version alone"""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        shared = {
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir},
+        }
+        with override_settings(CACHES=shared):
+            self.save(code='print(1)')
+            with self.assertNumQueries(0):
+                response = self.save(code='print(1)', base_version=1)
+            self.assertTrue(response.data['unchanged'])
+            with self.assertNumQueries(1):
+                self.save(code='print(1)')
+    
+    def test_stale_state_does_not_lose_saves(self):
+        """Test that a save another worker's cache would call unchanged is written"""
+        first = self.save(code='print(1)').data
+        stale = {key: first[key] for key in ('version', 'content_hash', 'language')}
+        self.save(code='print(2)')
+        # This worker still remembers version 1, as if version 2 was saved elsewhere
+        cache.set(f'code-progress:{self.user.id}:{self.test.id}', stale)
+        response = self.save(code='print(1)')
+        self.assertFalse(response.data['unchanged'])
+        self.assertEqual(response.data['version'], 3)
+        self.assertEqual(CodeProgress.objects.get(user=self.user, test=self.test).code, 'print(1)')
+    
+    def test_delta_save(self):
+        """Test saving a delta against the last saved version"""
+        first = self.save(code='print(1)\n').data
+        response = self.save(delta=[[6, 7, '2']], base_hash=first['content_hash'], base_version=1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 2)
+        progress = CodeProgress.objects.get(user=self.user, test=self.test)
+        self.assertEqual(progress.code, 'print(2)\n')
+        self.assertEqual(progress.content_hash, content_hash('print(2)\n'))
+    
+    def test_stale_base_conflicts(self):
+        """Test that a stale base hash or version returns 409"""
+        first = self.save(code='a = 1').data
+        self.save(code='a = 2', base_version=1)
+        response = self.save(delta=[[4, 5, '3']], base_hash=first['content_hash'])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['version'], 2)
+        response = self.save(code='a = 3', base_version=1)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+    
+    def test_invalid_delta(self):
+        """Test that malformed deltas are rejected"""
+        first = self.save(code='abc').data
+        response = self.save(delta=[[2, 10, 'x']], base_hash=first['content_hash'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_revision_history(self):
+        """Test that every earlier version can be reconstructed"""
+        versions = [f'x = {i}\n' * (i + 1) for i in range(25)]
+        for code in versions:
+            self.save(code=code)
+        
+        response = self.client.get(f'/api/tests/{self.test.id}/history/')
+        self.assertEqual(response.data['version'], 25)
+        self.assertEqual(len(response.data['revisions']), 24)
+        for version in (1, 2, 19, 20, 21, 24, 25):
+            response = self.client.get(f'/api/tests/{self.test.id}/history/?version={version}')
+            self.assertEqual(response.data['code'], versions[version - 1])
+
+
+@override_settings(CODE_PROGRESS_WRITE_BEHIND={
+    'ENABLED': True, 'FLUSH_INTERVAL': 0, 'MAX_PENDING': 100, 'BATCH_SIZE': 2,
+})
+class WriteBehindTestCase(TestCase):
+    """Test cases for write-behind buffering of autosaves"""
+    
+    def setUp(self):
+        cache.clear()
+        writebehind.buffer.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.tests = [
+            Test.objects.create(name=f'Problem {i}', description='Solve it', time_limit=30)
+            for i in range(3)
+        ]
+    
+    def tearDown(self):
+        writebehind.buffer.clear()
+    
+    def save(self, test, code):
+        return self.client.post(
+            f'/api/tests/{test.id}/save/',
+            {'code': code, 'language': 'python'},
+            format='json'
+        )
+    
+    def test_saves_are_coalesced(self):
+        """Test that repeated saves only keep the latest version per test"""
+        for i in range(5):
+            response = self.save(self.tests[0], f'print({i})')
+        self.assertEqual(response.data['version'], 5)
+        self.assertEqual(len(writebehind.buffer), 1)
+        self.assertFalse(CodeProgress.objects.exists())
+    
+    def test_saved_reads_through_buffer(self):
+        """Test that saved code is served from the buffer before it is flushed"""
+        self.save(self.tests[0], 'print("pending")')
+        response = self.client.get(f'/api/tests/{self.tests[0].id}/saved/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['code'], 'print("pending")')
+    
+    def test_flush_upserts_in_batches(self):
+        """Test that a flush writes new and existing rows with batched upserts"""
+        CodeProgress.objects.create(user=self.user, test=self.tests[0], code='old', content_hash=content_hash('old'))
+        for test in self.tests:
+            self.save(test, f'print({test.id})')
+        self.save(self.tests[0], 'print("latest")')
+        
+        # Two batches of (savepoint, blob upsert, insert of missing rows, locked read of
+        # the stored versions, update, release), plus the last snapshot lookup and insert
+        # of the one revision
+        with self.assertNumQueries(2 * 6 + 2):
+            self.assertEqual(writebehind.buffer.flush(), 3)
+        self.assertEqual(len(writebehind.buffer), 0)
+        
+        progress = CodeProgress.objects.get(user=self.user, test=self.tests[0])
+        self.assertEqual(progress.code, 'print("latest")')
+        self.assertEqual(progress.version, 3)
+        self.assertEqual(revision_code(progress, 1), 'old')
+        self.assertEqual(CodeProgress.objects.filter(user=self.user).count(), 3)
+    
+    def test_flush_never_replaces_a_newer_version(self):
+        """Test that a buffer flushed after another worker's newer save leaves that save alone"""
+        self.save(self.tests[0], 'print("buffered")')
+        self.save(self.tests[1], 'print("kept")')
+        saved_at = writebehind.buffer.get(self.user.id, self.tests[1].id).updated_at
+        # Saved by another worker in the meantime, two versions ahead
+        CodeProgress.objects.create(
+            user=self.user, test=self.tests[0], code='print("newer")', content_hash=content_hash('print("newer")'),
+            version=3,
+        )
+        writebehind.buffer.flush()
+        
+        newer = CodeProgress.objects.get(user=self.user, test=self.tests[0])
+        self.assertEqual((newer.code, newer.version), ('print("newer")', 3))
+        kept = CodeProgress.objects.get(user=self.user, test=self.tests[1])
+        self.assertEqual(kept.code, 'print("kept")')
+        self.assertEqual(kept.updated_at, saved_at)
+
+
+    def test_coalesced_saves_still_snapshot(self):
+        """Test that snapshots keep coming when coalescing skips version numbers"""
+        codes = {}
+        for i in range(1, 61):
+            codes[i] = f'x = {i}\n' * i
+            self.save(self.tests[0], codes[i])
+            if i % 3 == 1:
+                writebehind.buffer.flush()
+        writebehind.buffer.flush()
+        
+        progress = CodeProgress.objects.get(user=self.user, test=self.tests[0])
+        snapshots = progress.revisions.filter(is_snapshot=True).order_by('version')
+        self.assertEqual(list(snapshots.values_list('version', flat=True)), [1, 22, 43])
+        for version in progress.revisions.values_list('version', flat=True):
+            self.assertEqual(revision_code(progress, version), codes[version])
+
+
+class ProblemSetArchiveTestCase(TestCase):
+    """Test cases for the import_tests/export_tests commands"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.test = Test.objects.create(
+            name='Echo',
+            description='Print the input',
+            time_limit=10,
+            difficulty='Easy'
+        )
+        CodeTestCase.objects.create(test=self.test, input_data='a', expected_output='a', is_sample=True)
+        CodeTestCase.objects.create(test=self.test, input_data='x' * 200, expected_output='x' * 200)
+    
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+    
+    def call(self, *args):
+        call_command(*args, stdout=StringIO())
+    
+    def test_export_and_reimport_is_deduplicated(self):
+        """Test that importing an export of the same tests creates nothing"""
+        for name in ('tests.jsonl', 'tests.jsonl.gz', 'tests.tar.gz'):
+            self.call('export_tests', self.path(name), '--inline-limit=100')
+            self.call('import_tests', self.path(name))
+            self.assertEqual(Test.objects.count(), 1)
+    
+    def test_tar_stores_large_cases_as_members(self):
+        """Test that large case payloads become separate, shared archive members"""
+        self.call('export_tests', self.path('tests.tar'), '--inline-limit=100')
+        with tarfile.open(self.path('tests.tar')) as tar:
+            names = tar.getnames()
+        self.assertEqual(len([name for name in names if name.startswith('cases/')]), 1)
+        self.assertEqual(names[0], 'tests.jsonl')
+        
+        records = list(read_archive(self.path('tests.tar')))
+        self.assertEqual(records[0]['cases'][1]['expected_output'], 'x' * 200)
+    
+    def test_reads_archives_with_the_index_last(self):
+        """Test that case members written before tests.jsonl are still resolved"""
+        self.call('export_tests', self.path('tests.tar'), '--inline-limit=100')
+        with tarfile.open(self.path('tests.tar')) as source, tarfile.open(self.path('old.tar.gz'), 'w:gz') as tar:
+            for member in reversed(source.getmembers()):
+                tar.addfile(member, source.extractfile(member))
+        
+        records = list(read_archive(self.path('old.tar.gz')))
+        self.assertEqual(records[0]['cases'][1]['input_data'], 'x' * 200)
+        self.assertEqual(records[0]['cases'][0]['input_data'], 'a')
+    
+    def test_import_creates_tests_and_cases(self):
+        """Test importing a JSONL archive"""
+        path = self.path('new.jsonl')
+        with open(path, 'w') as f:
+            for i in range(3):
+                f.write(json.dumps({
+                    'name': f'Problem {i}',
+                    'description': 'Solve it',
+                    'time_limit': 20,
+                    'difficulty': 'Hard',
+                    'cases': [{'input_data': str(i), 'expected_output': str(i * i), 'is_sample': True}],
+                }) + '\n')
+            # Duplicate of the first record
+            f.write(json.dumps({
+                'name': 'Problem 0', 'description': 'Solve it', 'time_limit': 20, 'difficulty': 'Hard',
+                'cases': [{'input_data': '0', 'expected_output': '0', 'is_sample': True}],
+            }) + '\n')
+        out = StringIO()
+        call_command('import_tests', path, '--batch-size=2', stdout=out)
+        self.assertIn('Imported 3 tests (1 duplicates skipped)', out.getvalue())
+        problem = Test.objects.get(name='Problem 2')
+        self.assertEqual(problem.test_cases.get().expected_output, '4')
+        self.assertEqual(problem.content_hash, record_content_hash({
+            'name': 'Problem 2', 'description': 'Solve it', 'time_limit': 20, 'difficulty': 'Hard',
+            'cases': [{'input_data': '2', 'expected_output': '4', 'is_sample': True}],
+        }))
+    
+    def test_invalid_archive_imports_nothing(self):
+        """Test that a malformed archive is rejected as a whole"""
+        path = self.path('bad.jsonl')
+        with open(path, 'w') as f:
+            f.write(json.dumps({'name': 'Ok', 'description': 'd', 'time_limit': 5, 'cases': []}) + '\n')
+            f.write('{"name": "Broken"}\n')
+        with self.assertRaises(CommandError):
+            self.call('import_tests', path)
+        self.assertFalse(Test.objects.filter(name='Ok').exists())
+    
+    def test_editing_a_case_clears_content_hash(self):
+        """Test that changed tests are re-hashed before deduplication"""
+        refresh_content_hashes()
+        self.test.refresh_from_db()
+        self.assertTrue(self.test.content_hash)
+        CodeTestCase.objects.create(test=self.test, input_data='b', expected_output='b')
+        self.test.refresh_from_db()
+        self.assertEqual(self.test.content_hash, '')
+
+
+class GenerateScaleDataTestCase(TestCase):
+    """Test cases for the generate_scale_data command"""
+    
+    def generate(self, prefix, seed=7):
+        call_command(
+            'generate_scale_data', '--users=20', '--tests=5', '--cases=3', '--submissions=300',
+            '--progress=40', f'--seed={seed}', '--batch-size=64', f'--prefix={prefix}',
+            '--end-date=2026-01-31', stdout=StringIO()
+        )
+    
+    def test_generates_requested_volumes(self):
+        """Test that the requested number of rows is created"""
+        self.generate('a')
+        self.assertEqual(User.objects.filter(username__startswith='a_user_').count(), 20)
+        self.assertEqual(Test.objects.count(), 5)
+        self.assertEqual(CodeTestCase.objects.count(), 15)
+        self.assertEqual(Submission.objects.count(), 300)
+        self.assertEqual(CodeProgress.objects.count(), 40)
+        
+        submission = Submission.objects.order_by('-submitted_at').first()
+        self.assertLessEqual(submission.submitted_at.date().isoformat(), '2026-01-31')
+        self.assertEqual(submission.status, 'passed' if submission.score >= 70 else 'failed')
+    
+    def test_seeded_output_is_reproducible(self):
+        """Test that the same seed produces the same data"""
+        def snapshot():
+            return list(Submission.objects.order_by('id').values_list('score', 'language', 'submitted_at'))
+        
+        self.generate('a')
+        first = snapshot()
+        Submission.objects.all().delete()
+        self.generate('b')
+        self.assertEqual([row[:2] for row in snapshot()], [row[:2] for row in first])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchmarkBudgetTestCase(TestCase):
+    """Test cases for the API benchmark suite"""
+    
+    def test_every_endpoint_has_a_budget(self):
+        """Test that every named route is declared in the benchmark suite"""
+        self.assertEqual(benchmarks.uncovered_url_names(), [])
+    
+    def test_endpoints_stay_within_query_budgets(self):
+        """Test that no endpoint exceeds its query budget on the small dataset"""
+        cache.clear()
+        ctx = benchmarks.seed('small')
+        for endpoint in benchmarks.ENDPOINTS:
+            result = benchmarks.run_endpoint(endpoint, ctx, 'small', iterations=2)
+            self.assertEqual(result.error_statuses, [], endpoint.label)
+            self.assertLessEqual(max(result.queries), endpoint.max_queries, endpoint.label)
+
+
+class MetricsTestCase(TestCase):
+    """Test cases for the /api/metrics endpoint"""
+    
+    def setUp(self):
+        metrics_registry.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='metrics', password='pass123')
+        self.client.force_authenticate(user=self.user)
+        Test.objects.create(name='Metrics test', description='d', time_limit=10)
+    
+    def scrape(self):
+        with override_settings(METRICS={**settings.METRICS, 'TOKEN': 'secret'}):
+            response = self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content.decode()
+    
+    def test_records_requests_and_queries_per_route(self):
+        """Test that request counts, latency and DB queries are labelled by route"""
+        self.client.get('/api/tests/')
+        self.client.get('/api/tests/')
+        body = self.scrape()
+        self.assertIn('http_requests_total{route="test-list",method="GET",status="200"} 2', body)
+        self.assertIn('http_request_duration_seconds_count{route="test-list"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{route="test-list",le="+Inf"} 2', body)
+        self.assertIn('db_queries_total{route="test-list"} 4', body)
+    
+    @override_settings(CODE_EXECUTION_TIMEOUT=1)
+    def test_records_executions_by_verdict(self):
+        """Test that code executions are counted by language and verdict"""
+        self.client.post('/api/tests/execute/', {'code': 'print(1)', 'language': 'python'}, format='json')
+        response = self.client.post(
+            '/api/tests/execute/', {'code': 'while True: pass', 'language': 'python'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_408_REQUEST_TIMEOUT)
+        body = self.scrape()
+        self.assertIn('code_executions_total{language="python",verdict="ok"} 1', body)
+        self.assertIn('code_executions_total{language="python",verdict="timeout"} 1', body)
+        self.assertIn('code_execution_timeouts_total{language="python"} 1', body)
+        self.assertIn('code_executions_in_progress{language="python"} 0', body)
+    
+    def test_aggregates_snapshots_of_other_processes(self):
+        """Test that snapshots written by other workers are merged into the output"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        labels = [['route', 'test-list'], ['method', 'GET'], ['status', '200']]
+        for name, pid in (('worker-a.json', os.getppid()), ('worker-b.json', 2 ** 22 + 1)):
+            with open(os.path.join(directory, name), 'w') as f:
+                json.dump({'pid': pid, 'values': [
+                    ['http_requests_total', labels, 5],
+                    ['code_executions_in_progress', [['language', 'python']], 1],
+                ], 'histograms': []}, f)
+        
+        with override_settings(METRICS={**settings.METRICS, 'DIR': directory}):
+            self.client.get('/api/tests/')
+            body = self.scrape()
+        self.assertIn('http_requests_total{route="test-list",method="GET",status="200"} 11', body)
+        # Gauges of processes that have exited are dropped
+        self.assertIn('code_executions_in_progress{language="python"} 1', body)
+    
+    def test_token_is_required(self):
+        """Test that the endpoint is protected by METRICS['TOKEN']"""
+        with override_settings(METRICS={**settings.METRICS, 'TOKEN': 'secret'}):
+            self.assertEqual(self.client.get('/api/metrics').status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.scrape()
+    
+    def test_closed_without_a_token(self):
+        """Test that the endpoint is not public while no token is configured"""
+        with override_settings(METRICS={**settings.METRICS, 'TOKEN': ''}):
+            response = self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProfilingTestCase(TestCase):
+    """Test cases for the request profiling middleware"""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.user = User.objects.create_user(username='profiled', password='pass123')
+    
+    def profiling(self, **overrides):
+        config = {**settings.PROFILING, 'ENABLED': True, 'DIR': self.directory, **overrides}
+        return override_settings(PROFILING=config)
+    
+    def get(self, **headers):
+        # A new client loads the middleware stack with the current settings
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        return client.get('/api/tests/', **headers)
+    
+    def test_signed_header_triggers_profile(self):
+        """Test that a valid X-Profile token writes a cProfile and a memory report"""
+        with self.profiling():
+            response = self.get(HTTP_X_PROFILE=make_profiling_token())
+        profile_id = response['X-Profile-Id']
+        self.assertIn('test-list', profile_id)
+        self.assertEqual(
+            sorted(os.listdir(self.directory)), [f'{profile_id}.mem.txt', f'{profile_id}.prof']
+        )
+        stats = pstats.Stats(os.path.join(self.directory, f'{profile_id}.prof'))
+        self.assertTrue(stats.total_calls)
+    
+    def test_invalid_header_and_disabled_hook_do_not_profile(self):
+        """Test that forged tokens are ignored and the hook is inert when disabled"""
+        with self.profiling():
+            response = self.get(HTTP_X_PROFILE='profile:forged:signature')
+        self.assertNotIn('X-Profile-Id', response)
+        response = self.get(HTTP_X_PROFILE=make_profiling_token())
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+    
+    def test_sampling_and_retention(self):
+        """Test that sampled profiles are capped at MAX_PROFILES"""
+        with self.profiling(SAMPLE_RATE=1, MAX_PROFILES=2):
+            for _ in range(4):
+                self.assertIn('X-Profile-Id', self.get())
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith('.prof')]), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+
+class TracingTestCase(TestCase):
+    """Test cases for request tracing"""
+    
+    def setUp(self):
+        clear_local_bundles()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'traces.jsonl')
+        self.user = User.objects.create_user(username='traced', password='pass123')
+        self.test = Test.objects.create(name='Traced', description='d', time_limit=10)
+        for value in ('2', '3'):
+            CodeTestCase.objects.create(test=self.test, input_data=value, expected_output=str(int(value) ** 2))
+    
+    def submit(self):
+        with override_settings(TRACING={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'FILE': self.path}):
+            client = APIClient()
+            token = ClaimsRefreshToken.for_user(self.user).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            return client.post(
+                f'/api/tests/{self.test.id}/submit/', {'code': 'print(int(input()) ** 2)'}, format='json'
+            )
+    
+    def test_submit_records_nested_spans(self):
+        """Test that a submit is traced from the request down to each process"""
+        response = self.submit()
+        with open(self.path) as f:
+            spans = [json.loads(line) for line in f]
+        self.assertEqual({span['trace_id'] for span in spans}, {response['X-Trace-Id']})
+        
+        by_id = {span['span_id']: span for span in spans}
+        
+        def path(span):
+            names = []
+            while span is not None:
+                names.append(span['name'])
+                span = by_id.get(span['parent_id'])
+            return ' > '.join(reversed(names))
+        
+        paths = {path(span) for span in spans}
+        for expected in (
+            'request > auth',
+            'request > get_bundle > bundle.load > db',
+            'request > execute_code > spawn',
+            'request > execute_code > wait',
+            'request > compare',
+            'request > submission.save > db',
+        ):
+            self.assertIn(expected, paths)
+        root = next(span for span in spans if span['parent_id'] is None)
+        self.assertEqual(root['attrs']['route'], 'test-submit')
+        self.assertEqual(len([span for span in spans if span['name'] == 'execute_code']), 2)
+    
+    def test_summary_command_reports_span_paths(self):
+        """Test that trace_summary aggregates spans by path"""
+        self.submit()
+        self.submit()
+        out = StringIO()
+        call_command('trace_summary', f'--file={self.path}', '--route=test-submit', stdout=out)
+        output = out.getvalue()
+        self.assertIn('2 traces', output)
+        self.assertIn('request test-submit > execute_code > wait', output)
+    
+    def test_untraced_requests_write_nothing(self):
+        """Test that tracing is off by default"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get('/api/tests/')
+        self.assertNotIn('X-Trace-Id', response)
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TrafficRecordingTestCase(TestCase):
+    """Test cases for the traffic recorder middleware"""
+    
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'traffic.jsonl')
+        self.user = User.objects.create_user(username='recorded', password='pass12345')
+        self.test = Test.objects.create(name='Recorded', description='d', time_limit=10)
+    
+    def recording(self):
+        return override_settings(TRAFFIC_RECORDING={**settings.TRAFFIC_RECORDING, 'ENABLED': True, 'FILE': self.path})
+    
+    def test_records_sanitised_requests(self):
+        """Test that requests are recorded without credentials or usernames"""
+        with self.recording():
+            client = APIClient()
+            client.post('/api/auth/login/', {'username': 'recorded', 'password': 'pass12345'}, format='json')
+            client.force_authenticate(user=self.user)
+            client.post(f'/api/tests/{self.test.id}/save/', {'code': 'print(1)'}, format='json')
+            client.get('/admin/')
+        with open(self.path) as f:
+            login, save = [json.loads(line) for line in f]
+        
+        self.assertEqual(login['status'], 200)
+        self.assertEqual(login['body']['password'], '<redacted>')
+        self.assertTrue(login['body']['username'].startswith('u-'))
+        self.assertNotIn('recorded', json.dumps(login))
+        self.assertIsNone(login['user'])
+        self.assertEqual(save['path'], f'/api/tests/{self.test.id}/save/')
+        self.assertEqual(save['body'], {'code': 'print(1)'})
+        self.assertTrue(save['user'].startswith('u-'))
+        self.assertGreater(save['duration_ms'], 0)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ReplayTrafficTestCase(LiveServerTestCase):
+    """Test cases for the replay_traffic command"""
+    
+    def test_replays_recording_against_server(self):
+        """Test that a recording is replayed with minted tokens and remapped test ids"""
+        test = Test.objects.create(name='Replayed', description='d', time_limit=10)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        recording = os.path.join(directory, 'traffic.jsonl')
+        records = [
+            {'ts': 100.0, 'method': 'POST', 'path': '/api/auth/login/', 'status': 200, 'user': None,
+             'body': {'username': 'u-aaaa', 'password': '<redacted>'}},
+            {'ts': 100.05, 'method': 'POST', 'path': '/api/auth/register/', 'status': 201, 'user': None,
+             'body': {'username': 'u-bbbb', 'email': 'e-bbbb', 'password': '<redacted>'}},
+            {'ts': 100.1, 'method': 'GET', 'path': '/api/tests/', 'status': 200, 'user': 'u-aaaa', 'body': None},
+            {'ts': 100.2, 'method': 'POST', 'path': '/api/tests/9999/save/', 'status': 200, 'user': 'u-cccc',
+             'body': {'code': 'print(1)', 'language': 'python'}},
+        ]
+        with open(recording, 'w') as f:
+            f.writelines(json.dumps(record) + '\n' for record in records)
+        output = os.path.join(directory, 'summary.json')
+        
+        call_command(
+            'replay_traffic', recording, f'--base-url={self.live_server_url}', '--speed=10',
+            '--concurrency=2', '--remap-tests', f'--output={output}', stdout=StringIO()
+        )
+        with open(output) as f:
+            summary = json.load(f)
+        self.assertEqual(summary['requests'], 4)
+        self.assertEqual(summary['error_rate'], 0)
+        self.assertEqual(summary['status_mismatches'], 0)
+        self.assertIn('POST /api/tests/{id}/save/', summary['routes'])
+        self.assertTrue(CodeProgress.objects.filter(test=test, user__username='replay_u-cccc').exists())
+
+
+class AsyncExecutionTestCase(TestCase):
+    """Test cases for the async execution views"""
+    
+    def setUp(self):
+        clear_local_bundles()
+        self.factory = AsyncRequestFactory()
+        self.user = User.objects.create_user(username='async', password='pass123')
+        self.token = str(ClaimsRefreshToken.for_user(self.user).access_token)
+        self.test = Test.objects.create(name='Squares', description='d', time_limit=10)
+        for value in ('2', '3', '4'):
+            CodeTestCase.objects.create(test=self.test, input_data=value, expected_output=str(int(value) ** 2))
+    
+    def post(self, path, data, authenticated=True):
+        headers = {'Authorization': f'Bearer {self.token}'} if authenticated else {}
+        return self.factory.post(path, data, content_type='application/json', headers=headers)
+    
+    async def test_submit_runs_cases_concurrently(self):
+        """Test that an async submit grades all cases and stores the submission"""
+        code = 'import time\ntime.sleep(0.5)\nprint(int(input()) ** 2)'
+        started = time.monotonic()
+        response = await async_views.submit(
+            self.post(f'/api/tests/{self.test.id}/submit/', {'code': code}), pk=self.test.id
+        )
+        elapsed = time.monotonic() - started
+        data = json.loads(response.content)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['score'], 100)
+        self.assertEqual([result['passed'] for result in data['results']], [True, True, True])
+        # Three half-second cases run side by side
+        self.assertLess(elapsed, 1.4)
+        submission = await Submission.objects.aget(pk=data['submission_id'])
+        self.assertEqual((submission.user_id, submission.status), (self.user.id, 'passed'))
+    
+    async def test_submit_summary(self):
+        """Test that async submit honours the verbosity like the DRF view"""
+        path = f'/api/tests/{self.test.id}/submit/?verbosity=summary'
+        response = await async_views.submit(self.post(path, {'code': 'print(int(input()) ** 2)'}), pk=self.test.id)
+        results = json.loads(response.content)['results']
+        self.assertEqual([set(result) for result in results], [{'test_case', 'passed'}] * 3)
+        response = await async_views.submit(
+            self.post(f'/api/tests/{self.test.id}/submit/', {'code': 'print(1)', 'verbosity': 'all'}), pk=self.test.id
+        )
+        self.assertEqual(response.status_code, 400)
+    
+    async def test_execute_matches_sync_responses(self):
+        """Test that async execute returns the same payloads as the DRF view"""
+        response = await async_views.execute_code(self.post('/api/tests/execute/', {'code': 'print(42)'}))
+        self.assertEqual(json.loads(response.content), {'output': '42\n', 'error': ''})
+        
+        response = await async_views.execute_code(self.post('/api/tests/execute/', {'code': ''}))
+        self.assertEqual(response.status_code, 400)
+        
+        with override_settings(CODE_EXECUTION_TIMEOUT=1):
+            response = await async_views.execute_code(
+                self.post('/api/tests/execute/', {'code': 'while True: pass'})
+            )
+        self.assertEqual(response.status_code, 408)
+    
+    async def test_requires_authentication_and_existing_test(self):
+        """Test that async views reject anonymous requests and unknown tests"""
+        response = await async_views.execute_code(
+            self.post('/api/tests/execute/', {'code': 'print(1)'}, authenticated=False)
+        )
+        self.assertEqual(response.status_code, 401)
+        response = await async_views.submit(self.post('/api/tests/999999/submit/', {'code': 'print(1)'}), pk=999999)
+        self.assertEqual(response.status_code, 404)
+
+
+class LiveRunStreamingTestCase(TestCase):
+    """Test cases for streamed code runs"""
+    
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        self.user = User.objects.create_user(username='streamer', password='pass123')
+        self.token = str(ClaimsRefreshToken.for_user(self.user).access_token)
+    
+    async def collect(self, run):
+        return [event async for event in run.events()]
+    
+    async def drain(self, events):
+        return [event async for event in events]
+    
+    async def test_streams_output_as_it_is_produced(self):
+        """Test that stdout and stderr chunks arrive before the program exits"""
+        code = 'import sys, time\nprint("first", flush=True)\ntime.sleep(0.3)\nprint("oops", file=sys.stderr)'
+        run = LiveRun(self.user.id, code)
+        events = run.events()
+        self.assertEqual((await anext(events))[0], 'start')
+        started = time.monotonic()
+        output = ''
+        while output != 'first\n':
+            kind, data = await anext(events)
+            self.assertEqual(kind, 'stdout')
+            output += data['data']
+        self.assertLess(time.monotonic() - started, 0.25)
+        rest = [event async for event in events]
+        self.assertEqual(''.join(data['data'] for kind, data in rest if kind == 'stderr'), 'oops\n')
+        self.assertEqual(rest[-1][0], 'exit')
+        self.assertEqual(rest[-1][1]['verdict'], 'ok')
+    
+    async def test_output_is_capped(self):
+        """Test that a run is killed once it exceeds its byte cap"""
+        run = LiveRun(self.user.id, 'while True: print("x" * 100)', max_bytes=2000)
+        events = await self.collect(run)
+        self.assertEqual(events[-2], ('truncated', {'limit': 2000}))
+        self.assertEqual(events[-1][1]['verdict'], 'truncated')
+        streamed = sum(len(data['data']) for kind, data in events if kind == 'stdout')
+        self.assertLessEqual(streamed, 2000)
+    
+    async def test_abandoned_stream_kills_process(self):
+        """Test that a disconnected client frees the process at once"""
+        run = LiveRun(self.user.id, 'while True: print("x" * 100)')
+        events = run.events()
+        await anext(events)
+        await anext(events)
+        self.assertIs(get_active(run.id), run)
+        await events.aclose()
+        self.assertEqual(await asyncio.wait_for(run.process.wait(), 1), -9)
+        self.assertIsNone(get_active(run.id))
+    
+    async def test_cancel_endpoint_stops_run(self):
+        """Test that the cancel endpoint kills a run streamed by the same user"""
+        headers = {'Authorization': f'Bearer {self.token}'}
+        request = self.factory.post(
+            '/api/tests/execute/stream/', {'code': 'import time\ntime.sleep(30)'},
+            content_type='application/json', headers=headers
+        )
+        response = await async_views.execute_stream(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = response.streaming_content
+        self.assertIn(b'event: start', await anext(chunks))
+        
+        cancel = await async_views.cancel_stream(
+            self.factory.post(f'/api/tests/execute/stream/{response["X-Run-Id"]}/cancel/', headers=headers),
+            run_id=response['X-Run-Id'],
+        )
+        self.assertEqual(cancel.status_code, 200)
+        body = b''.join([chunk async for chunk in chunks])
+        self.assertIn(b'"verdict": "cancelled"', body)
+    
+    async def test_cancel_reaches_runs_of_other_workers(self):
+        """Test that a run not in this worker is cancelled through the shared cache"""
+        run = LiveRun(self.user.id, 'import time\ntime.sleep(30)')
+        events = run.events()
+        self.assertEqual((await anext(events))[0], 'start')
+        # As seen from a worker that is not serving the run
+        streaming._active.pop(run.id)
+        headers = {'Authorization': f'Bearer {self.token}'}
+        cancel = await async_views.cancel_stream(
+            self.factory.post(f'/api/tests/execute/stream/{run.id}/cancel/', headers=headers), run_id=run.id
+        )
+        self.assertEqual(cancel.status_code, 202)
+        rest = await asyncio.wait_for(self.drain(events), 5)
+        self.assertEqual(rest[-1][1]['verdict'], 'cancelled')
+        self.assertIsNone(await caches['shared'].aget(streaming.run_key(run.id)))
+    
+    async def test_pings_only_while_the_program_is_quiet(self):
+        """Test that pings fill silent seconds and are not sent between chunks"""
+        code = 'import time\nfor _ in range(60):\n    print("tick", flush=True)\n    time.sleep(0.02)\ntime.sleep(2.2)'
+        events = await asyncio.wait_for(self.drain(LiveRun(self.user.id, code).events()), 10)
+        kinds = [kind for kind, _ in events]
+        self.assertEqual(kinds[-1], 'exit')
+        self.assertEqual(kinds[-2], 'ping')
+        last_output = max(i for i, kind in enumerate(kinds) if kind == 'stdout')
+        self.assertNotIn('ping', kinds[:last_output])
+    
+    async def test_cancel_reaches_runs_that_never_go_quiet(self):
+        """Test that a shared-cache cancel stops a program that keeps printing"""
+        code = 'import time\nwhile True:\n    print("tick", flush=True)\n    time.sleep(0.01)'
+        run = LiveRun(self.user.id, code, timeout=30)
+        events = run.events()
+        self.assertEqual((await anext(events))[0], 'start')
+        streaming._active.pop(run.id)
+        headers = {'Authorization': f'Bearer {self.token}'}
+        cancel = await async_views.cancel_stream(
+            self.factory.post(f'/api/tests/execute/stream/{run.id}/cancel/', headers=headers), run_id=run.id
+        )
+        self.assertEqual(cancel.status_code, 202)
+        rest = await asyncio.wait_for(self.drain(events), 5)
+        self.assertNotIn('ping', [kind for kind, _ in rest])
+        self.assertEqual(rest[-1][1]['verdict'], 'cancelled')
+    
+    async def test_cancel_of_unknown_run_is_not_found(self):
+        """Test that cancelling a run that is not in progress anywhere answers 404"""
+        headers = {'Authorization': f'Bearer {self.token}'}
+        cancel = await async_views.cancel_stream(
+            self.factory.post('/api/tests/execute/stream/missing/cancel/', headers=headers), run_id='missing'
+        )
+        self.assertEqual(cancel.status_code, 404)
+
+
+class WorkspaceTestCase(TestCase):
+    """Test the single-request workspace of the coding page"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='candidate', password='pass123')
+        self.test = Test.objects.create(name='Echo', description='Print the input', time_limit=45, difficulty='Easy')
+        self.sample = CodeTestCase.objects.create(test=self.test, input_data='hi', expected_output='hi', is_sample=True)
+        self.hidden = CodeTestCase.objects.create(test=self.test, input_data='secret', expected_output='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = f'/api/tests/{self.test.id}/workspace/'
+    
+    def test_empty_workspace(self):
+        """Test a first visit: sample cases only, nothing saved or submitted"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Echo')
+        self.assertEqual([case['id'] for case in response.data['test_cases']], [self.sample.id])
+        self.assertEqual(response.data['limits'], {'time_limit': 45, 'execution_timeout': settings.CODE_EXECUTION_TIMEOUT})
+        self.assertIsNone(response.data['saved'])
+        self.assertIsNone(response.data['best_submission'])
+    
+    def test_saved_code_and_best_submission_in_two_queries(self):
+        """Test that a warm workspace costs two queries and includes progress and best score"""
+        self.client.post(f'/api/tests/{self.test.id}/save/', {'code': 'print(1)', 'language': 'python'}, format='json')
+        Submission.objects.create(user=self.user, test=self.test, code='x', language='python', score=50, status='failed')
+        best = Submission.objects.create(user=self.user, test=self.test, code='y', language='python', score=100,
+                                         status='passed')
+        get_test_bundle(self.test.id)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['saved']['code'], 'print(1)')
+        self.assertEqual(response.data['saved']['version'], 1)
+        self.assertEqual(response.data['best_submission']['id'], best.id)
+    
+    def test_etag_revalidation(self):
+        """Test that an unchanged workspace answers 304 and a save changes the ETag"""
+        first = self.client.get(self.url)
+        etag = first['ETag']
+        self.assertIn('private', first['Cache-Control'])
+        
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(again['ETag'], etag)
+        
+        self.client.post(f'/api/tests/{self.test.id}/save/', {'code': 'print(2)', 'language': 'python'}, format='json')
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(changed['ETag'], etag)
+    
+    def test_missing_test(self):
+        """Test that an unknown test is a 404"""
+        self.assertEqual(self.client.get('/api/tests/999999/workspace/').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ResponseEncodingTestCase(TestCase):
+    """Test sparse fieldsets, submit verbosity, JSON rendering and compression"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='candidate', password='pass123')
+        self.test = Test.objects.create(name='Echo', description='Print the input', time_limit=10)
+        self.sample = CodeTestCase.objects.create(test=self.test, input_data='hi', expected_output='hi', is_sample=True)
+        self.hidden = CodeTestCase.objects.create(test=self.test, input_data='secret', expected_output='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.submit_url = f'/api/tests/{self.test.id}/submit/'
+    
+    def test_sparse_fieldsets(self):
+        """Test that ?fields= and ?exclude= trim the top level of responses"""
+        response = self.client.get('/api/tests/', {'fields': 'id,name'})
+        self.assertEqual(response.data[0], {'id': self.test.id, 'name': 'Echo'})
+        
+        response = self.client.get(f'/api/tests/{self.test.id}/', {'exclude': 'test_cases,description'})
+        self.assertNotIn('test_cases', response.data)
+        self.assertNotIn('description', response.data)
+        self.assertEqual(response.data['time_limit'], 10)
+        
+        Submission.objects.create(user=self.user, test=self.test, code='x', language='python', score=50)
+        response = self.client.get('/api/submissions/', {'fields': 'id,score,unknown'})
+        self.assertEqual(set(response.data[0]), {'id', 'score'})
+    
+    def test_submit_hides_hidden_cases(self):
+        """Test that full results show sample cases only, and summary results no case data"""
+        response = self.client.post(self.submit_url, {'code': 'print(input())'}, format='json')
+        sample, hidden = response.data['results']
+        self.assertEqual((sample['test_case'], sample['input'], sample['passed']), (self.sample.id, 'hi', True))
+        self.assertEqual(hidden, {'test_case': self.hidden.id, 'passed': True, 'hidden': True})
+        
+        response = self.client.post(f'{self.submit_url}?verbosity=summary', {'code': 'print(input())'}, format='json')
+        self.assertEqual(response.data['results'], [
+            {'test_case': self.sample.id, 'passed': True}, {'test_case': self.hidden.id, 'passed': True},
+        ])
+        self.assertEqual(response.data['score'], 100)
+        
+        response = self.client.post(self.submit_url, {'code': 'print(1)', 'verbosity': 'all'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Submission.objects.count(), 2)
+    
+    def test_fast_renderer_matches_drf(self):
+        """Test that the orjson renderer and parser agree with DRF's JSON classes"""
+        data = {
+            'name': 'caf\u00e9 \u2028 line', 'when': timezone.now(), 'score': Decimal('1.50'), 'empty': None,
+            'nested': [{'id': 1, 'passed': True}], 'ratio': 0.25,
+        }
+        self.assertEqual(
+            json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data))
+        )
+        self.assertNotIn(b'\xe2\x80\xa8', FastJSONRenderer().render(data))
+        self.assertEqual(FastJSONParser().parse(BytesIO(b'{"code": "print(1)"}')), {'code': 'print(1)'})
+        with self.assertRaises(exceptions.ParseError):
+            FastJSONParser().parse(BytesIO(b'{"code": '))
+    
+    def test_large_responses_are_compressed(self):
+        """Test that large bodies are gzipped for clients accepting it, small ones are not"""
+        response = self.client.get(f'/api/tests/{self.test.id}/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        
+        Test.objects.filter(pk=self.test.id).update(description='Print the input. ' * 200)
+        response = self.client.get(f'/api/tests/{self.test.id}/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response = self.client.get(f'/api/tests/{self.test.id}/')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class IdempotencyTestCase(TestCase):
+    """Test Idempotency-Key handling on submit, execute and save"""
+    
+    def setUp(self):
+        caches['shared'].clear()
+        clear_local_bundles()
+        self.user = User.objects.create_user(username='candidate', password='pass123')
+        self.test = Test.objects.create(name='Echo', description='Print the input', time_limit=10)
+        CodeTestCase.objects.create(test=self.test, input_data='hi', expected_output='hi', is_sample=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.token = str(ClaimsRefreshToken.for_user(self.user).access_token)
+    
+    def submit(self, code, key):
+        return self.client.post(
+            f'/api/tests/{self.test.id}/submit/', {'code': code}, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+    
+    def test_repeated_submit_is_replayed(self):
+        """Test that a repeated key returns the first response without a second submission"""
+        first = self.submit('print(input())', 'key-1')
+        second = self.submit('print(input())', 'key-1')
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+        self.assertEqual(Submission.objects.count(), 1)
+        
+        # Another key, or another user with the same key, runs again
+        self.submit('print(input())', 'key-2')
+        other = User.objects.create_user(username='other', password='pass123')
+        self.client.force_authenticate(user=other)
+        self.submit('print(input())', 'key-1')
+        self.assertEqual(Submission.objects.count(), 3)
+    
+    def test_key_reused_for_another_request(self):
+        """Test that a key sent with a different body is rejected, and overlong keys too"""
+        self.submit('print(input())', 'key-1')
+        response = self.submit('print(2)', 'key-1')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        response = self.submit('print(2)', 'k' * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Submission.objects.count(), 1)
+    
+    def test_save_and_execute_replay(self):
+        """Test that save and execute replay their first response"""
+        url = f'/api/tests/{self.test.id}/save/'
+        self.client.post(url, {'code': 'print(1)'}, format='json', HTTP_IDEMPOTENCY_KEY='save-1')
+        self.client.post(url, {'code': 'print(2)'}, format='json')
+        response = self.client.post(url, {'code': 'print(1)'}, format='json', HTTP_IDEMPOTENCY_KEY='save-1')
+        self.assertEqual(response.data['version'], 1)
+        self.assertEqual(CodeProgress.objects.get(user=self.user).code, 'print(2)')
+        
+        response = self.client.post('/api/tests/execute/', {'code': 'print(7)'}, format='json',
+                                    HTTP_IDEMPOTENCY_KEY='run-1')
+        replayed = self.client.post('/api/tests/execute/', {'code': 'print(7)'}, format='json',
+                                    HTTP_IDEMPOTENCY_KEY='run-1')
+        self.assertEqual((replayed.data, replayed['Idempotent-Replayed']), (response.data, 'true'))
+    
+    async def concurrent_runs(self):
+        factory = AsyncRequestFactory()
+        
+        async def run():
+            return await async_views.execute_code(factory.post(
+                '/api/tests/execute/', {'code': 'import time\ntime.sleep(0.5)\nprint(1)'},
+                content_type='application/json',
+                headers={'Authorization': f'Bearer {self.token}', 'Idempotency-Key': 'run-1'},
+            ))
+        return await asyncio.gather(run(), run())
+    
+    async def test_concurrent_duplicate_waits_for_first(self):
+        """Test that a duplicate arriving during the run waits for its result instead of running"""
+        started = time.monotonic()
+        first, second = await self.concurrent_runs()
+        self.assertLess(time.monotonic() - started, 0.95)
+        self.assertEqual(json.loads(first.content), json.loads(second.content))
+        self.assertEqual(
+            sorted(response.has_header('Idempotent-Replayed') for response in (first, second)), [False, True]
+        )
+    
+    async def test_concurrent_duplicate_gives_up(self):
+        """Test that a duplicate still waiting after WAIT seconds gets a 409"""
+        with override_settings(IDEMPOTENCY=dict(settings.IDEMPOTENCY, WAIT=0)):
+            responses = await self.concurrent_runs()
+        self.assertEqual(sorted(response.status_code for response in responses), [200, 409])
+    
+    def test_claims_are_shared_between_workers(self):
+        """Test that keys stored through one worker's cache connection are seen through another's"""
+        other_worker = caches.create_connection('shared')
+        path = f'/api/tests/{self.test.id}/submit/'
+        self.submit('print(input())', 'key-1')
+        record = other_worker.get(idempotency._cache_key(self.user.id, path, 'key-1'))
+        self.assertEqual(record['status'], status.HTTP_200_OK)
+        
+        # A key another worker is still running: this one must not run it again
+        other_worker.add(idempotency._cache_key(self.user.id, path, 'key-2'), dict(record, status=None, data=None))
+        with override_settings(IDEMPOTENCY=dict(settings.IDEMPOTENCY, WAIT=0)):
+            response = self.submit('print(input())', 'key-2')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Submission.objects.count(), 1)
+    
+    def test_disabled(self):
+        """Test that keys are ignored when idempotency is disabled"""
+        with override_settings(IDEMPOTENCY=dict(settings.IDEMPOTENCY, ENABLED=False)):
+            self.submit('print(input())', 'key-1')
+            self.submit('print(input())', 'key-1')
+        self.assertEqual(Submission.objects.count(), 2)
+
+
+class BootstrapTestCase(TestCase):
+    """Test the container bootstrap command and the readiness probe"""
+    
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        for name, value in (('DJANGO_SUPERUSER_USERNAME', 'root'), ('DJANGO_SUPERUSER_PASSWORD', 'rootpass123')):
+            self.addCleanup(os.environ.pop, name, None)
+            os.environ[name] = value
+    
+    def bootstrap(self, *args):
+        out = StringIO()
+        with override_settings(STATIC_ROOT=self.static_root):
+            call_command('bootstrap', *args, stdout=out)
+        return out.getvalue()
+    
+    def test_second_run_skips_everything(self):
+        """Test that a repeated bootstrap applies, collects and creates nothing new"""
+        output = self.bootstrap('--sample-data')
+        self.assertIn('Migrations: none to apply', output)
+        self.assertIn('Static files: collected', output)
+        self.assertIn('Superuser: created root', output)
+        self.assertTrue(os.path.exists(os.path.join(self.static_root, 'admin', 'css', 'base.css')))
+        self.assertTrue(User.objects.get(username='root').is_superuser)
+        tests = Test.objects.count()
+        self.assertGreater(tests, 0)
+        
+        output = self.bootstrap('--sample-data')
+        self.assertIn('Static files: unchanged', output)
+        self.assertIn('Superuser: root exists', output)
+        self.assertEqual(Test.objects.count(), tests)
+        self.assertEqual(User.objects.filter(username='root').count(), 1)
+    
+    def test_changed_static_files_are_collected(self):
+        """Test that a different static manifest triggers collectstatic again"""
+        self.bootstrap()
+        with open(os.path.join(self.static_root, '.bootstrap-static.sha256'), 'w') as manifest:
+            manifest.write('stale')
+        self.assertIn('Static files: collected', self.bootstrap())
+        self.assertIn('Static files: unchanged', self.bootstrap())
+        self.assertNotIn('Static files', self.bootstrap('--skip-static'))
+    
+    def test_readiness(self):
+        """Test that the readiness probe reports each check and fails without a working cache"""
+        response = self.client.get('/api/ready')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['ready'])
+        self.assertEqual(set(data['checks']), {'database', 'cache', 'executor'})
+        self.assertIn('no-cache', response['Cache-Control'])
+        
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            response = self.client.get('/api/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['checks']['cache']['ok'])
+        self.assertTrue(response.json()['checks']['database']['ok'])
+
+
+class CodeBlobTestCase(TestCase):
+    """Test deduplicated, compressed storage of submitted code"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='blobber', password='pass123')
+        self.test = Test.objects.create(name='Blobs', description='Test', time_limit=30)
+    
+    def test_identical_code_is_stored_once(self):
+        """Test that submissions and progress with the same code share one compressed blob"""
+        code = 'def solve(values):\n    return sorted(values)\n' * 50
+        for _ in range(3):
+            Submission.objects.create(user=self.user, test=self.test, code=code, language='python')
+        CodeProgress.objects.create(user=self.user, test=self.test, code=code, content_hash=content_hash(code))
+        
+        self.assertEqual(CodeBlob.objects.count(), 1)
+        blob = CodeBlob.objects.get()
+        self.assertEqual(blob.hash, content_hash(code))
+        self.assertEqual(blob.size, len(code))
+        self.assertLess(len(blob.data), len(code) // 10)
+    
+    def test_code_is_loaded_lazily(self):
+        """Test that code is fetched only when it is read"""
+        submission = Submission.objects.create(user=self.user, test=self.test, code='print(1)', language='python')
+        with self.assertNumQueries(1):
+            loaded = Submission.objects.get(pk=submission.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(loaded.code, 'print(1)')
+        with self.assertNumQueries(1):
+            self.assertEqual(Submission.objects.select_related('code_blob').get(pk=submission.pk).code, 'print(1)')
+    
+    def test_prune_keeps_referenced_and_recent_blobs(self):
+        """Test that prune_code_blobs deletes only old, unreferenced blobs"""
+        Submission.objects.create(user=self.user, test=self.test, code='kept', language='python')
+        CodeBlob.store([CodeBlob.for_text('orphan'), CodeBlob.for_text('recent orphan')])
+        CodeBlob.objects.exclude(hash=content_hash('recent orphan')).update(
+            stored_at=timezone.now() - timedelta(days=2)
+        )
+        
+        call_command('prune_code_blobs', stdout=StringIO())
+        self.assertEqual(
+            set(CodeBlob.objects.values_list('hash', flat=True)),
+            {content_hash('kept'), content_hash('recent orphan')}
+        )
+
+
+class SubmissionArchiveTestCase(TestCase):
+    """Test archival of old submissions and progress of closed tests"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='archivist', password='pass123')
+        self.test = Test.objects.create(name='Archived', description='Test', time_limit=30)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        now = timezone.now()
+        self.old = []
+        for days in [400, 420, 700]:
+            submission = Submission.objects.create(
+                user=self.user, test=self.test, code=f'print({days})', language='python', score=days // 10
+            )
+            Submission.objects.filter(pk=submission.pk).update(submitted_at=now - timedelta(days=days))
+            self.old.append(submission.pk)
+        self.recent = Submission.objects.create(user=self.user, test=self.test, code='print(0)', language='python')
+    
+    def test_moves_old_submissions_in_batches(self):
+        """Test that submissions past the window move into monthly chunks"""
+        moved = archive_submissions(timezone.now() - timedelta(days=365), batch_size=1)
+        self.assertEqual(moved, 3)
+        self.assertEqual(list(Submission.objects.values_list('pk', flat=True)), [self.recent.pk])
+        chunks = ArchiveChunk.objects.filter(kind='submission', user=self.user)
+        self.assertEqual(sum(chunk.rows for chunk in chunks), 3)
+        self.assertEqual(chunks.count(), len({chunk.period for chunk in chunks}))
+        self.assertEqual(archive_submissions(timezone.now() - timedelta(days=365)), 0)
+    
+    def test_full_chunks_are_not_rewritten(self):
+        """Test that a month's rows go to new parts once its last chunk is full"""
+        self.addCleanup(setattr, retention, 'CHUNK_ROWS', retention.CHUNK_ROWS)
+        retention.CHUNK_ROWS = 2
+        month = timezone.now() - timedelta(days=800)
+        for i in range(3):
+            submission = Submission.objects.create(user=self.user, test=self.test, code=f'print({i})', language='python')
+            Submission.objects.filter(pk=submission.pk).update(submitted_at=month + timedelta(minutes=i))
+        archive_submissions(timezone.now() - timedelta(days=365), batch_size=1)
+        
+        chunks = ArchiveChunk.objects.filter(kind='submission', user=self.user, period=retention.period_of(month))
+        self.assertEqual([(chunk.part, chunk.rows) for chunk in chunks.order_by('part')], [(0, 2), (1, 1)])
+        self.assertEqual(len(retention.archived_submissions(self.user.id)), 6)
+    
+    def test_reads_unpack_only_indexed_chunks(self):
+        """Test that looking up one archived row or test does not unpack the user's other chunks"""
+        other = Test.objects.create(name='Other', description='Test', time_limit=30)
+        submission = Submission.objects.create(user=self.user, test=other, code='print(1)', language='python')
+        Submission.objects.filter(pk=submission.pk).update(submitted_at=timezone.now() - timedelta(days=500))
+        archive_submissions(timezone.now() - timedelta(days=365))
+        self.assertGreater(ArchiveChunk.objects.filter(user=self.user).count(), 2)
+        
+        unpacked = []
+        self.addCleanup(setattr, retention, 'unpack', retention.unpack)
+        retention.unpack = lambda data, unpack=retention.unpack: unpacked.append(data) or unpack(data)
+        self.assertEqual(retention.archived_submission(self.user.id, self.old[1])['code'], 'print(420)')
+        self.assertEqual(len(unpacked), 1)
+        self.assertEqual([row['id'] for row in retention.archived_submissions(self.user.id, other.id)], [submission.pk])
+        self.assertEqual(len(unpacked), 2)
+    
+    def test_archived_submissions_are_served_by_the_api(self):
+        """Test that the submission API reads archived submissions transparently"""
+        call_command('archive_submissions', '--days=365', stdout=StringIO())
+        response = self.client.get('/api/submissions/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data], [self.recent.pk] + self.old)
+        self.assertEqual([row['archived'] for row in response.data], [False, True, True, True])
+        
+        response = self.client.get(f'/api/submissions/{self.old[0]}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['code'], 'print(400)')
+        self.assertEqual(response.data['score'], 40)
+        
+        other = APIClient()
+        other.force_authenticate(user=User.objects.create_user(username='other', password='pass123'))
+        self.assertEqual(other.get(f'/api/submissions/{self.old[0]}/').status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_progress_of_closed_tests_is_archived(self):
+        """Test that saved code of a closed test is archived and still readable"""
+        CodeProgress.objects.create(user=self.user, test=self.test, code='draft', content_hash=content_hash('draft'))
+        self.assertEqual(archive_progress(), 0)
+        
+        Test.objects.filter(pk=self.test.pk).update(closed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(archive_progress(), 1)
+        self.assertFalse(CodeProgress.objects.exists())
+        response = self.client.get(f'/api/tests/{self.test.id}/saved/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['code'], 'draft')
+        self.assertTrue(response.data['archived'])
+
+
+class CaseResultsTestCase(TestCase):
+    """Test stored per-case results and test case analytics"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='analyst', password='pass123')
+        self.test = Test.objects.create(name='Squares', description='Test', time_limit=30)
+        self.cases = [
+            CodeTestCase.objects.create(test=self.test, input_data=str(n), expected_output=str(n * n))
+            for n in [2, 3, 4]
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def add_submission(self, passed, runtimes=(1000, 2000, 3000), memory=(0, 0, 0)):
+        return Submission.objects.create(
+            user=self.user, test=self.test, code='pass', language='python',
+            score=sum(passed) * 100 // len(passed),
+            case_ids=pack_uint32([case.id for case in self.cases]),
+            case_passed=pack_bitmap(passed),
+            case_runtimes=pack_uint32(runtimes),
+            case_memory=pack_uint32(memory),
+        )
+    
+    def test_submit_stores_packed_results(self):
+        """Test that submit keeps a pass bitmap and runtime/memory arrays"""
+        code = 'n = int(input())\nprint(n * n if n != 3 else 0)'
+        response = self.client.post(f'/api/tests/{self.test.id}/submit/', {'code': code}, format='json')
+        submission = Submission.objects.get(pk=response.data['submission_id'])
+        self.assertEqual(len(bytes(submission.case_passed)), 1)
+        self.assertEqual(len(bytes(submission.case_runtimes)), 3 * 4)
+        
+        outcomes = case_outcomes(submission)
+        self.assertEqual([outcome['test_case'] for outcome in outcomes], [case.id for case in self.cases])
+        self.assertEqual([outcome['passed'] for outcome in outcomes], [True, False, True])
+        self.assertTrue(all(outcome['runtime_ms'] > 0 for outcome in outcomes))
+        self.assertTrue(all(outcome['memory_kb'] > 1000 for outcome in outcomes))
+        
+        detail = self.client.get(f'/api/submissions/{submission.id}/')
+        self.assertEqual(detail.data['case_results'], outcomes)
+    
+    def test_case_statistics(self):
+        """Test failure rates, percentiles and discrimination per case"""
+        self.add_submission([True, True, True], memory=(9000, 0, 0))
+        self.add_submission([True, True, False])
+        self.add_submission([True, False, False])
+        self.add_submission([False, False, True])
+        
+        stats = case_statistics(self.test.id)
+        self.assertEqual(stats['submissions'], 4)
+        by_case = {case['test_case']: case for case in stats['cases']}
+        first, second, third = (by_case[case.id] for case in self.cases)
+        self.assertEqual([first['failure_rate'], second['failure_rate'], third['failure_rate']], [0.25, 0.5, 0.5])
+        self.assertEqual(first['runtime_ms'], {'p50': 1.0, 'p90': 1.0, 'p99': 1.0})
+        self.assertEqual(first['memory_kb']['p50'], 9000)
+        self.assertIsNone(second['memory_kb'])
+        # Two submissions per group: scores 100, 66 above 33, 33
+        self.assertEqual(second['discrimination'], 1.0)
+        self.assertEqual(third['discrimination'], 0.0)
+    
+    def test_analytics_endpoint_and_command(self):
+        """Test that analytics are served by the API and the command"""
+        self.add_submission([True, False, True])
+        staff = User.objects.create_user(username='staff', password='pass123', is_staff=True)
+        self.client.force_authenticate(user=staff)
+        response = self.client.get(f'/api/tests/{self.test.id}/analytics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['submissions'], 1)
+        self.assertEqual(len(response.data['cases']), 3)
+        
+        out = StringIO()
+        call_command('case_analytics', str(self.test.id), stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn('1 graded submissions', lines[0])
+        self.assertTrue(lines[2].strip().startswith(str(self.cases[1].id)))
+    
+    def test_analytics_are_staff_only(self):
+        """Test that candidates cannot read the analytics of a test"""
+        self.add_submission([True, False, True])
+        response = self.client.get(f'/api/tests/{self.test.id}/analytics/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestSearchTestCase(TestCase):
+    """Test full-text search over the catalogue"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='pass123')
+        self.two_sum = Test.objects.create(
+            name='Two Sum', description='Find two numbers adding up to a target.', time_limit=30, difficulty='Easy'
+        )
+        self.graphs = Test.objects.create(
+            name='Shortest paths', description='Sum the weights of the shortest path in a graph.', time_limit=90,
+            difficulty='Hard'
+        )
+        self.strings = Test.objects.create(
+            name='Palindromes', description='Check whether strings read the same backwards.', time_limit=20,
+            difficulty='Easy'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+    
+    def test_ranks_name_matches_first(self):
+        """Test that every word must match and name matches rank higher"""
+        results = search_tests('sum')
+        self.assertEqual([test.id for test in results.tests], [self.two_sum.id, self.graphs.id])
+        self.assertEqual(search_tests('sum graph').tests, [self.graphs])
+        # Prefixes and stemmed forms match
+        self.assertEqual(search_tests('palin').tests, [self.strings])
+        self.assertEqual(search_tests('string').tests, [self.strings])
+        self.assertEqual(search_tests('( * )').count, 3)  # Operators are ignored
+    
+    @override_settings(TEST_SEARCH={'MAX_RANKED': 1})
+    def test_broad_queries_rank_newest_matches(self):
+        """Test that only the newest MAX_RANKED matches are ranked but all are counted"""
+        results = search_tests('sum')
+        self.assertEqual(results.count, 2)
+        self.assertEqual(results.tests, [self.graphs])
+    
+    def test_index_follows_changes(self):
+        """Test that renames, bulk updates and deletes are reflected immediately"""
+        self.strings.name = 'Reversals'
+        self.strings.save()
+        self.assertEqual(search_tests('palindromes').tests, [])
+        self.assertEqual(search_tests('reversals').tests, [self.strings])
+        Test.objects.filter(pk=self.two_sum.pk).update(description='Count inversions.')
+        self.assertEqual(search_tests('inversions').tests, [self.two_sum])
+        self.graphs.delete()
+        self.assertEqual(search_tests('graph').count, 0)
+    
+    def test_search_endpoint_filters(self):
+        """Test difficulty and time limit filters and pagination of the endpoint"""
+        response = self.client.get('/api/tests/search/', {'q': 'sum', 'difficulty': 'Hard'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['id'], self.graphs.id)
+        self.assertIsNotNone(response.data['results'][0]['rank'])
+        
+        response = self.client.get('/api/tests/search/', {'difficulty': 'Easy,Hard', 'max_time': 30, 'limit': 1})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([test['id'] for test in response.data['results']], [self.strings.id])
+        self.assertIsNone(response.data['results'][0]['rank'])
+        
+        self.assertEqual(self.client.get('/api/tests/search/', {'difficulty': 'Trivial'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/tests/search/', {'min_time': 'soon'}).status_code, 400)
+    
+    def test_admin_search_uses_index(self):
+        """Test that the test admin search goes through the full-text index"""
+        admin = User.objects.create_superuser(username='root', password='pass123', email='root@example.com')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/codetests/test/', {'q': 'shortest'})
+        self.assertContains(response, 'Shortest paths')
+        self.assertNotContains(response, 'Two Sum')
+
+
+class ScaledAdminTestCase(TestCase):
+    """Test the submission and progress changelists for large tables"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='root', password='pass123', email='root@example.com')
+        self.users = [User.objects.create_user(username=f'cand{i}', password='pass123') for i in range(3)]
+        self.tests = [Test.objects.create(name=f'Problem {i}', description='Graph search', time_limit=30) for i in range(3)]
+        self.submissions = [
+            Submission.objects.create(user=self.users[i % 3], test=self.tests[i % 3], code=f'print({i})', language='python')
+            for i in range(12)
+        ]
+        self.client = APIClient()
+        self.client.force_login(self.admin)
+    
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Test that users and tests are joined instead of fetched per row"""
+        with CaptureQueriesContext(connections['default']) as few:
+            self.client.get('/admin/codetests/submission/')
+        for i in range(12, 40):
+            Submission.objects.create(user=self.users[i % 3], test=self.tests[i % 3], code='pass', language='python')
+        with CaptureQueriesContext(connections['default']) as many:
+            response = self.client.get('/admin/codetests/submission/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(many), len(few))
+        self.assertFalse(any('case_runtimes' in query['sql'] for query in many))
+    
+    def test_keyset_pages(self):
+        """Test that newest-first pages continue from the last key shown"""
+        model_admin = admin_site._registry[Submission]
+        model_admin.list_per_page = 5
+        self.addCleanup(delattr, model_admin, 'list_per_page')
+        first = self.client.get('/admin/codetests/submission/')
+        self.assertEqual([row.pk for row in first.context['cl'].result_list],
+                         [submission.pk for submission in self.submissions[:6:-1]])
+        older = first.context['cl'].older_url
+        self.assertIn(f'before={self.submissions[7].pk}', older)
+        
+        second = self.client.get(f'/admin/codetests/submission/{older}')
+        self.assertEqual([row.pk for row in second.context['cl'].result_list],
+                         [submission.pk for submission in self.submissions[6:1:-1]])
+        self.assertEqual(second.context['cl'].result_count, 12)
+        self.assertContains(second, 'Newest')
+        
+        # Filters and sorting still work; sorted lists use numbered pages
+        Submission.objects.filter(pk__in=[self.submissions[0].pk, self.submissions[3].pk]).update(status='passed')
+        filtered = self.client.get(
+            '/admin/codetests/submission/', {'before': self.submissions[5].pk, 'status__exact': 'passed'}
+        )
+        self.assertEqual([row.pk for row in filtered.context['cl'].result_list],
+                         [self.submissions[3].pk, self.submissions[0].pk])
+        self.assertFalse(self.client.get('/admin/codetests/submission/', {'o': '5'}).context['cl'].keyset)
+    
+    @override_settings(SCALED_ADMIN={'ENABLED': True, 'EXACT_COUNT_LIMIT': 5})
+    def test_estimated_count(self):
+        """Test that the planner estimate replaces COUNT(*) above the limit"""
+        paginator = EstimatedCountPaginator(Submission.objects.order_by('pk'), 10)
+        self.assertEqual(paginator.count, 12)  # No statistics yet: exact
+        with connections['default'].cursor() as cursor:
+            cursor.execute('ANALYZE')
+        Submission.objects.filter(pk=self.submissions[0].pk).delete()
+        paginator = EstimatedCountPaginator(Submission.objects.order_by('pk'), 10)
+        self.assertEqual(paginator.count, 12)
+        self.assertTrue(paginator.estimated)
+    
+    def test_search_by_username_test_words_and_id(self):
+        """Test the indexed changelist search"""
+        def found(term):
+            response = self.client.get('/admin/codetests/submission/', {'q': term})
+            return {row.pk for row in response.context['cl'].result_list}
+        
+        self.assertEqual(found('cand1'), {submission.pk for submission in self.submissions[1::3]})
+        self.assertEqual(found('problem'), {submission.pk for submission in self.submissions})
+        self.assertEqual(found(f'#{self.submissions[4].pk}'), {self.submissions[4].pk})
+        self.assertEqual(found('cand'), set())  # Usernames match exactly
+        response = self.client.get('/admin/codetests/codeprogress/', {'q': 'cand1'})
+        self.assertEqual(response.status_code, 200)
+    
+    def test_change_form_uses_raw_id_widgets(self):
+        """Test that the change form does not list every user and test"""
+        response = self.client.get(f'/admin/codetests/submission/{self.submissions[0].pk}/change/')
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+        self.assertContains(response, 'print(0)')
+
+
+class SimilarityTestCase(TestCase):
+    """Test near-duplicate detection with the MinHash/LSH index"""
+    
+    ORIGINAL = (
+        'def solve(numbers):\n'
+        '    total = 0\n'
+        '    for value in numbers:\n'
+        '        if value % 2 == 0:\n'
+        '            total += value * value\n'
+        '    return total\n'
+        '\n'
+        'items = [int(x) for x in input().split()]\n'
+        'print(solve(items))\n'
+    )
+    # Same program with other names, spacing and a comment
+    RENAMED = (
+        'def f(xs):  # sum of even squares\n'
+        '    acc=0\n'
+        '    for v in xs:\n'
+        '        if v%2==0:\n'
+        '            acc+=v*v\n'
+        '    return acc\n'
+        'data=[int(t) for t in input().split()]\n'
+        'print(f(data))\n'
+    )
+    DIFFERENT = (
+        'import sys\n'
+        'lines = sys.stdin.read().splitlines()\n'
+        'counts = {}\n'
+        'while lines:\n'
+        '    word = lines.pop()\n'
+        '    counts[word] = counts.get(word, 0) + 1\n'
+        'best = sorted(counts.items(), key=lambda kv: -kv[1])\n'
+        'print(best[0][0] if best else "")\n'
+    )
+    
+    def setUp(self):
+        self.test = Test.objects.create(name='Even squares', description='Test', time_limit=30)
+        CodeTestCase.objects.create(test=self.test, input_data='1 2 3 4', expected_output='20')
+        self.users = [User.objects.create_user(username=f'candidate{i}', password='pass123') for i in range(3)]
+        self.admin = User.objects.create_user(username='proctor', password='pass123', is_staff=True)
+        self.client = APIClient()
+    
+    def submit(self, user, code):
+        self.client.force_authenticate(user=user)
+        response = self.client.post(f'/api/tests/{self.test.id}/submit/', {'code': code}, format='json')
+        return response.data['submission_id']
+    
+    def test_tokens_ignore_names_whitespace_and_comments(self):
+        """Test that renaming and reformatting leave the token stream unchanged"""
+        self.assertEqual(normalized_tokens('a = b + 1  # note'), ['ID', '=', 'ID', '+', 'NUM'])
+        self.assertEqual(normalized_tokens('x=y+22'), normalized_tokens('a = b + 1'))
+        self.assertEqual(normalized_tokens('print("hi")'), ['print', '(', 'STR', ')'])
+    
+    def test_comment_syntax_follows_language(self):
+        """Test that // is floor division in Python and a comment in C-like languages"""
+        self.assertEqual(
+            normalized_tokens('half = total // 2  # rounded down'), ['ID', '=', 'ID', '//', 'NUM']
+        )
+        self.assertEqual(
+            normalized_tokens('let half = total / 2; // note /* x */', 'javascript'),
+            ['ID', 'ID', '=', 'ID', '/', 'NUM', ';'],
+        )
+        self.assertEqual(normalized_tokens('a /* skipped */ + b', 'java'), ['ID', '+', 'ID'])
+    
+    def test_graded_submissions_are_indexed(self):
+        """Test that submit stores a signature and one bucket per band"""
+        submission_id = self.submit(self.users[0], self.ORIGINAL)
+        self.assertTrue(CodeSignature.objects.filter(submission_id=submission_id, test=self.test).exists())
+        self.assertEqual(LSHBucket.objects.filter(submission_id=submission_id).count(), BANDS)
+    
+    def test_report_flags_renamed_copy_only(self):
+        """Test that a renamed copy by another user is reported and unrelated code is not"""
+        original = self.submit(self.users[0], self.ORIGINAL)
+        copy = self.submit(self.users[1], self.RENAMED)
+        self.submit(self.users[2], self.DIFFERENT)
+        # A resubmission matches the copy, but not its own author's first attempt
+        resubmission = self.submit(self.users[0], self.ORIGINAL)
+        
+        matches = find_matches(self.test.id)
+        self.assertEqual({(match.first, match.second) for match in matches}, {(original, copy), (copy, resubmission)})
+        self.assertGreaterEqual(matches[0].similarity, 0.8)
+        
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(f'/api/tests/{self.test.id}/similarity/?threshold=0.5')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pair = response.data['pairs'][0]
+        self.assertEqual((pair['first']['username'], pair['second']['username']), ('candidate0', 'candidate1'))
+        self.assertEqual(self.client.get(f'/api/tests/{self.test.id}/similarity/?threshold=2').status_code, 400)
+    
+    def test_report_requires_staff(self):
+        """Test that candidates cannot see the similarity report"""
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.get(f'/api/tests/{self.test.id}/similarity/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_admin_report(self):
+        """Test the similarity page of the test admin"""
+        self.submit(self.users[0], self.ORIGINAL)
+        self.submit(self.users[1], self.RENAMED)
+        self.admin.is_superuser = True
+        self.admin.save()
+        self.client.force_login(self.admin)
+        response = self.client.get(f'/admin/codetests/test/{self.test.id}/similarity/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'candidate1')
+    
+    def test_backfill_command(self):
+        """Test that index_similarity indexes submissions graded before indexing"""
+        with override_settings(SIMILARITY=dict(settings.SIMILARITY, ENABLED=False)):
+            self.submit(self.users[0], self.ORIGINAL)
+            self.submit(self.users[1], self.RENAMED)
+        self.assertFalse(CodeSignature.objects.exists())
+        
+        call_command('index_similarity', stdout=StringIO())
+        self.assertEqual(CodeSignature.objects.count(), 2)
+        self.assertEqual(len(find_matches(self.test.id)), 1)
+        
+        call_command('index_similarity', '--rebuild', f'--test={self.test.id}', stdout=StringIO())
+        self.assertEqual(LSHBucket.objects.count(), 2 * BANDS)
+
+
+class ReplicaRoutingTestCase(TransactionTestCase):
+    """Test read replica routing with a second alias on the test database"""
+    
+    def setUp(self):
+        caches['shared'].clear()
+        db_routing._down.clear()
+        self.user = User.objects.create_user(username='reader', password='pass123')
+        self.test = Test.objects.create(name='Replicated', description='Test', time_limit=30)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.use_replica(connections['default'].settings_dict['NAME'])
+    
+    def use_replica(self, name):
+        # A connection object outside settings.DATABASES, as test databases are set up from those
+        default = connections['default']
+        connections['replica'] = type(default)(dict(default.settings_dict, NAME=name), alias='replica')
+        self.addCleanup(self.drop_replica)
+        override = override_settings(DATABASE_REPLICAS=['replica'])
+        override.enable()
+        self.addCleanup(override.disable)
+    
+    def drop_replica(self):
+        if hasattr(connections._connections, 'replica'):
+            connections['replica'].close()
+            del connections['replica']
+    
+    def get_counting(self, url):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                response = self.client.get(url)
+        # Without Redis the pin is looked up in the shared_cache table on the primary
+        data_queries = [query for query in primary.captured_queries if 'shared_cache' not in query['sql']]
+        return response, len(data_queries), len(replica)
+    
+    def test_list_and_detail_read_from_replica(self):
+        """Test that safe reads of tests are served by the replica"""
+        for url in ['/api/tests/', f'/api/tests/{self.test.id}/', f'/api/tests/{self.test.id}/testcases/']:
+            response, primary, replica = self.get_counting(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(primary, 0, url)
+            self.assertGreater(replica, 0, url)
+        self.assertEqual(self.client.get('/api/tests/').data[0]['name'], 'Replicated')
+    
+    def test_writes_pin_user_to_primary(self):
+        """Test that a user's reads go to the primary right after they write"""
+        response = self.client.post(f'/api/tests/{self.test.id}/save/', {'code': 'print(1)'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response, primary, replica = self.get_counting(f'/api/tests/{self.test.id}/history/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        # Seen by every worker, not only the one that served the write
+        self.assertTrue(caches.create_connection('shared').get(db_routing.pin_key(self.user.id)))
+        
+        caches['shared'].delete(db_routing.pin_key(self.user.id))
+        response, primary, replica = self.get_counting(f'/api/tests/{self.test.id}/history/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+    
+    def test_unlisted_actions_use_primary(self):
+        """Test that actions outside replica_actions never read from the replica"""
+        CodeProgress.objects.create(user=self.user, test=self.test, code='print(1)', language='python')
+        response, primary, replica = self.get_counting(f'/api/tests/{self.test.id}/saved/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+    
+    def test_unavailable_replica_fails_over(self):
+        """Test that reads fall back to the primary when the replica is down"""
+        self.drop_replica()
+        self.use_replica('/nonexistent/replica/db.sqlite3')
+        response = self.client.get('/api/tests/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['name'], 'Replicated')
+        self.assertIn('replica', db_routing._down)
+        self.assertIsNone(db_routing.choose_replica())
+    
+    def test_replica_failing_mid_request_retries_on_primary(self):
+        """Test that a safe request whose replica query fails is run again on the primary"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # Connects, but has none of the tables
+        self.drop_replica()
+        self.use_replica(os.path.join(directory, 'empty.sqlite3'))
+        response, primary, replica = self.get_counting(f'/api/tests/{self.test.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Replicated')
+        self.assertGreater(replica, 0)
+        self.assertGreater(primary, 0)
+        self.assertIn('replica', db_routing._down)
@@ -1,12 +1,27 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TestViewSet, ExecuteCodeView
+from . import async_views
+from .views import SubmissionViewSet, TestViewSet, ExecuteCodeView
 
 router = DefaultRouter()
 router.register(r'tests', TestViewSet, basename='test')
+router.register(r'submissions', SubmissionViewSet, basename='submission')
 
-urlpatterns = [
-    path('tests/execute/', ExecuteCodeView.as_view(), name='execute_code'),
+if settings.ASYNC_EXECUTION:
+    # Native async execution endpoints (ASGI); they shadow the router's submit route
+    urlpatterns = [
+        path('tests/execute/', async_views.execute_code, name='execute_code'),
+        path('tests/<int:pk>/submit/', async_views.submit, name='test-submit'),
+        path('tests/execute/stream/', async_views.execute_stream, name='execute_stream'),
+        path('tests/execute/stream/<str:run_id>/cancel/', async_views.cancel_stream, name='cancel_stream'),
+    ]
+else:
+    urlpatterns = [
+        path('tests/execute/', ExecuteCodeView.as_view(), name='execute_code'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
 ]
 
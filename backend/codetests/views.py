@@ -1,128 +1,379 @@
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.decorators import action
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from .models import Test, TestCase, Submission, CodeProgress
-from .serializers import TestSerializer, TestCaseSerializer, SubmissionSerializer, CodeProgressSerializer
-import subprocess
-import json
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from coding_platform.db_routing import ReplicaReadMixin
+from coding_platform.fieldsets import sparse
+from coding_platform.idempotency import idempotent
+from coding_platform.tracing import span
+from .models import Test, Submission, CodeProgress, CodeProgressRevision
+from .serializers import (
+    TestSerializer, TestCaseSerializer, TestSearchResultSerializer, SubmissionSerializer, CodeProgressSerializer
+)
+from . import writebehind
+from .analytics import case_statistics
+from .bundles import get_test_bundle, normalize_output
+from .deltas import InvalidDelta
+from .progress import ProgressConflict, remember_state, revision_code, save_progress
+from .results import store_results
+from .retention import archived_progress, archived_submission, archived_submissions
+from .search import search_tests
+from .workspace import build_workspace, workspace_etag
+from .runner import run_code
+from .similarity import index_submission, similarity_report
+
+# Helpers shared with the async views
+def execution_output(execution):
+    """The text shown as a test case's actual output"""
+    if execution.verdict == 'ok':
+        return execution.output
+    if execution.verdict == 'unsupported':
+        return execution.error
+    if execution.verdict == 'timeout':
+        return "Error: Execution timeout"
+    return f"Error: {execution.error}"
+
+
+def execution_payload(execution):
+    """Response data and status for an ad-hoc run"""
+    if execution.verdict == 'unsupported':
+        return {'error': execution.error}, status.HTTP_400_BAD_REQUEST
+    if execution.verdict == 'timeout':
+        return {'error': execution.error}, status.HTTP_408_REQUEST_TIMEOUT
+    if execution.verdict == 'failure':
+        return {'error': execution.error}, status.HTTP_500_INTERNAL_SERVER_ERROR
+    if execution.error:
+        return {'output': '', 'error': execution.error}, status.HTTP_200_OK
+    return {'output': execution.output, 'error': ''}, status.HTTP_200_OK
+
+
+def case_result(case, output):
+    """Compare the output of one test case with the expected output"""
+    with span('compare'):
+        passed = normalize_output(output) == case.expected
+    return {
+        'test_case': case.id,
+        'input': case.input_data,
+        'expected_output': case.expected_output,
+        'actual_output': output,
+        'passed': passed
+    }
+
+
+VERBOSITIES = ('full', 'summary')
+
+
+def submit_verbosity(params, data):
+    """The ``verbosity`` asked for in the query string or body, None if invalid"""
+    verbosity = params.get('verbosity') or data.get('verbosity') or 'full'
+    return verbosity if verbosity in VERBOSITIES else None
+
+
+def present_results(cases, results, verbosity):
+    """
+    Per-case results as sent to the client: ``summary`` keeps only the case
+    and its verdict, ``full`` also shows the data of sample cases. The data
+    of hidden cases is never sent.
+    """
+    if verbosity == 'summary':
+        return [{'test_case': result['test_case'], 'passed': result['passed']} for result in results]
+    return [
+        result if case.is_sample else {'test_case': result['test_case'], 'passed': result['passed'], 'hidden': True}
+        for case, result in zip(cases, results)
+    ]
+
+
+def score_results(results):
+    passed_count = sum(1 for result in results if result['passed'])
+    return int((passed_count / len(results)) * 100) if results else 0
+
 
 # Test ViewSet (CRUD for Tests)
-class TestViewSet(viewsets.ModelViewSet):
-    queryset = Test.objects.all()
+class TestViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    queryset = Test.objects.prefetch_related('test_cases')
     serializer_class = TestSerializer
     permission_classes = [IsAuthenticated]
+    # Safe actions served from a read replica when one is configured
+    replica_actions = ('list', 'retrieve', 'search', 'workspace', 'testcases', 'history', 'analytics', 'similarity')
+
+    def get_object(self):
+        with span('get_object'):
+            return super().get_object()
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text search over test names and descriptions.
+
+        ``q`` words must all match (as prefixes); filter with ``difficulty``
+        (repeat or comma-separate), ``min_time`` and ``max_time``. Paginated
+        with ``limit`` (at most 100) and ``offset``.
+        """
+        params = request.query_params
+        difficulties = [
+            value.strip() for values in params.getlist('difficulty') for value in values.split(',') if value.strip()
+        ]
+        known = {choice for choice, _ in Test.DIFFICULTY_CHOICES}
+        if not set(difficulties) <= known:
+            return Response(
+                {'error': f'difficulty must be one of {", ".join(sorted(known))}'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        numbers = {}
+        for name, default in (('min_time', None), ('max_time', None), ('limit', 20), ('offset', 0)):
+            try:
+                numbers[name] = int(params[name]) if params.get(name) else default
+            except ValueError:
+                return Response({'error': f'{name} must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(numbers['limit'], 1), 100)
+
+        with span('search'):
+            results = search_tests(
+                params.get('q', ''),
+                difficulties=difficulties,
+                min_time=numbers['min_time'],
+                max_time=numbers['max_time'],
+                limit=limit,
+                offset=max(numbers['offset'], 0),
+            )
+        serializer = TestSearchResultSerializer(
+            results.tests, many=True, context={'request': request, 'ranks': results.ranks}
+        )
+        return Response({'count': results.count, 'results': serializer.data})
 
     @action(detail=True, methods=['get'])
     def testcases(self, request, pk=None):
         """Get test cases for a specific test"""
         test = self.get_object()
-        test_cases = TestCase.objects.filter(test=test)
-        serializer = TestCaseSerializer(test_cases, many=True)
+        serializer = TestCaseSerializer(test.test_cases.all(), many=True, context={'request': request})
         return Response(serializer.data)
 
+    def get_bundle(self):
+        """Get the cached test bundle for this request (no DB reads when warm)"""
+        try:
+            with span('get_bundle'):
+                return get_test_bundle(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (Test.DoesNotExist, ValueError):
+            raise Http404
+
     @action(detail=True, methods=['post'])
+    @idempotent
     def submit(self, request, pk=None):
-        """Submit code for a test"""
-        test = self.get_object()
+        """Submit code for a test; ``verbosity=summary`` leaves out the per-case data"""
+        verbosity = submit_verbosity(request.query_params, request.data)
+        if verbosity is None:
+            return Response(
+                {'error': f'verbosity must be one of {", ".join(VERBOSITIES)}'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        bundle = self.get_bundle()
         code = request.data.get('code')
         language = request.data.get('language', 'python')
 
-        # Create submission
-        submission = Submission.objects.create(
-            user=request.user,
-            test=test,
+        # Run test cases
+        executions = [run_code(code, case.input_data, language, timeout=bundle.timeout) for case in bundle.cases]
+        results = [case_result(case, execution_output(execution)) for case, execution in zip(bundle.cases, executions)]
+
+        # Calculate score; the submission is inserted once, with its results
+        score = score_results(results)
+        submission = Submission(
+            user_id=request.user.id,
+            test_id=bundle.test_id,
             code=code,
-            language=language
+            language=language,
+            score=score,
+            status='passed' if score >= 70 else 'failed',
         )
-
-        # Run test cases
-        test_cases = TestCase.objects.filter(test=test)
-        passed_count = 0
-        results = []
-
-        for case in test_cases:
-            result = self.execute_code(code, case.input_data, language)
-            passed = result.strip() == case.expected_output.strip()
-            if passed:
-                passed_count += 1
-            
-            results.append({
-                'input': case.input_data,
-                'expected_output': case.expected_output,
-                'actual_output': result,
-                'passed': passed
-            })
-
-        # Calculate score
-        score = int((passed_count / len(test_cases)) * 100) if test_cases else 0
-        submission.score = score
-        submission.status = 'passed' if score >= 70 else 'failed'
-        submission.save()
+        store_results(submission, bundle.cases, executions, results)
+        with span('submission.save'):
+            submission.save()
+        with span('similarity.index'):
+            index_submission(submission, code or '')
 
         return Response({
             'submission_id': submission.id,
             'score': score,
             'status': submission.status,
-            'results': results
+            'results': present_results(bundle.cases, results, verbosity)
         })
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def save(self, request, pk=None):
-        """Save code progress"""
-        test = self.get_object()
+        """
+        Save code progress.
+
+        Accepts the full ``code`` or a ``delta`` (list of [start, end, text]
+        edits) against ``base_hash``. ``base_version`` enables optimistic
+        concurrency: a mismatch returns 409 with the stored version.
+        """
+        bundle = self.get_bundle()
         code = request.data.get('code')
+        delta = request.data.get('delta')
+        base_hash = request.data.get('base_hash')
+        base_version = request.data.get('base_version')
         language = request.data.get('language', 'python')
 
-        progress, created = CodeProgress.objects.update_or_create(
-            user=request.user,
-            test=test,
-            defaults={'code': code, 'language': language}
-        )
+        if delta is None and not isinstance(code, str):
+            return Response({'error': 'No code provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if delta is not None and not base_hash:
+            return Response({'error': 'base_hash is required with delta'}, status=status.HTTP_400_BAD_REQUEST)
+        if base_version is not None:
+            try:
+                base_version = int(base_version)
+            except (TypeError, ValueError):
+                return Response({'error': 'base_version must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            progress, state, changed = save_progress(
+                request.user.id,
+                bundle.test_id,
+                language,
+                code=code if delta is None else None,
+                delta=delta,
+                base_hash=base_hash,
+                base_version=base_version,
+            )
+        except InvalidDelta as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ProgressConflict as e:
+            return Response(
+                dict(e.state or {}, error='Code progress has changed, send the full code'),
+                status=status.HTTP_409_CONFLICT
+            )
+
+        if not changed:
+            return Response(dict(state, unchanged=True))
 
         serializer = CodeProgressSerializer(progress)
-        return Response(serializer.data)
+        return Response(dict(serializer.data, unchanged=False))
 
     @action(detail=True, methods=['get'])
     def saved(self, request, pk=None):
         """Get saved code progress"""
         test = self.get_object()
+        # Saves still waiting in the write-behind buffer are the latest version
+        pending = writebehind.buffer.get(request.user.id, test.id)
+        if pending is not None:
+            serializer = CodeProgressSerializer(pending.as_progress(), context={'request': request})
+            return Response(serializer.data)
         try:
-            progress = CodeProgress.objects.get(user=request.user, test=test)
-            serializer = CodeProgressSerializer(progress)
+            progress = CodeProgress.objects.select_related('code_blob').get(user_id=request.user.id, test=test)
+            remember_state(progress)
+            serializer = CodeProgressSerializer(progress, context={'request': request})
             return Response(serializer.data)
         except CodeProgress.DoesNotExist:
-            return Response({'code': '', 'language': 'python'}, status=status.HTTP_404_NOT_FOUND)
+            pass
+        # Progress of closed tests is moved to the archive
+        archived = archived_progress(request.user.id, test.id)
+        if archived is not None:
+            return Response(sparse(dict(archived, archived=True), request))
+        return Response({'code': '', 'language': 'python'}, status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=True, methods=['get'])
+    def workspace(self, request, pk=None):
+        """Test, sample cases, limits, saved code and best submission for the coding page"""
+        bundle = self.get_bundle()
+        with span('workspace.build'):
+            payload = sparse(build_workspace(bundle, request.user.id), request)
+        etag = workspace_etag(payload)
+        response = get_conditional_response(request, etag=etag) or Response(payload)
+        response['ETag'] = etag
+        # Per user, and must be revalidated: saved code changes between requests
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAdminUser])
+    def analytics(self, request, pk=None):
+        """Failure rates, runtime percentiles and discrimination of each test case"""
+        test = self.get_object()
+        return Response(case_statistics(test.id))
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAdminUser])
+    def similarity(self, request, pk=None):
+        """Pairs of near-duplicate submissions by different users, most similar first"""
+        test = self.get_object()
+        threshold = request.query_params.get('threshold')
+        if threshold is not None:
+            try:
+                threshold = float(threshold)
+            except ValueError:
+                return Response({'error': 'threshold must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+            if not 0 <= threshold <= 1:
+                return Response({'error': 'threshold must be between 0 and 1'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'test': test.id, 'pairs': similarity_report(test.id, threshold)})
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """List saved revisions, or get the code of one with ?version=N"""
+        test = self.get_object()
+        progress = get_object_or_404(CodeProgress, user_id=request.user.id, test=test)
+
+        version = request.query_params.get('version')
+        if version is not None:
+            try:
+                code = revision_code(progress, int(version))
+            except (ValueError, CodeProgressRevision.DoesNotExist):
+                return Response({'error': 'Revision not found'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({'version': int(version), 'code': code})
+
+        revisions = progress.revisions.values('version', 'language', 'content_hash', 'created_at')
+        return Response({
+            'version': progress.version,
+            'content_hash': progress.content_hash,
+            'revisions': list(revisions),
+        })
+
 
-    def execute_code(self, code, input_data, language):
-        """Execute code in a subprocess (basic implementation)"""
+# Submission history of the current user, archived submissions included
+class SubmissionViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+    replica_actions = ('list', 'retrieve')
+
+    def get_queryset(self):
+        return Submission.objects.filter(user_id=self.request.user.id).select_related('user', 'test', 'code_blob')
+
+    def list(self, request):
+        """List submissions, newest first; ?test=<id> limits them to one test"""
+        queryset = self.get_queryset().order_by('-submitted_at')
+        test_id = request.query_params.get('test')
+        if test_id is not None:
+            try:
+                test_id = int(test_id)
+            except ValueError:
+                return Response({'error': 'test must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(test_id=test_id)
+
+        # Archived submissions are all older than the ones still in the table
+        serializer = SubmissionSerializer(queryset, many=True, context={'request': request})
+        data = [sparse(dict(row, archived=False), request) for row in serializer.data]
+        data += [sparse(dict(row, archived=True), request) for row in archived_submissions(request.user.id, test_id)]
+        return Response(data)
+
+    def retrieve(self, request, pk=None):
+        """Get one submission, from the archive if it was moved there"""
         try:
-            if language == 'python':
-                process = subprocess.Popen(
-                    ['python3', '-c', code],
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
-                output, errors = process.communicate(input=input_data.encode(), timeout=5)
-                if errors:
-                    return f"Error: {errors.decode()}"
-                return output.decode()
-            else:
-                return "Language not supported yet"
-        except subprocess.TimeoutExpired:
-            process.kill()
-            return "Error: Execution timeout"
-        except Exception as e:
-            return f"Error: {str(e)}"
+            pk = int(pk)
+        except ValueError:
+            raise Http404
+        submission = self.get_queryset().filter(pk=pk).first()
+        if submission is not None:
+            serializer = SubmissionSerializer(submission, context={'request': request})
+            return Response(sparse(dict(serializer.data, archived=False), request))
+        archived = archived_submission(request.user.id, pk)
+        if archived is None:
+            raise Http404
+        return Response(sparse(dict(archived, archived=True), request))
 
 
 # Execute Code (for testing without submission)
 class ExecuteCodeView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         """Execute code and return output"""
         code = request.data.get('code')
@@ -132,24 +383,5 @@ class ExecuteCodeView(APIView):
         if not code:
             return Response({'error': 'No code provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            if language == 'python':
-                process = subprocess.Popen(
-                    ['python3', '-c', code],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
-                output, errors = process.communicate(timeout=5)
-                
-                if errors:
-                    return Response({'output': '', 'error': errors.decode()})
-                
-                return Response({'output': output.decode(), 'error': ''})
-            else:
-                return Response({'error': 'Language not supported yet'}, status=status.HTTP_400_BAD_REQUEST)
-        except subprocess.TimeoutExpired:
-            process.kill()
-            return Response({'error': 'Execution timeout (5 seconds)'}, status=status.HTTP_408_REQUEST_TIMEOUT)
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
+        data, status_code = execution_payload(run_code(code, language=language))
+        return Response(data, status=status_code)
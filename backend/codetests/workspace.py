@@ -0,0 +1,66 @@
+"""
+Everything the coding page needs to open a test, in one response.
+
+The test, its limits and its sample cases come from the cached test bundle
+(no queries when warm); the user's saved code and best submission take one
+query each. Hidden test cases are never included.
+
+``workspace_etag()`` hashes the payload, so clients revalidating with
+``If-None-Match`` get a 304 without the body when nothing changed.
+"""
+
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import writebehind
+from .models import CodeProgress, Submission
+from .progress import remember_state
+
+
+def _saved(user_id, test_id):
+    # Saves still waiting in the write-behind buffer are the latest version
+    pending = writebehind.buffer.get(user_id, test_id)
+    if pending is not None:
+        progress = pending.as_progress()
+    else:
+        progress = CodeProgress.objects.select_related('code_blob').filter(user_id=user_id, test_id=test_id).first()
+        if progress is None:
+            return None
+        remember_state(progress)
+    return {
+        'code': progress.code,
+        'language': progress.language,
+        'version': progress.version,
+        'content_hash': progress.content_hash,
+        'updated_at': progress.updated_at,
+    }
+
+
+def build_workspace(bundle, user_id):
+    best = (
+        Submission.objects.filter(user_id=user_id, test_id=bundle.test_id)
+        .order_by('-score', '-submitted_at')
+        .values('id', 'score', 'status', 'submitted_at')
+        .first()
+    )
+    return {
+        'id': bundle.test_id,
+        'name': bundle.name,
+        'description': bundle.description,
+        'time_limit': bundle.time_limit,
+        'difficulty': bundle.difficulty,
+        'test_cases': [
+            {'id': case.id, 'input_data': case.input_data, 'expected_output': case.expected_output, 'is_sample': True}
+            for case in bundle.sample_cases
+        ],
+        'limits': {'time_limit': bundle.time_limit, 'execution_timeout': bundle.timeout},
+        'saved': _saved(user_id, bundle.test_id),
+        'best_submission': best,
+    }
+
+
+def workspace_etag(payload):
+    encoded = json.dumps(payload, sort_keys=True, cls=DjangoJSONEncoder).encode()
+    return '"%s"' % hashlib.sha256(encoded).hexdigest()[:32]
@@ -0,0 +1,223 @@
+"""
+Write-behind buffer for CodeProgress autosaves.
+
+When ``CODE_PROGRESS_WRITE_BEHIND['ENABLED']`` is set, autosaves are kept in a
+bounded per-process buffer holding only the latest save per (user, test).
+A background thread flushes the buffer every ``FLUSH_INTERVAL`` seconds, and
+on interpreter exit. Each batch inserts the missing rows, then, with the rows
+locked, replaces only those holding an older version than the buffered save,
+so buffers of several workers never overwrite a newer save with an older one.
+Flushed rows keep the time of the save as ``updated_at``.
+
+Reads of saved code go through the buffer first, but each worker has its own
+buffer: another worker sees a save, and checks ``base_version`` against it,
+only once it is flushed. Serve a user from one worker (sticky sessions), or
+leave the buffer off, when that matters.
+"""
+
+import atexit
+import logging
+import threading
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import CodeBlob, CodeProgress, CodeProgressRevision
+
+logger = logging.getLogger(__name__)
+
+
+def _config(name):
+    return settings.CODE_PROGRESS_WRITE_BEHIND.get(name)
+
+
+def is_enabled():
+    return bool(_config('ENABLED'))
+
+
+@dataclass(frozen=True)
+class PendingSave:
+    user_id: int
+    test_id: int
+    code: str
+    language: str
+    content_hash: str
+    version: int
+    updated_at: object
+    # Last persisted state as (progress_id, code, language, content_hash, version)
+    persisted: Optional[tuple] = None
+
+    @property
+    def key(self):
+        return (self.user_id, self.test_id)
+
+    def as_progress(self):
+        """An unsaved CodeProgress carrying the pending values (for serializers)."""
+        return CodeProgress(
+            id=self.persisted[0] if self.persisted else None,
+            user_id=self.user_id,
+            test_id=self.test_id,
+            code=self.code,
+            language=self.language,
+            content_hash=self.content_hash,
+            version=self.version,
+            updated_at=self.updated_at,
+        )
+
+
+class WriteBehindBuffer:
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def get(self, user_id, test_id):
+        return self._pending.get((user_id, test_id))
+
+    def put(self, entry, based_on=None):
+        """
+        Buffer ``entry``, replacing any older pending save for the same key.
+
+        ``based_on`` is the pending save the entry was computed from; if it was
+        flushed in the meantime it becomes the persisted base instead.
+        """
+        with self._lock:
+            if based_on is not None and entry.key not in self._pending:
+                progress_id = based_on.persisted[0] if based_on.persisted else None
+                entry = replace(entry, persisted=progress_id and (
+                    progress_id, based_on.code, based_on.language, based_on.content_hash, based_on.version
+                ))
+            self._pending[entry.key] = entry
+            full = len(self._pending) >= _config('MAX_PENDING')
+
+        self._ensure_started()
+        if full:
+            # Bounded: when the buffer fills up the caller pays for the flush
+            self.flush()
+        return entry
+
+    def flush(self):
+        """Write all pending saves; returns the number of rows written."""
+        with self._flush_lock:
+            entries = list(self._pending.values())
+            batch_size = _config('BATCH_SIZE')
+            written = 0
+            for start in range(0, len(entries), batch_size):
+                batch = entries[start:start + batch_size]
+                self._write(batch)
+                written += len(batch)
+                with self._lock:
+                    for entry in batch:
+                        # Saves buffered during the write stay pending
+                        if self._pending.get(entry.key) is entry:
+                            del self._pending[entry.key]
+            return written
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+    def _write(self, batch):
+        from .progress import build_revision, last_snapshots, prune_revisions
+
+        rows = {
+            entry.key: CodeProgress(
+                user_id=entry.user_id,
+                test_id=entry.test_id,
+                code=entry.code,
+                language=entry.language,
+                content_hash=entry.content_hash,
+                version=entry.version,
+                updated_at=entry.updated_at,
+            )
+            for entry in batch
+        }
+        with transaction.atomic():
+            CodeBlob.store([row.code_blob for row in rows.values()])
+            # Creates the missing rows; existing ones are replaced below only by newer versions
+            CodeProgress.objects.bulk_create(rows.values(), ignore_conflicts=True)
+            stored = {
+                (user_id, test_id): (pk, version, stored_hash)
+                for user_id, test_id, pk, version, stored_hash in CodeProgress.objects.select_for_update().filter(
+                    user_id__in={entry.user_id for entry in batch},
+                    test_id__in={entry.test_id for entry in batch},
+                ).values_list('user_id', 'test_id', 'id', 'version', 'content_hash')
+            }
+            changed, replaced = [], []
+            for entry in batch:
+                pk, version, stored_hash = stored[entry.key]
+                if version < entry.version:
+                    if entry.persisted is not None:
+                        replaced.append(entry)
+                elif version > entry.version or stored_hash != entry.content_hash:
+                    # Another worker stored a newer save, or another save of this version: keep it
+                    continue
+                # Also rewrites rows inserted above, which got the flush time as updated_at
+                row = rows[entry.key]
+                row.pk = pk
+                row.updated_at = entry.updated_at
+                changed.append(row)
+            CodeProgress.objects.bulk_update(
+                changed, ['code_blob', 'language', 'content_hash', 'version', 'updated_at']
+            )
+
+            revisions = []
+            snapshots = last_snapshots([entry.persisted[0] for entry in replaced]) if replaced else {}
+            for entry in replaced:
+                progress_id, code, language, content_hash, version = entry.persisted
+                revisions.append(build_revision(
+                    progress_id, version, language, content_hash, code, entry.code,
+                    last_snapshot=snapshots.get(progress_id),
+                ))
+            # Another worker may already have recorded the same base version
+            CodeProgressRevision.objects.bulk_create(revisions, ignore_conflicts=True)
+            for revision in revisions:
+                if revision.is_snapshot:
+                    prune_revisions(revision.progress_id, revision.version)
+
+    def _ensure_started(self):
+        interval = _config('FLUSH_INTERVAL')
+        if not interval or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, args=(interval,), name='code-progress-write-behind', daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self, interval):
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered code progress; will retry')
+
+
+buffer = WriteBehindBuffer()
+
+
+def buffer_save(user_id, test_id, code, language, content_hash, version, persisted, based_on=None):
+    return buffer.put(PendingSave(
+        user_id=user_id,
+        test_id=test_id,
+        code=code,
+        language=language,
+        content_hash=content_hash,
+        version=version,
+        updated_at=timezone.now(),
+        persisted=persisted,
+    ), based_on=based_on)
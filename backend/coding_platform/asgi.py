@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "coding_platform.settings")
+# Serve the execution endpoints with the native async views (codetests/async_views.py)
+os.environ.setdefault("ASYNC_EXECUTION", "True")
 
 application = get_asgi_application()
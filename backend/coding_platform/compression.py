@@ -0,0 +1,31 @@
+"""
+Gzip compression of large responses.
+
+Django's GZipMiddleware with two changes: bodies under
+``RESPONSE_COMPRESSION['MIN_SIZE']`` are sent as is (compressing a short
+JSON object costs more CPU than the bytes it saves), and server-sent event
+streams are never compressed, since gzip would buffer events until a block
+fills. Clients not sending ``Accept-Encoding: gzip`` always get plain bodies.
+"""
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.gzip import GZipMiddleware
+
+
+def _config(name):
+    return settings.RESPONSE_COMPRESSION.get(name)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def __init__(self, get_response):
+        if not _config('ENABLED'):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        if not response.streaming and len(response.content) < _config('MIN_SIZE'):
+            return response
+        return super().process_response(request, response)
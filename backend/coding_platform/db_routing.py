@@ -0,0 +1,156 @@
+"""
+Routing of read-heavy endpoints to read replicas.
+
+Every alias in ``DATABASE_REPLICAS`` is a read-only copy of ``default``.
+``ReplicaRouter`` sends writes (and every read by default) to the primary;
+only views using ``ReplicaReadMixin`` read from a replica, and only for the
+safe actions listed in their ``replica_actions``.
+
+A user whose request wrote something is pinned to the primary for
+``DATABASE_ROUTING['PIN_SECONDS']`` (a key in the ``shared`` cache, so it
+holds across workers), which keeps replication lag from hiding their own
+writes. Without replicas nothing is pinned. A replica
+that cannot be connected to, or that fails a safe request part way, is skipped
+for ``RETRY_SECONDS`` and the request is served (or run again once) by the
+primary.
+"""
+
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+# alias -> time.monotonic() after which a failed replica is tried again
+_down = {}
+
+
+def _config(name):
+    return settings.DATABASE_ROUTING.get(name)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'django_cache':
+            # Database cache entries (the shared cache) must not lag behind writes
+            return DEFAULT_DB_ALIAS
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    if settings.DATABASE_REPLICAS:
+        caches['shared'].set(pin_key(user_id), True, timeout=_config('PIN_SECONDS'))
+
+
+async def apin_to_primary(user_id):
+    if settings.DATABASE_REPLICAS:
+        await caches['shared'].aset(pin_key(user_id), True, timeout=_config('PIN_SECONDS'))
+
+
+def mark_down(alias):
+    _down[alias] = time.monotonic() + _config('RETRY_SECONDS')
+
+
+def healthy(alias):
+    retry_at = _down.get(alias)
+    if retry_at is not None and time.monotonic() < retry_at:
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        mark_down(alias)
+        return False
+    _down.pop(alias, None)
+    return True
+
+
+def choose_replica(user_id=None):
+    """A healthy replica alias to read from, or None to use the primary."""
+    replicas = list(settings.DATABASE_REPLICAS)
+    if not replicas:
+        return None
+    if user_id is not None and caches['shared'].get(pin_key(user_id)):
+        return None
+    random.shuffle(replicas)
+    for alias in replicas:
+        if healthy(alias):
+            return alias
+    return None
+
+
+@contextmanager
+def replica_reads(user_id=None):
+    """Serve reads inside the block from a replica when one is usable; yields the alias or None."""
+    alias = choose_replica(user_id)
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaReadMixin:
+    """
+    Serve the safe requests of ``replica_actions`` from a replica, and pin a
+    user to the primary after their successful writes.
+    """
+    replica_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and self.action in self.replica_actions:
+            self._replica_reads = replica_reads(request.user.id)
+            self._replica_reads.__enter__()
+
+    def handle_exception(self, exc):
+        # A replica that failed mid-request is skipped until it is retried
+        alias = _read_alias.get()
+        if alias is not None and isinstance(exc, DatabaseError):
+            mark_down(alias)
+            if self.request.method in SAFE_METHODS:
+                return self._retry_on_primary()
+        return super().handle_exception(exc)
+
+    def _retry_on_primary(self):
+        # Safe requests have written nothing, so the handler can simply run again
+        request = self.request
+        token = _read_alias.set(None)
+        try:
+            handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            return handler(request, *self.args, **self.kwargs)
+        except Exception as exc:
+            return super().handle_exception(exc)
+        finally:
+            _read_alias.reset(token)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        reads = getattr(self, '_replica_reads', None)
+        if reads is not None:
+            self._replica_reads = None
+            reads.__exit__(None, None, None)
+        # Only the user already authenticated by this request; never re-run authentication here
+        user = getattr(request, '_user', None)
+        if (request.method not in SAFE_METHODS and response.status_code < 400
+                and user is not None and user.is_authenticated):
+            pin_to_primary(user.id)
+        return super().finalize_response(request, response, *args, **kwargs)
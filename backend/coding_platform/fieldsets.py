@@ -0,0 +1,51 @@
+"""
+Sparse fieldsets for API responses.
+
+Serializers using ``SparseFieldsetMixin`` honour ``?fields=a,b`` (only these
+fields) and ``?exclude=c,d`` (all but these) on GET requests. Only the
+top-level serializer of a response is trimmed, and omitted fields are never
+computed, so dropping an expensive field (a nested list, a method field)
+saves its work as well as its bytes. Unknown names are ignored.
+"""
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import ListSerializer
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def _names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def requested_fields(request):
+    """``(only, excluded)`` field names asked for by ``request``; ``only`` is None for all."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+    params = request.query_params if hasattr(request, 'query_params') else request.GET
+    only = _names(params[FIELDS_PARAM]) if params.get(FIELDS_PARAM) else None
+    return only, _names(params.get(EXCLUDE_PARAM, ''))
+
+
+def sparse(data, request):
+    """Apply the requested fieldset to a dict built without a serializer."""
+    only, excluded = requested_fields(request)
+    if only is None and not excluded:
+        return data
+    return {key: value for key, value in data.items() if (only is None or key in only) and key not in excluded}
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin trimming its fields to the request's fieldset."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # Nested serializers keep all their fields
+        top_level = self.parent is None or (isinstance(self.parent, ListSerializer) and self.parent.parent is None)
+        if top_level:
+            only, excluded = requested_fields(self.context.get('request'))
+            for name in list(fields):
+                if (only is not None and name not in only) or name in excluded:
+                    del fields[name]
+        return fields
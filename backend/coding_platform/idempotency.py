@@ -0,0 +1,196 @@
+"""
+Idempotency keys for endpoints that start expensive work.
+
+A client sending ``Idempotency-Key: <unique string>`` with a request gets the
+work done at most once for that key: repeating the request (a double click,
+a retry after a token refresh or a dropped connection) returns the stored
+response of the first one, marked ``Idempotent-Replayed: true``, instead of
+running it again.
+
+Keys are scoped to the user and the request path and kept in the ``shared``
+cache, Redis or the ``shared_cache`` table, where ``add()`` claims a key
+atomically for every worker:
+
+- the first request stores a pending marker for ``LOCK_TIMEOUT`` seconds,
+  runs, and replaces the marker with its response for ``TTL`` seconds
+- a duplicate arriving meanwhile waits up to ``WAIT`` seconds for that
+  response, then gives up with 409 and ``Retry-After``
+- a key reused with a different body or query string is rejected with 422
+- server errors (5xx) and exceptions are not stored, so a retry runs again
+
+Requests without the header are not affected.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def _config(name):
+    return settings.IDEMPOTENCY.get(name)
+
+
+def _cache():
+    return caches['shared']
+
+
+def _cache_key(user_id, path, key):
+    digest = hashlib.sha256(f'{user_id}\0{path}\0{key}'.encode()).hexdigest()
+    return f'idempotency:{digest}'
+
+
+def _fingerprint(request, data):
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.META.get('QUERY_STRING', '')}\0{body}".encode()).hexdigest()
+
+
+def _response_data(response):
+    if hasattr(response, 'data'):
+        return response.data
+    return json.loads(response.content or b'null')
+
+
+def _error(respond, message, status_code, **headers):
+    response = respond({'error': message}, status=status_code)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def _replay(respond, record):
+    response = respond(record['data'], status=record['status'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+class _Claim:
+    """What a request with an idempotency key has to do."""
+
+    def __init__(self, request, user_id, data, respond):
+        self.key = request.headers.get(HEADER) or None
+        self.respond = respond
+        self.applies = self.key is not None and bool(_config('ENABLED'))
+        if self.applies:
+            self.cache_key = _cache_key(user_id, request.path, self.key)
+            self.fingerprint = _fingerprint(request, data)
+            self.deadline = time.monotonic() + _config('WAIT')
+
+    @property
+    def error(self):
+        if self.applies and len(self.key) > MAX_KEY_LENGTH:
+            return _error(
+                self.respond, f'{HEADER} must be at most {MAX_KEY_LENGTH} characters', status.HTTP_400_BAD_REQUEST
+            )
+        return None
+
+    @property
+    def pending(self):
+        return {'fingerprint': self.fingerprint, 'status': None, 'data': None}
+
+    def check(self, record):
+        """A response to send for the earlier request's ``record``, or None to keep waiting."""
+        if record['fingerprint'] != self.fingerprint:
+            return _error(
+                self.respond, f'{HEADER} was already used with a different request',
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if record['status'] is not None:
+            return _replay(self.respond, record)
+        if time.monotonic() >= self.deadline:
+            return _error(
+                self.respond, f'A request with this {HEADER} is still in progress', status.HTTP_409_CONFLICT,
+                **{'Retry-After': '1'},
+            )
+        return None
+
+    def result(self, response):
+        """The record to store for ``response``, or None if it must not be replayed."""
+        if response.status_code >= 500:
+            return None
+        return {'fingerprint': self.fingerprint, 'status': response.status_code, 'data': _response_data(response)}
+
+
+def run_once(request, user_id, data, handler, respond):
+    """
+    Call ``handler()`` for the response unless this request's idempotency key
+    was seen before; ``respond(data, status=...)`` builds replayed and error
+    responses.
+    """
+    claim = _Claim(request, user_id, data, respond)
+    if not claim.applies:
+        return handler()
+    if claim.error is not None:
+        return claim.error
+
+    cache = _cache()
+    while not cache.add(claim.cache_key, claim.pending, timeout=_config('LOCK_TIMEOUT')):
+        record = cache.get(claim.cache_key)
+        if record is not None:
+            response = claim.check(record)
+            if response is not None:
+                return response
+            time.sleep(_config('POLL_INTERVAL'))
+        # A record gone meanwhile (failed or expired) can be claimed again
+
+    try:
+        response = handler()
+    except BaseException:
+        cache.delete(claim.cache_key)
+        raise
+    record = claim.result(response)
+    if record is None:
+        cache.delete(claim.cache_key)
+    else:
+        cache.set(claim.cache_key, record, timeout=_config('TTL'))
+    return response
+
+
+async def arun_once(request, user_id, data, handler, respond):
+    """``run_once()`` for async views; ``handler`` is a coroutine function."""
+    claim = _Claim(request, user_id, data, respond)
+    if not claim.applies:
+        return await handler()
+    if claim.error is not None:
+        return claim.error
+
+    cache = _cache()
+    while not await cache.aadd(claim.cache_key, claim.pending, timeout=_config('LOCK_TIMEOUT')):
+        record = await cache.aget(claim.cache_key)
+        if record is not None:
+            response = claim.check(record)
+            if response is not None:
+                return response
+            await asyncio.sleep(_config('POLL_INTERVAL'))
+
+    try:
+        response = await handler()
+    except BaseException:
+        await cache.adelete(claim.cache_key)
+        raise
+    record = claim.result(response)
+    if record is None:
+        await cache.adelete(claim.cache_key)
+    else:
+        await cache.aset(claim.cache_key, record, timeout=_config('TTL'))
+    return response
+
+
+def idempotent(method):
+    """Decorator giving a DRF view method (or action) idempotency key support."""
+    @functools.wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        return run_once(
+            request, request.user.id, request.data, lambda: method(view, request, *args, **kwargs), Response
+        )
+    return wrapper
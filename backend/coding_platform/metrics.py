@@ -0,0 +1,289 @@
+"""
+Prometheus metrics for requests, database queries and code execution.
+
+Each process records into an in-memory registry; recording is a dict update
+under a lock. When ``METRICS['DIR']`` is set, every process also writes a
+snapshot of its registry to ``<DIR>/<pid>-<token>.json`` at most once per
+``FLUSH_INTERVAL`` seconds (and on exit), and ``/api/metrics`` merges the
+snapshots of all processes, so gunicorn workers are reported as one. The
+directory should be emptied when the server starts (see docker-entrypoint.sh).
+Without a directory only the serving process is reported.
+
+``/api/metrics`` requires ``Authorization: Bearer <METRICS['TOKEN']>`` and is
+closed while no token is configured.
+"""
+
+import atexit
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EXECUTION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+# name -> (type, help)
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by route, method and status'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by route'),
+    'db_queries_total': ('counter', 'Database queries run while serving requests, by route'),
+    'db_query_duration_seconds_total': ('counter', 'Time spent in database queries, by route'),
+    'code_executions_total': ('counter', 'Code executions by language and verdict'),
+    'code_execution_duration_seconds': ('histogram', 'Code execution wall time by language'),
+    'code_execution_timeouts_total': ('counter', 'Code executions killed by the timeout, by language'),
+    'code_executions_in_progress': ('gauge', 'Code executions currently running'),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _config(name):
+    return settings.METRICS.get(name)
+
+
+def is_enabled():
+    return bool(_config('ENABLED'))
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)  # (name, labels) -> counter or gauge value
+        self._histograms = {}              # (name, labels) -> [buckets, per-bucket counts, sum]
+        self._dump_lock = threading.Lock()
+        self._last_dump = 0.0
+        self._name = None
+        self._pid = None
+        self._exit_hook = False
+
+    def inc(self, name, labels=(), value=1.0):
+        with self._lock:
+            self._values[(name, labels)] += value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = [buckets, [0] * (len(buckets) + 1), 0.0]
+            index = 0
+            while index < len(buckets) and value > buckets[index]:
+                index += 1
+            histogram[1][index] += 1
+            histogram[2] += value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'values': [[name, list(map(list, labels)), value] for (name, labels), value in self._values.items()],
+                'histograms': [
+                    [name, list(map(list, labels)), list(buckets), list(counts), total]
+                    for (name, labels), (buckets, counts, total) in self._histograms.items()
+                ],
+            }
+
+    # Sharing between processes
+
+    def path(self):
+        directory = _config('DIR')
+        if not directory:
+            return None
+        if self._pid != os.getpid():
+            # A new (forked) process must not overwrite its parent's file
+            self._pid = os.getpid()
+            self._name = f'{self._pid}-{uuid.uuid4().hex[:8]}.json'
+            if not self._exit_hook:
+                self._exit_hook = True  # Inherited by forked children
+                atexit.register(self.dump)
+        return os.path.join(directory, self._name)
+
+    def maybe_dump(self):
+        now = time.monotonic()
+        if now - self._last_dump >= _config('FLUSH_INTERVAL'):
+            self._last_dump = now
+            self.dump(wait=False)
+
+    def dump(self, wait=True):
+        path = self.path()
+        if path is None or not self._dump_lock.acquire(blocking=wait):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp = f'{path}.tmp'
+            with open(temp, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(temp, path)
+        finally:
+            self._dump_lock.release()
+
+
+registry = Registry()
+
+
+def record_execution(language, verdict, duration):
+    registry.inc('code_executions_total', (('language', language), ('verdict', verdict)))
+    registry.observe('code_execution_duration_seconds', (('language', language),), duration, EXECUTION_BUCKETS)
+    if verdict == 'timeout':
+        registry.inc('code_execution_timeouts_total', (('language', language),))
+
+
+class MetricsMiddleware:
+    """Record latency, status and database time for every request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.measure(request) as outcome:
+            outcome['response'] = self.get_response(request)
+        return outcome['response']
+
+    async def __acall__(self, request):
+        with self.measure(request) as outcome:
+            outcome['response'] = await self.get_response(request)
+        return outcome['response']
+
+    @contextmanager
+    def measure(self, request):
+        db = [0, 0.0]
+        outcome = {}
+
+        def record_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db[0] += 1
+                db[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            yield outcome
+        elapsed = time.perf_counter() - started
+        response = outcome['response']
+
+        match = request.resolver_match
+        route = (('route', match.view_name if match else 'unmatched'),)
+        registry.inc('http_requests_total', route + (('method', request.method), ('status', str(response.status_code))))
+        registry.observe('http_request_duration_seconds', route, elapsed)
+        if db[0]:
+            registry.inc('db_queries_total', route, db[0])
+            registry.inc('db_query_duration_seconds_total', route, db[1])
+        registry.maybe_dump()
+
+
+# Exposition
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def collect():
+    """Snapshots of this process and, with a shared directory, every other process."""
+    own = registry.path()
+    snapshots = [registry.snapshot()]
+    directory = _config('DIR')
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.endswith('.json') or path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Removed or being replaced
+    return snapshots
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(snapshots):
+    values = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots:
+        live = _pid_alive(snapshot['pid'])
+        for name, labels, value in snapshot['values']:
+            if METRICS[name][0] == 'gauge' and not live:
+                continue
+            values[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, buckets, counts, total in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            if key not in histograms:
+                histograms[key] = [buckets, [0] * len(counts), 0.0]
+            merged = histograms[key]
+            merged[1] = [a + b for a, b in zip(merged[1], counts)]
+            merged[2] += total
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            for (metric, labels), (buckets, counts, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], counts):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _format_value(bound)
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        else:
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the metrics of all worker processes."""
+    token = _config('TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
@@ -0,0 +1,122 @@
+"""
+On-demand profiling of single requests.
+
+With ``PROFILING['ENABLED']`` set, a request is profiled when it carries a
+valid ``X-Profile`` header (a signed token from ``manage.py profiling_token``)
+or is picked by sampling one request in ``SAMPLE_RATE``. For each profiled
+request two files are written to ``PROFILING['DIR']``:
+
+* ``<id>.prof``: cProfile data in pstats format (snakeviz, gprof2dot,
+  ``python -m pstats``)
+* ``<id>.mem.txt``: the top tracemalloc allocation sites and peak memory
+
+Only the newest ``MAX_PROFILES`` profiles are kept. The response carries the
+profile id in ``X-Profile-Id``. When disabled the middleware removes itself
+from the stack, so it costs nothing.
+"""
+
+import cProfile
+import os
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+HEADER = 'X-Profile'
+SIGNING_SALT = 'coding_platform.profiling'
+TOP_ALLOCATIONS = 25
+
+
+def _config(name):
+    return settings.PROFILING.get(name)
+
+
+def make_token():
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign('profile')
+
+
+def valid_token(value):
+    try:
+        signing.TimestampSigner(salt=SIGNING_SALT).unsign(value, max_age=_config('TOKEN_MAX_AGE'))
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def prune(directory, keep):
+    """Delete all but the newest ``keep`` profiles in ``directory``."""
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith('.prof')),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in profiles[keep:]:
+        for path in (entry.path, entry.path[:-len('.prof')] + '.mem.txt'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not _config('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # tracemalloc is process-wide, so profile one request at a time
+        self.lock = threading.Lock()
+
+    def should_profile(self, request):
+        token = request.headers.get(HEADER)
+        if token:
+            return valid_token(token)
+        rate = _config('SAMPLE_RATE')
+        return bool(rate) and random.random() * rate < 1
+
+    def __call__(self, request):
+        if not self.should_profile(request) or not self.lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.profile(request)
+        finally:
+            self.lock.release()
+
+    def profile(self, request):
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            response = profiler.runcall(self.get_response, request)
+        finally:
+            elapsed = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        profile_id = (
+            f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-{route}-{elapsed * 1000:.0f}ms-{uuid.uuid4().hex[:6]}'
+        )
+        directory = _config('DIR')
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+        with open(os.path.join(directory, f'{profile_id}.mem.txt'), 'w') as f:
+            f.write(f'{request.method} {request.get_full_path()} ({route}) {elapsed * 1000:.1f}ms\n')
+            f.write(f'Peak traced memory: {peak / 1024:.1f} KiB, at end: {current / 1024:.1f} KiB\n\n')
+            f.write(f'Top {TOP_ALLOCATIONS} allocation sites:\n')
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                f.write(f'{stat}\n')
+        prune(directory, _config('MAX_PROFILES'))
+
+        response[f'{HEADER}-Id'] = profile_id
+        return response
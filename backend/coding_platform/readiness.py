@@ -0,0 +1,81 @@
+"""
+Readiness probe for load balancers and container orchestrators.
+
+``GET /api/ready`` answers 200 when this worker can serve traffic and 503
+otherwise, with the outcome and duration of each check:
+
+- ``database``: ``SELECT 1`` on the primary, opening the connection if needed
+- ``cache``: a write and read back through the default cache
+- ``executor``: a first run of the code interpreter in this worker; it loads
+  the interpreter into the page cache so the first candidate run is not the
+  slow one, and is remembered once it succeeds
+
+No authentication: the response carries only check states and timings.
+"""
+
+import os
+import subprocess
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+
+_executor_lock = threading.Lock()
+_executor_warm = False
+
+
+def _check_database():
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def _check_cache():
+    key = f'readiness:{os.getpid()}'
+    value = str(time.time())
+    cache.set(key, value, timeout=60)
+    if cache.get(key) != value:
+        raise RuntimeError('the cache did not return the value written')
+
+
+def _check_executor():
+    global _executor_warm
+    with _executor_lock:
+        if not _executor_warm:
+            subprocess.run(
+                ['python3', '-c', 'pass'], check=True, capture_output=True, timeout=settings.CODE_EXECUTION_TIMEOUT
+            )
+            _executor_warm = True
+
+
+CHECKS = {
+    'database': _check_database,
+    'cache': _check_cache,
+    'executor': _check_executor,
+}
+
+
+def run_checks():
+    """``{name: {'ok': bool, 'ms': float[, 'error': str]}}`` for every check."""
+    results = {}
+    for name, check in CHECKS.items():
+        started = time.perf_counter()
+        try:
+            check()
+        except Exception as e:
+            results[name] = {'ok': False, 'error': str(e) or e.__class__.__name__}
+        else:
+            results[name] = {'ok': True}
+        results[name]['ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return results
+
+
+@never_cache
+def readiness_view(request):
+    checks = run_checks()
+    ready = all(check['ok'] for check in checks.values())
+    return JsonResponse({'ready': ready, 'checks': checks}, status=200 if ready else 503)
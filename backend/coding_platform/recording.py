@@ -0,0 +1,123 @@
+"""
+Sampling recorder of API traffic for replay (``manage.py replay_traffic``).
+
+With ``TRAFFIC_RECORDING['ENABLED']`` set, a ``SAMPLE_RATE`` fraction of
+requests under ``PATH_PREFIX`` is appended to ``TRAFFIC_RECORDING['FILE']``
+as JSON lines::
+
+    {"ts": 1767225600.123, "method": "POST", "path": "/api/tests/3/save/",
+     "body": {"code": "...", "language": "python"}, "status": 200,
+     "duration_ms": 12.5, "user": "u-5f1c0e9a2b7d"}
+
+Bodies are kept only for JSON requests up to ``MAX_BODY`` bytes. Secrets
+(passwords, tokens) are replaced by ``"<redacted>"`` and usernames and
+emails by stable pseudonyms, and ``user`` is a keyed hash of the user id, so
+a recording can be shared without credentials or personal data.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+REDACTED = '<redacted>'
+SECRET_FIELDS = {'password', 'password2', 'old_password', 'new_password', 'token', 'access', 'refresh', 'secret'}
+PSEUDONYM_FIELDS = {'username', 'email'}
+
+_write_lock = threading.Lock()
+
+
+def _config(name):
+    return settings.TRAFFIC_RECORDING.get(name)
+
+
+def pseudonym(value, prefix='u'):
+    digest = hmac.new(settings.SECRET_KEY.encode(), str(value).encode(), hashlib.sha256).hexdigest()
+    return f'{prefix}-{digest[:12]}'
+
+
+def sanitize(value):
+    """Copy of a parsed JSON body with secrets redacted and identities pseudonymised."""
+    if isinstance(value, dict):
+        clean = {}
+        for key, item in value.items():
+            if key.lower() in SECRET_FIELDS:
+                clean[key] = REDACTED
+            elif key.lower() in PSEUDONYM_FIELDS and isinstance(item, str):
+                clean[key] = pseudonym(item, prefix=key.lower()[0])
+            else:
+                clean[key] = sanitize(item)
+        return clean
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return value
+
+
+class TrafficRecorderMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not _config('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self, request):
+        return request.path.startswith(_config('PATH_PREFIX')) and random.random() < _config('SAMPLE_RATE')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled(request):
+            return self.get_response(request)
+        record = self.start(request)
+        response = self.get_response(request)
+        self.finish(request, response, record)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled(request):
+            return await self.get_response(request)
+        record = self.start(request)
+        response = await self.get_response(request)
+        self.finish(request, response, record)
+        return response
+
+    def start(self, request):
+        body = None
+        if request.content_type == 'application/json' and int(request.META.get('CONTENT_LENGTH') or 0) <= _config('MAX_BODY'):
+            try:
+                # Reading the body here caches it for the view
+                body = sanitize(json.loads(request.body or b'null'))
+            except ValueError:
+                body = None
+
+        return {
+            'ts': round(time.time(), 3),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'body': body,
+            'started': time.perf_counter(),
+        }
+
+    def finish(self, request, response, record):
+        started = record.pop('started')
+        user = getattr(request, 'user', None)
+        record.update({
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'user': pseudonym(user.id) if user is not None and user.is_authenticated else None,
+        })
+        path = _config('FILE')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with _write_lock, open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
@@ -0,0 +1,208 @@
+"""
+Replay of recorded API traffic (see coding_platform/recording.py).
+
+Recorded users are mapped to local ``replay_<pseudonym>`` accounts sharing
+one password, and their requests are sent with access tokens minted for
+those accounts, so the replay needs the server's database but no real
+credentials. Redacted passwords in login and register bodies are replaced by
+the replay password, and test ids in paths can be remapped onto the tests
+that exist locally. Requests are sent on their recorded schedule divided by
+``speed`` (``0`` sends them as fast as ``concurrency`` allows).
+"""
+
+import json
+import re
+import statistics
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from users.tokens import ClaimsRefreshToken
+from .recording import REDACTED
+
+User = get_user_model()
+
+DEFAULT_PASSWORD = 'replay-Pass-2026!'
+TEST_PATH = re.compile(r'^/api/tests/(\d+)/')
+
+
+@dataclass(frozen=True)
+class Outcome:
+    method: str
+    route: str
+    status: int  # 0 when no response was received
+    recorded_status: int
+    latency_ms: float
+    lag_ms: float  # How late the request was sent compared to its schedule
+
+
+def route_of(path):
+    return re.sub(r'/\d+(?=/|$)', '/{id}', path.split('?', 1)[0])
+
+
+def load_recording(path, limit=None):
+    records = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    records.sort(key=lambda record: record['ts'])
+    return records[:limit] if limit else records
+
+
+def _username(pseudonym):
+    return f'replay_{pseudonym}'
+
+
+def prepare_users(records, password=DEFAULT_PASSWORD):
+    """Create a local account per recorded user; returns {pseudonym: access token}."""
+    pseudonyms = {record['user'] for record in records if record.get('user')}
+    for record in records:
+        body = record.get('body')
+        if isinstance(body, dict) and isinstance(body.get('username'), str) and not record['path'].endswith('/register/'):
+            pseudonyms.add(body['username'])
+    password_hash = make_password(password)
+    User.objects.bulk_create(
+        [User(username=_username(pseudonym), password=password_hash) for pseudonym in sorted(pseudonyms)],
+        ignore_conflicts=True,
+    )
+    users = User.objects.filter(username__in=[_username(pseudonym) for pseudonym in pseudonyms])
+    return {
+        user.username[len('replay_'):]: str(ClaimsRefreshToken.for_user(user).access_token)
+        for user in users
+    }
+
+
+def test_id_map(records, local_ids):
+    """Map recorded test ids onto ``local_ids`` in order, wrapping around."""
+    recorded = sorted({int(match.group(1)) for record in records if (match := TEST_PATH.match(record['path']))})
+    if not local_ids:
+        return {}
+    return {test_id: local_ids[index % len(local_ids)] for index, test_id in enumerate(recorded)}
+
+
+class Replayer:
+    def __init__(self, base_url, tokens, password=DEFAULT_PASSWORD, test_ids=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.tokens = tokens
+        self.password = password
+        self.test_ids = test_ids or {}
+        self.timeout = timeout
+        self.run = uuid.uuid4().hex[:6]
+
+    def rewrite_body(self, record):
+        body = record.get('body')
+        if not isinstance(body, dict):
+            return body
+        body = dict(body)
+        for key, value in body.items():
+            if value == REDACTED:
+                body[key] = self.password
+        if isinstance(body.get('username'), str):
+            if record['path'].endswith('/register/'):
+                body['username'] = f'{_username(body["username"])}_{self.run}_{uuid.uuid4().hex[:6]}'
+            else:
+                body['username'] = _username(body['username'])
+        if isinstance(body.get('email'), str):
+            body['email'] = f'{body["email"]}@example.com'
+        return body
+
+    def rewrite_path(self, path):
+        match = TEST_PATH.match(path)
+        if match and int(match.group(1)) in self.test_ids:
+            return f'/api/tests/{self.test_ids[int(match.group(1))]}/' + path[match.end():]
+        return path
+
+    def send(self, record, due, started):
+        body = self.rewrite_body(record)
+        headers = {'Accept': 'application/json'}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        token = self.tokens.get(record.get('user'))
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        request = urllib.request.Request(
+            self.base_url + self.rewrite_path(record['path']), data=data, headers=headers, method=record['method']
+        )
+
+        sent = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            status = 0
+        return Outcome(
+            method=record['method'],
+            route=route_of(record['path']),
+            status=status,
+            recorded_status=record.get('status'),
+            latency_ms=(time.perf_counter() - sent) * 1000,
+            lag_ms=max(0.0, (sent - started - due) * 1000),
+        )
+
+    def replay(self, records, speed=1.0, concurrency=16):
+        """Send ``records`` on schedule; returns (outcomes, elapsed seconds)."""
+        if not records:
+            return [], 0.0
+        first = records[0]['ts']
+        started = time.perf_counter()
+        futures = []
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for record in records:
+                due = (record['ts'] - first) / speed if speed else 0.0
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self.send, record, due, started))
+            outcomes = [future.result() for future in futures]
+        return outcomes, time.perf_counter() - started
+
+
+def _percentiles(values):
+    ordered = sorted(values)
+
+    def at(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 2)
+
+    return {'p50_ms': at(50), 'p95_ms': at(95), 'p99_ms': at(99), 'mean_ms': round(statistics.fmean(ordered), 2)}
+
+
+def summarize(outcomes, elapsed):
+    """Throughput, error rate and latency percentiles, overall and per route."""
+    if not outcomes:
+        return {'requests': 0}
+    errors = [outcome for outcome in outcomes if outcome.status == 0 or outcome.status >= 500]
+    summary = {
+        'requests': len(outcomes),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(outcomes) / elapsed, 1) if elapsed else None,
+        'error_rate': round(len(errors) / len(outcomes), 4),
+        'status_mismatches': sum(
+            1 for outcome in outcomes
+            if outcome.recorded_status and outcome.status // 100 != outcome.recorded_status // 100
+        ),
+        'max_lag_ms': round(max(outcome.lag_ms for outcome in outcomes), 2),
+        **_percentiles([outcome.latency_ms for outcome in outcomes]),
+        'routes': {},
+    }
+    by_route = {}
+    for outcome in outcomes:
+        by_route.setdefault(f'{outcome.method} {outcome.route}', []).append(outcome)
+    for route, items in sorted(by_route.items()):
+        summary['routes'][route] = {
+            'requests': len(items),
+            'errors': sum(1 for item in items if item.status == 0 or item.status >= 500),
+            **_percentiles([item.latency_ms for item in items]),
+        }
+    return summary
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -60,6 +62,11 @@ MIDDLEWARE = [
 ]"""
 
 MIDDLEWARE = [
+    'coding_platform.metrics.MetricsMiddleware',  # First, so it times the whole stack
+    'coding_platform.compression.CompressionMiddleware',  # Removed from the stack unless enabled
+    'coding_platform.profiling.ProfilingMiddleware',  # Removed from the stack unless enabled
+    'coding_platform.tracing.TracingMiddleware',  # Removed from the stack unless enabled
+    'coding_platform.recording.TrafficRecorderMiddleware',  # Removed from the stack unless enabled
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware must be at the top
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -112,6 +119,150 @@ else:
         }
     }
 
+# Read replicas (see coding_platform/db_routing.py): Postgres hosts sharing the
+# primary's credentials, or a SQLite copy of the database for local testing
+for index, host in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = dict(DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+if os.environ.get('SQLITE_REPLICA_PATH'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['SQLITE_REPLICA_PATH'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['coding_platform.db_routing.ReplicaRouter']
+DATABASE_ROUTING = {
+    'PIN_SECONDS': float(os.environ.get('REPLICA_PIN_SECONDS', '5')),  # Primary-only reads after a user's write
+    'RETRY_SECONDS': float(os.environ.get('REPLICA_RETRY_SECONDS', '30')),  # Skip a failed replica this long
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+# Use Redis when REDIS_URL is set, a per-process memory cache otherwise
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# State every worker must see (cancel flags, idempotency keys, replica pins):
+# Redis when configured, else the shared_cache table (codetests.SharedCacheEntry)
+CACHES['shared'] = dict(CACHES['default']) if os.environ.get('REDIS_URL') else {
+    'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+    'LOCATION': 'shared_cache',
+    'OPTIONS': {'MAX_ENTRIES': 100000},
+}
+
+# Compiled test bundles used for grading (see codetests/bundles.py)
+TEST_BUNDLE_CACHE = {
+    'MAX_ENTRIES': int(os.environ.get('TEST_BUNDLE_CACHE_SIZE', '256')),
+    # Alias from CACHES shared between workers; empty means per-worker only
+    'SHARED_ALIAS': os.environ.get('TEST_BUNDLE_CACHE_ALIAS', 'default' if os.environ.get('REDIS_URL') else ''),
+    'TIMEOUT': 24 * 60 * 60,  # Shared tier lifetime in seconds
+    'LOCAL_TIMEOUT': 5,       # Revalidation interval against the shared tier
+}
+
+# Archival of old submissions (manage.py archive_submissions, see codetests/retention.py)
+SUBMISSION_RETENTION = {
+    'DAYS': int(os.environ.get('SUBMISSION_RETENTION_DAYS', '365')),
+    'BATCH_SIZE': 1000,
+}
+
+# Admin changelists over large tables (see codetests/admin_scaling.py)
+SCALED_ADMIN = {
+    'ENABLED': os.environ.get('SCALED_ADMIN', 'True') == 'True',
+    'EXACT_COUNT_LIMIT': 10000,  # Planner estimates above this are shown instead of COUNT(*)
+}
+
+# Full-text search over the catalogue (see codetests/search.py)
+TEST_SEARCH = {
+    'MAX_RANKED': int(os.environ.get('TEST_SEARCH_MAX_RANKED', '5000')),  # Broader queries rank the newest matches
+}
+
+# Near-duplicate detection among submissions (see codetests/similarity.py)
+SIMILARITY = {
+    'ENABLED': os.environ.get('SIMILARITY_ENABLED', 'True') == 'True',  # Index submissions when graded
+    'THRESHOLD': float(os.environ.get('SIMILARITY_THRESHOLD', '0.8')),  # Default report threshold
+    'MIN_TOKENS': 20,   # Shorter submissions are too generic to compare
+    'MAX_BUCKET': 200,  # Buckets shared by more submissions are skipped
+}
+
+# Write-behind buffering of autosaves (see codetests/writebehind.py)
+CODE_PROGRESS_WRITE_BEHIND = {
+    'ENABLED': os.environ.get('CODE_PROGRESS_WRITE_BEHIND', 'False') == 'True',
+    'FLUSH_INTERVAL': float(os.environ.get('CODE_PROGRESS_FLUSH_INTERVAL', '5')),  # Seconds
+    'MAX_PENDING': int(os.environ.get('CODE_PROGRESS_MAX_PENDING', '10000')),
+    'BATCH_SIZE': 500,
+}
+
+# Code execution limits
+CODE_EXECUTION_TIMEOUT = int(os.environ.get('CODE_EXECUTION_TIMEOUT', '5'))  # Seconds per run
+# Async execution views (ASGI only, see codetests/async_views.py); asgi.py turns this on
+ASYNC_EXECUTION = os.environ.get('ASYNC_EXECUTION', 'False') == 'True'
+CODE_EXECUTION_CONCURRENCY = int(os.environ.get('CODE_EXECUTION_CONCURRENCY', '64'))  # Async runs per worker
+STREAM_MAX_BYTES = int(os.environ.get('STREAM_MAX_BYTES', str(1024 * 1024)))  # Output cap per streamed run
+
+# Idempotency-Key support on submit, execute and save (see coding_platform/idempotency.py)
+IDEMPOTENCY = {
+    'ENABLED': os.environ.get('IDEMPOTENCY_ENABLED', 'True') == 'True',
+    'TTL': int(os.environ.get('IDEMPOTENCY_TTL', '3600')),  # Seconds a response is replayed for its key
+    'LOCK_TIMEOUT': 300,   # Seconds before a run that never finished frees its key
+    'WAIT': 60,            # Seconds a duplicate waits for the first request before answering 409
+    'POLL_INTERVAL': 0.05,
+}
+
+# API response encoding
+FAST_JSON = os.environ.get('FAST_JSON', 'True') == 'True'  # orjson renderer/parser when installed
+# Compression of large responses for clients accepting gzip (see coding_platform/compression.py)
+RESPONSE_COMPRESSION = {
+    'ENABLED': os.environ.get('RESPONSE_COMPRESSION', 'True') == 'True',
+    'MIN_SIZE': int(os.environ.get('RESPONSE_COMPRESSION_MIN_SIZE', '1024')),  # Bytes; smaller bodies are sent as is
+}
+
+# Prometheus metrics served at /api/metrics (see coding_platform/metrics.py)
+METRICS = {
+    'ENABLED': os.environ.get('METRICS_ENABLED', 'True') == 'True',
+    # Directory shared by all worker processes; empty reports the serving process only
+    'DIR': os.environ.get('METRICS_DIR', ''),
+    'FLUSH_INTERVAL': 1.0,  # Seconds between snapshots written to DIR
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),  # Required as a Bearer token; the endpoint is closed when empty
+}
+
+# On-demand request profiling (see coding_platform/profiling.py)
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED', 'False') == 'True',
+    'SAMPLE_RATE': int(os.environ.get('PROFILING_SAMPLE_RATE', '0')),  # Profile 1 request in N; 0 = header only
+    'DIR': os.environ.get('PROFILING_DIR', str(BASE_DIR.parent / 'logs' / 'profiles')),
+    'MAX_PROFILES': int(os.environ.get('PROFILING_MAX_PROFILES', '50')),
+    'TOKEN_MAX_AGE': 60 * 60,  # Seconds an X-Profile token stays valid
+}
+
+# Request tracing to a local JSON lines file (see coding_platform/tracing.py)
+TRACING = {
+    'ENABLED': os.environ.get('TRACING_ENABLED', 'False') == 'True',
+    'SAMPLE_RATE': float(os.environ.get('TRACING_SAMPLE_RATE', '1.0')),  # Fraction of requests traced
+    'FILE': os.environ.get('TRACING_FILE', str(BASE_DIR.parent / 'logs' / 'traces.jsonl')),
+}
+
+# Sampled API traffic recording for replay_traffic (see coding_platform/recording.py)
+TRAFFIC_RECORDING = {
+    'ENABLED': os.environ.get('TRAFFIC_RECORDING_ENABLED', 'False') == 'True',
+    'SAMPLE_RATE': float(os.environ.get('TRAFFIC_RECORDING_SAMPLE_RATE', '1.0')),  # Fraction of requests recorded
+    'FILE': os.environ.get('TRAFFIC_RECORDING_FILE', str(BASE_DIR.parent / 'logs' / 'traffic.jsonl')),
+    'PATH_PREFIX': '/api/',
+    'MAX_BODY': 256 * 1024,  # Larger bodies are recorded as null
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -177,11 +328,24 @@ if not DEBUG:
     ).split(',')
 
 CORS_ALLOW_CREDENTIALS = True  # Allow sending credentials with CORS requests
+# Browsers may send the Idempotency-Key header cross-origin
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 
 # JWT Authentication Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
+    ],
+    # orjson-backed JSON (see coding_platform/renderers.py); same output as DRF's
+    'DEFAULT_RENDERER_CLASSES': [
+        'coding_platform.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'coding_platform.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # Require authentication by default
@@ -195,3 +359,6 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
 }
+
+# Verified access tokens cached per worker (see users/authentication.py)
+JWT_AUTH_CACHE_SIZE = int(os.environ.get('JWT_AUTH_CACHE_SIZE', '10000'))
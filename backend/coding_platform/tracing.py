@@ -0,0 +1,134 @@
+"""
+Lightweight request tracing without an external collector.
+
+With ``TRACING['ENABLED']`` set, ``TracingMiddleware`` opens a ``request``
+span for a sampled fraction (``SAMPLE_RATE``) of requests; code called while
+serving it adds nested spans with ``span(name, **attrs)``, and every database
+query becomes a ``db`` span. When the request finishes all of its spans are
+appended to ``TRACING['FILE']`` as JSON lines::
+
+    {"trace_id": "...", "span_id": "...", "parent_id": "...", "name": "execute_code",
+     "start": 1767225600.123, "duration_ms": 41.2, "attrs": {"language": "python"}}
+
+Outside a traced request ``span()`` does nothing. ``manage.py trace_summary``
+aggregates the file by span path (``request > execute_code > wait``).
+"""
+
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+SQL_PREVIEW = 200
+
+_trace = contextvars.ContextVar('trace', default=None)
+_parent = contextvars.ContextVar('trace_parent', default=None)
+_write_lock = threading.Lock()
+
+
+def _config(name):
+    return settings.TRACING.get(name)
+
+
+class Trace:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.spans = []
+
+
+@contextmanager
+def span(name, **attrs):
+    """Record a span nested under the current one; yields its attrs dict (or None)."""
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    record = {
+        'trace_id': trace.id,
+        'span_id': uuid.uuid4().hex[:16],
+        'parent_id': _parent.get(),
+        'name': name,
+        'start': time.time(),
+        'duration_ms': None,
+        'attrs': attrs,
+    }
+    token = _parent.set(record['span_id'])
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except Exception as e:
+        attrs['error'] = type(e).__name__
+        raise
+    finally:
+        record['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        _parent.reset(token)
+        trace.spans.append(record)
+
+
+def _trace_query(execute, sql, params, many, context):
+    with span('db', sql=sql[:SQL_PREVIEW]):
+        return execute(sql, params, many, context)
+
+
+def write_trace(trace):
+    path = _config('FILE')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lines = ''.join(json.dumps(record, default=str) + '\n' for record in trace.spans)
+    with _write_lock, open(path, 'a') as f:
+        f.write(lines)
+
+
+class TracingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not _config('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= _config('SAMPLE_RATE'):
+            return self.get_response(request)
+        with self.tracing(request) as outcome:
+            outcome['response'] = self.get_response(request)
+        return outcome['response']
+
+    async def __acall__(self, request):
+        if random.random() >= _config('SAMPLE_RATE'):
+            return await self.get_response(request)
+        with self.tracing(request) as outcome:
+            outcome['response'] = await self.get_response(request)
+        return outcome['response']
+
+    @contextmanager
+    def tracing(self, request):
+        trace = Trace()
+        trace_token = _trace.set(trace)
+        outcome = {}
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_trace_query))
+                with span('request', method=request.method, path=request.path) as attrs:
+                    yield outcome
+                    match = request.resolver_match
+                    attrs['route'] = match.view_name if match else 'unmatched'
+                    attrs['status'] = outcome['response'].status_code
+        finally:
+            _trace.reset(trace_token)
+            write_trace(trace)
+        outcome['response']['X-Trace-Id'] = trace.id
@@ -19,8 +19,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .metrics import metrics_view
+from .readiness import readiness_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/metrics', metrics_view, name='metrics'),
+    path('api/ready', readiness_view, name='ready'),
     path('api/auth/', include('users.urls')), # Include users URLs
     path('api/', include('codetests.urls')), # Include codetests URLs
 ]
\ No newline at end of file
@@ -1,3 +1,66 @@
-from django.contrib import admin
+import multiprocessing
 
-# Register your models here.
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .importer import RosterError, detect_format, import_users, read_roster, text_stream
+
+User = get_user_model()
+
+
+class RosterImportForm(forms.Form):
+    roster = forms.FileField(help_text='CSV with a header row, or JSONL, with username, email and password fields.')
+
+
+class RosterUserAdmin(UserAdmin):
+    """User admin with a roster upload for onboarding candidate cohorts."""
+    change_list_template = 'admin/users/user_change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path(
+                'import-roster/',
+                self.admin_site.admin_view(self.import_roster_view),
+                name='users_import_roster',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def import_roster_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:index')
+
+        form = RosterImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['roster']
+            try:
+                # Forking a threaded web worker is unsafe, so the pool's processes are spawned
+                stats = import_users(
+                    read_roster(text_stream(upload.file), detect_format(upload.name)),
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            except (RosterError, UnicodeDecodeError) as e:
+                messages.error(request, f'Could not read roster: {e}')
+            else:
+                messages.success(request, f'Roster imported: {stats.summary()}')
+                for error in stats.errors[:10]:
+                    messages.warning(request, error)
+                return redirect('admin:%s_%s_changelist' % (User._meta.app_label, User._meta.model_name))
+
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            form=form,
+            title='Import roster',
+        )
+        return TemplateResponse(request, 'admin/users/roster_import.html', context)
+
+
+if admin.site.is_registered(User):
+    admin.site.unregister(User)
+admin.site.register(User, RosterUserAdmin)
@@ -0,0 +1,66 @@
+"""
+JWT authentication without a database query per request.
+
+Access tokens issued by UserLoginView carry the user claims the API needs
+(see users/tokens.py). CachedJWTAuthentication keeps verified tokens in a
+bounded per-process LRU until they expire and authenticates requests as a
+ClaimsUser built from the claims; views use ``request.user.id`` to query the
+user's rows.
+
+Because the user row is not read, changes such as deactivation take effect
+when the access token expires (ACCESS_TOKEN_LIFETIME).
+"""
+
+import time
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from coding_platform.lru import LRUCache
+from coding_platform.tracing import span
+from .tokens import USER_CLAIMS
+
+_verified_tokens = LRUCache(maxsize=settings.JWT_AUTH_CACHE_SIZE)
+
+
+class ClaimsUser(TokenUser):
+    """A user built from access token claims."""
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        with span('auth'):
+            return self._authenticate(request)
+
+    def _authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = _verified_tokens.get(raw_token)
+        if validated_token is None:
+            validated_token = self.get_validated_token(raw_token)
+            if not all(claim in validated_token for claim in USER_CLAIMS):
+                # Issued before claims were embedded: load the user row
+                return self.get_user(validated_token), validated_token
+            _verified_tokens.set(raw_token, validated_token, timeout=validated_token['exp'] - time.time())
+
+        return ClaimsUser(validated_token), validated_token
+
+
+def clear_token_cache():
+    _verified_tokens.clear()
@@ -0,0 +1,59 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.importer import RosterError, detect_format, import_users, read_roster
+
+
+class Command(BaseCommand):
+    help = 'Import candidate accounts from a CSV or JSONL roster'
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', help='Path to a .csv or .jsonl roster file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Roster format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk insert')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Password hashing processes (default: CPU count, 0 = no pool)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue after the rows recorded in the checkpoint file')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: <roster>.progress)')
+
+    def handle(self, *args, **options):
+        path = options['roster']
+        if not os.path.exists(path):
+            raise CommandError(f'Roster not found: {path}')
+        fmt = options['format'] or detect_format(path)
+        checkpoint = options['checkpoint'] or f'{path}.progress'
+
+        skip = 0
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                skip = int(f.read().strip() or 0)
+            self.stdout.write(f'Resuming after {skip} rows')
+
+        def on_batch(stats):
+            # Rows before this point are committed, so a rerun can skip them
+            with open(checkpoint, 'w') as f:
+                f.write(str(stats.processed))
+            self.stdout.write(f'  {stats.processed} rows, {stats.created} created ({stats.rate:.0f} rows/s)')
+
+        self.stdout.write(f'Importing users from {path}...')
+        try:
+            with open(path, encoding='utf-8', newline='') as stream:
+                stats = import_users(
+                    read_roster(stream, fmt),
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    skip=skip,
+                    on_batch=on_batch,
+                )
+        except RosterError as e:
+            raise CommandError(str(e))
+
+        for error in stats.errors[:20]:
+            self.stderr.write(error)
+        if len(stats.errors) > 20:
+            self.stderr.write(f'... and {len(stats.errors) - 20} more invalid rows')
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(stats.summary()))
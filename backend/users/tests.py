@@ -1,7 +1,20 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from . import admin as users_admin
+from .importer import import_users
+from .authentication import clear_token_cache
+from .tokens import ClaimsRefreshToken
 
 User = get_user_model()
 
@@ -161,3 +174,134 @@ class CurrentUserTestCase(TestCase):
         """Test getting current user when not authenticated"""
         response = self.client.get(self.user_url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CachedJWTAuthenticationTestCase(TestCase):
+    """Test cases for DB-free JWT authentication"""
+    
+    def setUp(self):
+        clear_token_cache()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+    
+    def test_token_carries_user_claims(self):
+        """Test that login issues access tokens with the user claims"""
+        response = self.client.post(
+            '/api/auth/login/',
+            {'username': 'testuser', 'password': 'testpass123'},
+            format='json'
+        )
+        token = AccessToken(response.data['access'])
+        self.assertEqual(token['username'], 'testuser')
+        self.assertEqual(token['email'], 'test@example.com')
+    
+    def test_current_user_without_queries(self):
+        """Test that the current user endpoint needs no DB query"""
+        access = ClaimsRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/me/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'id': self.user.id, 'username': 'testuser', 'email': 'test@example.com'})
+    
+    def test_token_without_claims_falls_back_to_db(self):
+        """Test that tokens issued without claims are still accepted"""
+        access = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/me/')
+        self.assertEqual(response.data['username'], 'testuser')
+    
+    def test_invalid_token_rejected(self):
+        """Test that a tampered token is rejected"""
+        access = str(ClaimsRefreshToken.for_user(self.user).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access[:-2]}xx')
+        response = self.client.get('/api/auth/me/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersCommandTestCase(TestCase):
+    """Test cases for the import_users management command"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+    
+    def write_roster(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+    
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command('import_users', path, '--workers=0', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+    
+    def test_import_csv(self):
+        """Test importing users from a CSV roster"""
+        path = self.write_roster(
+            'roster.csv',
+            'username,email,password\nalice,alice@example.com,pass-a\nbob,bob@example.com,pass-b\n'
+        )
+        output = self.run_import(path)
+        self.assertIn('2 created', output)
+        self.assertTrue(User.objects.get(username='alice').check_password('pass-a'))
+    
+    def test_import_is_idempotent(self):
+        """Test that existing and duplicate usernames are skipped"""
+        User.objects.create_user(username='alice', password='original')
+        path = self.write_roster(
+            'roster.jsonl',
+            '{"username": "alice", "password": "x"}\n'
+            '{"username": "bob", "password": "y"}\n'
+            '{"username": "bob", "password": "z"}\n'
+            '{"email": "no-username@example.com"}\n'
+        )
+        output = self.run_import(path)
+        self.assertIn('1 created, 2 skipped, 1 invalid', output)
+        self.assertTrue(User.objects.get(username='alice').check_password('original'))
+        
+        output = self.run_import(path)
+        self.assertIn('0 created, 3 skipped', output)
+    
+    def test_resume_from_checkpoint(self):
+        """Test that --resume skips rows recorded in the checkpoint"""
+        path = self.write_roster('roster.csv', 'username,password\nu1,p\nu2,p\nu3,p\n')
+        with open(f'{path}.progress', 'w') as f:
+            f.write('2')
+        self.run_import(path, '--resume')
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['u3'])
+        self.assertFalse(os.path.exists(f'{path}.progress'))
+    
+    def test_parallel_hashing(self):
+        """Test hashing passwords in a process pool"""
+        rows = [{'username': f'user{i}', 'password': f'secret{i}'} for i in range(6)]
+        stats = import_users(rows, batch_size=4, workers=2)
+        self.assertEqual(stats.created, 6)
+        self.assertTrue(User.objects.get(username='user5').check_password('secret5'))
+    
+    def test_admin_import_hashes_in_spawned_pool(self):
+        """Test that the admin roster import hashes in a pool of spawned processes"""
+        calls = []
+        
+        def recording_import(rows, **kwargs):
+            calls.append(kwargs)
+            return import_users(rows, **kwargs)
+        users_admin.import_users = recording_import
+        self.addCleanup(setattr, users_admin, 'import_users', import_users)
+        
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='adminpass')
+        self.client.force_login(admin)
+        roster = SimpleUploadedFile('roster.csv', b'username,password\ncarol,pass-c\n')
+        response = self.client.post(reverse('admin:users_import_roster'), {'roster': roster})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0]['mp_context'].get_start_method(), 'spawn')
+        self.assertNotEqual(calls[0].get('workers'), 0)
+        self.assertTrue(User.objects.get(username='carol').check_password('pass-c'))
@@ -0,0 +1,16 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# User fields embedded in issued tokens so requests can be authenticated
+# without loading the user row (see users/authentication.py)
+USER_CLAIMS = ('username', 'email', 'is_staff', 'is_superuser')
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token carrying USER_CLAIMS; its access tokens inherit them."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
@@ -2,9 +2,8 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
-from .serializers import UserRegisterSerializer, TokenSerializer
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .tokens import ClaimsRefreshToken
+from .serializers import UserRegisterSerializer
 from django.contrib.auth import authenticate
 
 # User Registration View
@@ -28,7 +27,7 @@ class UserLoginView(APIView):
 
         user = authenticate(request, username=username, password=password)
         if user is not None:
-            refresh = RefreshToken.for_user(user)
+            refresh = ClaimsRefreshToken.for_user(user)
             return Response({
                 "refresh": str(refresh),
                 "access": str(refresh.access_token),
@@ -1,4 +1,8 @@
-import api from './axios';
+import api, { API_BASE_URL } from './axios';
+
+// Repeats of a request sent with the same key (retries after a token refresh,
+// double clicks) return the first response instead of running the code again
+const idempotent = (key = crypto.randomUUID()) => ({ headers: { 'Idempotency-Key': key } });
 
 export const testsAPI = {
   // Get all tests
@@ -13,27 +17,84 @@ export const testsAPI = {
     return response.data;
   },
 
-  // Submit code for a test
-  submitCode: async (testId, codeData) => {
-    const response = await api.post(`/tests/${testId}/submit/`, codeData);
+  // Everything the coding page needs in one request: the test with its
+  // sample cases, limits, saved code (or null) and best submission (or null)
+  getWorkspace: async (testId) => {
+    const response = await api.get(`/tests/${testId}/workspace/`);
+    return response.data;
+  },
+
+  // Submit code for a test; only the score and per-case verdicts come back.
+  // Pass the same idempotencyKey for the same code to submit it only once.
+  submitCode: async (testId, codeData, idempotencyKey) => {
+    const response = await api.post(
+      `/tests/${testId}/submit/?verbosity=summary`, codeData, idempotent(idempotencyKey),
+    );
     return response.data;
   },
 
   // Execute code (run test cases)
   executeCode: async (codeData) => {
-    const response = await api.post('/tests/execute/', codeData);
+    const response = await api.post('/tests/execute/', codeData, idempotent());
     return response.data;
   },
 
+  // Stream a run's output as server-sent events (ASGI deployment only).
+  // Calls onEvent(event, data) for each event; abort `signal` to cancel the
+  // run, which kills the process on the server. Resolves to false when the
+  // server does not offer streaming.
+  streamCode: async (codeData, { onEvent, signal }) => {
+    const response = await fetch(`${API_BASE_URL}/tests/execute/stream/`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Authorization: `Bearer ${localStorage.getItem('access_token')}`,
+      },
+      body: JSON.stringify(codeData),
+      signal,
+    });
+    if (response.status === 404) {
+      return false;
+    }
+    if (!response.ok) {
+      const data = await response.json().catch(() => ({}));
+      throw new Error(data.error || data.detail || `HTTP ${response.status}`);
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) {
+        return true;
+      }
+      buffer += value;
+      let end;
+      while ((end = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, end);
+        buffer = buffer.slice(end + 2);
+        let event = 'message';
+        let data = '';
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        onEvent(event, data ? JSON.parse(data) : {});
+      }
+    }
+  },
+
   // Get test cases for a test
   getTestCases: async (testId) => {
     const response = await api.get(`/tests/${testId}/testcases/`);
     return response.data;
   },
 
-  // Save user's code progress
-  saveProgress: async (testId, code) => {
-    const response = await api.post(`/tests/${testId}/save/`, { code });
+  // Save user's code progress.
+  // Payload is either { code, language } or a delta against the last saved
+  // version: { delta, base_hash, base_version, language }.
+  saveProgress: async (testId, payload) => {
+    const response = await api.post(`/tests/${testId}/save/`, payload, idempotent());
     return response.data;
   },
 
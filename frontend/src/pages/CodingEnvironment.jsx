@@ -2,6 +2,7 @@ import { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import Editor from '@monaco-editor/react';
 import { testsAPI } from '../api/tests';
+import { computeDelta } from '../utils/codeDelta';
 import './CodingEnvironment.css';
 
 const LANGUAGES = {
@@ -30,6 +31,12 @@ const CodingEnvironment = () => {
   const [timeLeft, setTimeLeft] = useState(null);
   const [isTestActive, setIsTestActive] = useState(true);
   const autoSaveTimerRef = useRef(null);
+  // Last version acknowledged by the server: { code, language, hash, version }
+  const lastSavedRef = useRef(null);
+  // Aborting it cancels a streamed run
+  const runControllerRef = useRef(null);
+  // Idempotency key of the code last submitted: { code, language, key }
+  const submitKeyRef = useRef(null);
 
   useEffect(() => {
     loadTest();
@@ -37,6 +44,8 @@ const CodingEnvironment = () => {
       if (autoSaveTimerRef.current) {
         clearInterval(autoSaveTimerRef.current);
       }
+      // Leaving the page cancels a streamed run
+      runControllerRef.current?.abort();
     };
   }, [testId]);
 
@@ -89,20 +98,21 @@ const CodingEnvironment = () => {
 
   const loadTest = async () => {
     try {
-      const data = await testsAPI.getTest(testId);
+      const data = await testsAPI.getWorkspace(testId);
       setTest(data);
-      
-      // Try to load saved code
-      try {
-        const savedData = await testsAPI.getSavedCode(testId);
-        if (savedData.code) {
-          setCode(savedData.code);
-          if (savedData.language) {
-            setLanguage(savedData.language);
-          }
+
+      const savedData = data.saved;
+      if (savedData && savedData.code) {
+        setCode(savedData.code);
+        if (savedData.language) {
+          setLanguage(savedData.language);
         }
-      } catch (err) {
-        console.log('No saved code found');
+        lastSavedRef.current = {
+          code: savedData.code,
+          language: savedData.language,
+          hash: savedData.content_hash,
+          version: savedData.version,
+        };
       }
     } catch (err) {
       console.error('Failed to load test:', err);
@@ -112,8 +122,31 @@ const CodingEnvironment = () => {
   };
 
   const saveProgress = async () => {
+    const last = lastSavedRef.current;
+    if (last && last.code === code && last.language === language) {
+      return;
+    }
+
+    let payload = { code, language };
+    if (last && last.hash) {
+      const delta = computeDelta(last.code, code);
+      if (delta) {
+        payload = { delta, base_hash: last.hash, base_version: last.version, language };
+      }
+    }
+
     try {
-      await testsAPI.saveProgress(testId, code);
+      let data;
+      try {
+        data = await testsAPI.saveProgress(testId, payload);
+      } catch (err) {
+        if (err.response?.status !== 409) {
+          throw err;
+        }
+        // Saved elsewhere in the meantime (another tab): send the full code
+        data = await testsAPI.saveProgress(testId, { code, language });
+      }
+      lastSavedRef.current = { code, language, hash: data.content_hash, version: data.version };
       console.log('Progress saved');
     } catch (err) {
       console.error('Failed to save progress:', err);
@@ -130,8 +163,37 @@ const CodingEnvironment = () => {
   const handleRunCode = async () => {
     setRunning(true);
     setOutput('Running...');
+    const controller = new AbortController();
+    runControllerRef.current = controller;
     
     try {
+      // Stream output as it is produced when the server supports it
+      let started = false;
+      const streamed = await testsAPI.streamCode({ code, language }, {
+        signal: controller.signal,
+        onEvent: (event, data) => {
+          if (event === 'start') {
+            started = true;
+            setOutput('');
+          } else if (event === 'stdout' || event === 'stderr') {
+            setOutput((previous) => previous + data.data);
+          } else if (event === 'truncated') {
+            setOutput((previous) => `${previous}\n[Output truncated after ${data.limit} bytes]`);
+          } else if (event === 'exit') {
+            if (data.error) {
+              setOutput(data.error);
+            } else if (data.verdict === 'timeout') {
+              setOutput((previous) => `${previous}\n[Execution timeout]`);
+            } else if (!started || data.verdict === 'ok') {
+              setOutput((previous) => previous || 'Execution completed');
+            }
+          }
+        },
+      });
+      if (streamed) {
+        return;
+      }
+
       const result = await testsAPI.executeCode({
         code,
         language,
@@ -140,22 +202,37 @@ const CodingEnvironment = () => {
       
       setOutput(result.output || result.error || 'Execution completed');
     } catch (err) {
-      setOutput(`Error: ${err.response?.data?.error || err.message}`);
+      if (err.name === 'AbortError') {
+        setOutput((previous) => `${previous}\n[Stopped]`);
+      } else {
+        setOutput(`Error: ${err.response?.data?.error || err.message}`);
+      }
     } finally {
+      runControllerRef.current = null;
       setRunning(false);
     }
   };
 
+  const handleStopRun = () => {
+    runControllerRef.current?.abort();
+  };
+
   const handleSubmit = async () => {
     if (!window.confirm('Are you sure you want to submit your solution?')) {
       return;
     }
 
+    // Submitting the same code again (e.g. a double click) reuses its key
+    const last = submitKeyRef.current;
+    if (!last || last.code !== code || last.language !== language) {
+      submitKeyRef.current = { code, language, key: crypto.randomUUID() };
+    }
+
     try {
       const result = await testsAPI.submitCode(testId, {
         code,
         language,
-      });
+      }, submitKeyRef.current.key);
       
       alert(`Submission successful! Score: ${result.score || 'Pending'}`);
       navigate('/dashboard');
@@ -212,11 +289,11 @@ const CodingEnvironment = () => {
           </select>
           
           <button 
-            onClick={handleRunCode} 
-            disabled={running || !isTestActive}
+            onClick={running ? handleStopRun : handleRunCode} 
+            disabled={!isTestActive}
             className="btn-run"
           >
-            {running ? 'Running...' : 'Run Code'}
+            {running ? 'Stop' : 'Run Code'}
           </button>
           
           <button 
@@ -0,0 +1,29 @@
+// Helpers for diff-based autosave (see the /tests/:id/save/ endpoint)
+
+// Single [start, end, text] edit turning `base` into `text`, found by
+// trimming the common prefix and suffix. Offsets are in UTF-16 code units
+// like Python's str indices for BMP text, so fall back to a full save when
+// either side contains astral characters.
+export const computeDelta = (base, text) => {
+  if (/[\uD800-\uDFFF]/.test(base) || /[\uD800-\uDFFF]/.test(text)) {
+    return null;
+  }
+  if (base === text) {
+    return [];
+  }
+
+  let start = 0;
+  const maxPrefix = Math.min(base.length, text.length);
+  while (start < maxPrefix && base[start] === text[start]) {
+    start += 1;
+  }
+
+  let baseEnd = base.length;
+  let textEnd = text.length;
+  while (baseEnd > start && textEnd > start && base[baseEnd - 1] === text[textEnd - 1]) {
+    baseEnd -= 1;
+    textEnd -= 1;
+  }
+
+  return [[start, baseEnd, text.slice(start, textEnd)]];
+};